@@ -0,0 +1,141 @@
+"""
+Accuracy and latency report for each inference backend.
+
+    python benchmarks/bench_inference.py --iterations 200 --batch-sizes 1,8,32
+    python benchmarks/bench_inference.py --backends compiled,tflite-int8 --output report.json
+
+Uses the trained model at MODEL_PATH when present, otherwise an untrained
+model with the same architecture (latency does not depend on the weights,
+accuracy then is meaningless). TFLite backends use the exports next to
+MODEL_PATH when they exist and otherwise convert the model into a temporary
+directory, calibrating int8 on training images.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+from pathlib import Path
+import numpy as np
+
+# Add the repository root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.model import (
+    build_model, load_trained_model,
+    export_tflite_model, sample_calibration_images, tflite_model_path, numpy_model_path
+)
+from src.dataset import open_dataset
+from src.numpy_engine import NumpyModel, export_numpy_model
+from src.inference import CompiledModel, TFLiteModel, DEFAULT_BATCH_BUCKETS
+
+DEFAULT_BACKENDS = 'keras,compiled,numpy,tflite-dynamic,tflite-float16,tflite-int8'
+
+class KerasPredict:
+    """The baseline model.predict path"""
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, images, verbose=0):
+        return self.model.predict(images, verbose=0)
+
+def time_calls(fn, images, iterations, warmup=10):
+    """Time repeated calls of fn(images).
+
+    Returns:
+        numpy.array: Per-call latencies in milliseconds
+    """
+    for _ in range(warmup):
+        fn(images)
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(images)
+        latencies[i] = (time.perf_counter() - start) * 1000
+    return latencies
+
+def accuracy(engine, split, batch_size=256):
+    """Top-1 accuracy of an engine on a dataset split, normalized batch by batch"""
+    correct = 0
+    for images, labels in split.batches(batch_size):
+        predictions = engine.predict(images)
+        correct += int((predictions.argmax(axis=1) == labels).sum())
+    return correct / len(split)
+
+def build_engine(name, model, x_train, export_dir):
+    """Create the engine for a backend name such as 'tflite-int8'"""
+    if name == 'keras':
+        return KerasPredict(model)
+    if name == 'compiled':
+        return CompiledModel(model, DEFAULT_BATCH_BUCKETS)
+    if name == 'numpy':
+        path = numpy_model_path()
+        if not path.exists():
+            path = export_numpy_model(model, Path(export_dir) / 'model.npz')
+        return NumpyModel.load(path)
+    if name.startswith('tflite-'):
+        quantization = name.split('-', 1)[1]
+        path = tflite_model_path(quantization)
+        if not path.exists():
+            calibration_images = sample_calibration_images(x_train) if quantization == 'int8' else None
+            path = export_tflite_model(model, quantization, calibration_images, Path(export_dir) / f"{quantization}.tflite")
+        return TFLiteModel(path)
+    raise ValueError(f"Unknown backend: {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default=DEFAULT_BACKENDS)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--accuracy-samples', type=int, default=10000,
+                        help="Test images used for accuracy; 0 skips the accuracy check")
+    parser.add_argument('--output', help="Write the report as JSON to this path")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        model = load_trained_model()
+    except Exception as e:
+        logging.warning(f"Could not load trained model, using untrained weights: {e}")
+        model = None
+    if model is None:
+        model = build_model()
+
+    dataset = open_dataset()
+    x_train, test = dataset.train.images, dataset.test
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    report = []
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        for name in args.backends.split(','):
+            engine = build_engine(name, model, x_train, export_dir)
+            result = {'backend': name, 'latency': {}}
+            if isinstance(engine, TFLiteModel):
+                result['model_bytes'] = os.path.getsize(engine.model_path)
+            if args.accuracy_samples:
+                result['accuracy'] = accuracy(engine, test[:args.accuracy_samples])
+            for batch_size in batch_sizes:
+                latencies = time_calls(engine.predict, test.batch(0, batch_size)[0], args.iterations)
+                p50, p99 = np.percentile(latencies, [50, 99])
+                result['latency'][batch_size] = {
+                    'p50_ms': p50,
+                    'p99_ms': p99,
+                    'images_per_sec': batch_size * 1000 / p50
+                }
+            report.append(result)
+
+    print(f"{'backend':<16} {'accuracy':>8} {'batch':>5} {'p50 ms':>8} {'p99 ms':>8} {'img/s':>10}")
+    for result in report:
+        acc = f"{result['accuracy']:.4f}" if 'accuracy' in result else '-'
+        for batch_size, latency in result['latency'].items():
+            print(f"{result['backend']:<16} {acc:>8} {batch_size:>5} {latency['p50_ms']:>8.3f} "
+                  f"{latency['p99_ms']:>8.3f} {latency['images_per_sec']:>10.0f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
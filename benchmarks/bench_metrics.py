@@ -0,0 +1,154 @@
+"""
+Per-request cost of the Prometheus metrics, per process and shared across workers.
+
+    python benchmarks/bench_metrics.py --iterations 50000
+    python benchmarks/bench_metrics.py --dead-workers 200 --output metrics.json
+
+A /predict request for one image updates the request count and latency, the
+latency of five stages, the prediction count, the cache miss count and the
+batch histograms. The first table times that set of updates:
+
+- ``labels``: the previous calls, ``metric.labels(...)`` on every update
+- ``cached``: ``src.monitor.labelled``, which resolves each child once
+
+Each mode runs in a fresh interpreter, because prometheus_client picks its
+value store when it is imported. ``per-process`` keeps values in memory as
+before. ``multiprocess`` writes them to memory-mapped files in a
+PROMETHEUS_MULTIPROC_DIR, as under gunicorn.
+
+The second table times a /metrics scrape of the multiprocess directory with
+the files of ``--dead-workers`` exited workers left in it, and again after
+merge_dead_processes has folded them into the archive files.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+import numpy as np
+
+# Add the repository root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# prometheus_client is imported here, so the metrics mode is the one in the
+# environment this interpreter was started with
+from src.model import BATCH_QUEUE_WAIT, BATCH_SIZE
+from src.monitor import CACHE_MISSES, PREDICTION_COUNT, REQUEST_COUNT, REQUEST_LATENCY, STAGE_LATENCY, labelled
+from src.multiprocess_metrics import SharedMetricsCollector, merge_dead_processes
+
+STAGES = ('decode', 'validate', 'inference', 'postprocess', 'serialize')
+
+def legacy_request(latency):
+    """The metric updates of one /predict request before label children were cached"""
+    CACHE_MISSES.labels(backend='numpy').inc()
+    BATCH_QUEUE_WAIT.observe(latency)
+    BATCH_SIZE.observe(1)
+    for stage in STAGES:
+        STAGE_LATENCY.labels(endpoint='predict', stage=stage).observe(latency)
+    PREDICTION_COUNT.labels(predicted_digit=str(3)).inc()
+    REQUEST_LATENCY.labels(method='POST', endpoint='predict').observe(latency)
+    REQUEST_COUNT.labels(method='POST', endpoint='predict', http_status=200).inc()
+
+def cached_request(latency):
+    """The same updates through src.monitor.labelled"""
+    labelled(CACHE_MISSES, 'numpy').inc()
+    BATCH_QUEUE_WAIT.observe(latency)
+    BATCH_SIZE.observe(1)
+    for stage in STAGES:
+        labelled(STAGE_LATENCY, 'predict', stage).observe(latency)
+    labelled(PREDICTION_COUNT, 3).inc()
+    labelled(REQUEST_LATENCY, 'POST', 'predict').observe(latency)
+    labelled(REQUEST_COUNT, 'POST', 'predict', 200).inc()
+
+def measure_updates(iterations):
+    """us per request for each path, in this interpreter's metrics mode"""
+    results = {}
+    for name, fn in (('labels', legacy_request), ('cached', cached_request)):
+        fn(0.001)
+        started = time.perf_counter()
+        for i in range(iterations):
+            fn(0.0005 + (i % 100) * 0.0001)
+        results[name] = (time.perf_counter() - started) / iterations * 1e6
+    return results
+
+def run_mode(mode, iterations, directory):
+    """Runs measure_updates in a fresh interpreter"""
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(directory) if mode == 'multiprocess' else '')
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--measure-updates', str(iterations)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def time_scrape(directory, repeats=5):
+    """Median milliseconds to build the /metrics response from the directory"""
+    from prometheus_client import CollectorRegistry, generate_latest
+
+    timings = []
+    for _ in range(repeats):
+        registry = CollectorRegistry()
+        SharedMetricsCollector(registry, str(directory))
+        started = time.perf_counter()
+        generate_latest(registry)
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+def measure_scrapes(directory, dead_workers):
+    """Scrape time with the files of dead workers left in place, then merged"""
+    # Copies of the measuring worker's files under pids that are not running
+    files = [f for f in glob.glob(os.path.join(directory, '*.db')) if 'archive' not in f]
+    first_pid = 4_000_000
+    for index in range(dead_workers):
+        for f in files:
+            prefix = os.path.basename(f)[:-3].rsplit('_', 1)[0]
+            shutil.copy(f, os.path.join(directory, f'{prefix}_{first_pid + index}.db'))
+    before = time_scrape(directory)
+    count = len(glob.glob(os.path.join(directory, '*.db')))
+    started = time.perf_counter()
+    merge_dead_processes(path=str(directory))
+    merge_ms = (time.perf_counter() - started) * 1000
+    return {
+        'dead_workers': dead_workers,
+        'files_before': count,
+        'scrape_ms_before': before,
+        'merge_ms': merge_ms,
+        'files_after': len(glob.glob(os.path.join(directory, '*.db'))),
+        'scrape_ms_after': time_scrape(directory),
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50000, help="Simulated requests per path")
+    parser.add_argument('--dead-workers', type=int, default=100, help="Exited workers left in the directory")
+    parser.add_argument('--output', help="Write the report as JSON to this path")
+    parser.add_argument('--measure-updates', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.measure_updates:
+        print(json.dumps(measure_updates(args.measure_updates)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        updates = {mode: run_mode(mode, args.iterations, directory) for mode in ('per-process', 'multiprocess')}
+        print(f"{'mode':<13} {'path':<7} {'us/request':>10}")
+        for mode, paths in updates.items():
+            for path, us in paths.items():
+                print(f"{mode:<13} {path:<7} {us:>10.2f}")
+
+        scrapes = measure_scrapes(directory, args.dead_workers)
+        print(f"\n{'dead workers':<13} {'files':>6} {'scrape ms':>10}   merged: {'files':>6} {'scrape ms':>10} {'merge ms':>9}")
+        print(f"{scrapes['dead_workers']:<13} {scrapes['files_before']:>6} {scrapes['scrape_ms_before']:>10.2f}"
+              f"           {scrapes['files_after']:>6} {scrapes['scrape_ms_after']:>10.2f} {scrapes['merge_ms']:>9.1f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({'updates': updates, 'scrape': scrapes}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare model load time from the SavedModel with the memory-mapped weight store.
+
+    python benchmarks/bench_model_load.py --repeats 5
+
+Uses the artifacts next to MODEL_PATH when present, otherwise saves an
+untrained model with the same architecture to a temporary directory. Each
+load runs in a fresh process so nothing is reused between repeats.
+"""
+import os
+import sys
+import argparse
+import logging
+import subprocess
+import tempfile
+from pathlib import Path
+import numpy as np
+
+# Add the repository root to the Python path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from src.model import MODEL_PATH, build_model, weight_store_path
+
+LOADERS = {
+    'savedmodel': "import tensorflow as tf; tf.keras.models.load_model({path!r})",
+    'store-keras': "from src.weight_store import load_keras_model; load_keras_model({path!r})",
+    'store-numpy': "from src.weight_store import load_numpy_model; load_numpy_model({path!r})",
+}
+
+def time_load(name, path):
+    """Seconds taken by a fresh interpreter to import and load, excluding interpreter startup"""
+    code = (
+        "import time; start = time.perf_counter(); "
+        + LOADERS[name].format(path=str(path))
+        + "; print(time.perf_counter() - start)"
+    )
+    env = dict(os.environ, PYTHONPATH=ROOT, TF_CPP_MIN_LOG_LEVEL='3')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        saved_model, store = MODEL_PATH.resolve(), weight_store_path().resolve()
+        if not store.exists():
+            from src.weight_store import save_model_weights
+            model = build_model()
+            saved_model, store = Path(tmp) / 'saved_model', Path(tmp) / 'model.weights'
+            save_model_weights(model, store)
+            try:
+                model.save(saved_model)
+            except Exception as e:
+                logging.warning(f"Skipping SavedModel comparison: {e}")
+
+        paths = {'savedmodel': saved_model, 'store-keras': store, 'store-numpy': store}
+        print(f"{'format':<12} {'median s':>9} {'min s':>9}")
+        for name, path in paths.items():
+            if not Path(path).exists():
+                continue
+            times = [time_load(name, path) for _ in range(args.repeats)]
+            print(f"{name:<12} {np.median(times):>9.3f} {min(times):>9.3f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
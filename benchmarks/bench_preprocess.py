@@ -0,0 +1,154 @@
+"""
+Allocation and latency micro-benchmark of the single-image /predict path.
+
+    python benchmarks/bench_preprocess.py --iterations 20000
+    python benchmarks/bench_preprocess.py --engine numpy --output preprocess.json
+
+Compares ``src.model.predict``, which normalizes into a reusable per-thread
+input buffer and converts the output row directly, against the previous
+implementation kept here as ``legacy_predict``: float32 copy, divide,
+reshape, batch reshape, ``np.array`` of the output and a float list
+comprehension. Inputs are the two forms the app decodes: a float32 vector
+parsed from JSON and a uint8 vector from a binary body.
+
+By default the model is a stub that returns a preallocated output, so only
+the preprocessing and postprocessing around the forward pass are measured.
+``--engine numpy`` runs the real NumPy engine on an untrained model instead.
+
+A second table gives the per-image server cost of ingesting raw pictures
+(``src.imaging``): decoding and MNIST normalization of a 280x280 canvas
+PNG, of a 1024x1024 JPEG photo, and normalization of a 280x280 uint8 array.
+
+Allocations are traced with tracemalloc, which sees NumPy's array buffers.
+The report gives the peak memory allocated above the starting point during
+a call, as a median over calls. Every temporary array shows up in it.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+import numpy as np
+
+# Add the repository root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.imaging import decode_image_file, normalize_digit
+from src.model import predict
+
+class StubModel:
+    """Returns the same preallocated probabilities for every call"""
+    backend = 'stub'
+
+    def __init__(self):
+        self.output = np.full((1, 10), 0.1, dtype='float32')
+
+    def predict(self, images, verbose=0):
+        return self.output
+
+def legacy_predict(model, image_data):
+    """The single-image path before inputs were written into reusable buffers"""
+    image_data = np.array(image_data).reshape(28, 28)
+    is_uint8 = getattr(image_data, 'dtype', None) == np.uint8
+    image_data = np.array(image_data, dtype='float32')
+    if is_uint8 or image_data.max() > 1.0:
+        image_data /= 255.0
+    image_data = image_data.reshape(28, 28, 1)[np.newaxis]
+    predictions = np.array(model.predict(image_data, verbose=0))
+    return int(np.argmax(predictions[0])), [float(p) for p in predictions[0]]
+
+def load_engine(name):
+    if name == 'stub':
+        return StubModel()
+    from src.model import build_model
+    from src.numpy_engine import NumpyModel, export_numpy_model
+    with tempfile.TemporaryDirectory() as scratch:
+        return NumpyModel.load(export_numpy_model(build_model(), Path(scratch) / 'model.npz'))
+
+def measure(fn, model, image, iterations, warmup=100):
+    """Median latency and peak allocated bytes of fn(model, image)"""
+    for _ in range(warmup):
+        fn(model, image)
+
+    latencies = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(model, image)
+        latencies[i] = time.perf_counter() - start
+
+    # Allocations are traced in a separate pass; tracing slows every call down
+    allocated = np.empty(min(iterations, 2000))
+    tracemalloc.start()
+    for i in range(len(allocated)):
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        fn(model, image)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated[i] = peak - baseline
+    tracemalloc.stop()
+    return {
+        'us_per_call': float(np.median(latencies) * 1e6),
+        'p99_us': float(np.percentile(latencies, 99) * 1e6),
+        'peak_bytes_per_call': float(np.median(allocated)),
+    }
+
+def ingestion_cases():
+    """(name, data) pairs of raw pictures of a digit, light ink on dark"""
+    from PIL import Image, ImageDraw
+
+    canvas = Image.new('L', (280, 280), 0)
+    ImageDraw.Draw(canvas).line([(90, 90), (180, 90), (128, 225)], fill=255, width=20)
+    png = io.BytesIO()
+    canvas.save(png, 'PNG')
+    photo = io.BytesIO()
+    # Dark ink on light paper, as a camera would see it
+    Image.eval(canvas, lambda pixel: 255 - pixel).resize((1024, 1024)).convert('RGB').save(photo, 'JPEG', quality=90)
+    return [
+        ('canvas-png-280', png.getvalue(), lambda data: normalize_digit(decode_image_file(data))),
+        ('photo-jpeg-1024', photo.getvalue(), lambda data: normalize_digit(decode_image_file(data))),
+        ('array-uint8-280', np.asarray(canvas), normalize_digit),
+    ]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000, help="Timed calls per case (default: 20000)")
+    parser.add_argument('--engine', choices=('stub', 'numpy'), default='stub', help="Model behind predict (default: stub)")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    model = load_engine(args.engine)
+    pixels = np.random.default_rng(0).integers(0, 256, 784).astype(np.uint8)
+    inputs = {
+        'json-float32': pixels.astype('float32'),
+        'binary-uint8': pixels,
+    }
+    paths = {'before': legacy_predict, 'after': predict}
+
+    results = []
+    print(f"{'input':<14} {'path':<7} {'us/call':>9} {'p99 us':>9} {'peak bytes':>11}")
+    for input_name, image in inputs.items():
+        for path_name, fn in paths.items():
+            result = dict(input=input_name, path=path_name, engine=args.engine,
+                          **measure(fn, model, image, args.iterations))
+            results.append(result)
+            print(f"{input_name:<14} {path_name:<7} {result['us_per_call']:>9.2f} {result['p99_us']:>9.2f} "
+                  f"{result['peak_bytes_per_call']:>11.0f}")
+
+    ingestion = []
+    print(f"\n{'ingestion':<16} {'us/image':>9} {'p99 us':>9} {'peak bytes':>11}")
+    for name, data, fn in ingestion_cases():
+        result = dict(input=name, **measure(lambda _, data: fn(data), None, data, max(args.iterations // 10, 100)))
+        ingestion.append(result)
+        print(f"{name:<16} {result['us_per_call']:>9.1f} {result['p99_us']:>9.1f} {result['peak_bytes_per_call']:>11.0f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({'predict': results, 'ingestion': ingestion}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+End-to-end serving benchmark: latency, throughput and server resource use.
+
+    python benchmarks/bench_serving.py --backends compiled,numpy,tflite --output serving.json
+    python benchmarks/bench_serving.py --scenarios single,open --rates 100,400 --baseline serving.json
+    python benchmarks/bench_serving.py --server-mode asgi --baseline serving.json
+    python benchmarks/bench_serving.py --url http://localhost:8080 --pid 1234
+
+For each backend, starts the app under gunicorn with docker/gunicorn.conf.py
+in a scratch directory, through the WSGI or the ASGI entry point (--server-mode). The models served there are the trained weights from
+--model-dir when a weight store exists, and an untrained model with the same
+architecture otherwise; latency does not depend on the weights. The server
+is then driven by the local load generator in benchmarks/loadgen.py:
+
+- single:     one client, back-to-back /predict requests
+- concurrent: closed loop, N clients per --concurrency level on /predict
+- batch:      one client, /predict/batch with --batch-size images
+- open:       Poisson arrivals at each --rates level on /predict
+
+The load generator reports p50/p95/p99 latency and throughput. Server CPU
+time, peak RSS and peak PSS of the gunicorn process tree are read from
+/proc. Images are seeded random pixels. The prediction cache is off unless
+--cache is given. Results are written as JSON along with the git commit,
+so runs can be compared with --baseline.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import argparse
+import logging
+import platform
+import subprocess
+import tempfile
+import urllib.request
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+
+# Add the repository root to the Python path
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT))
+
+from benchmarks.loadgen import ResourceSampler, run_closed_loop, run_open_loop
+from src.codec import BINARY_MIMETYPE, encode_images
+
+SCENARIOS = ('single', 'concurrent', 'batch', 'open')
+DEFAULT_BACKENDS = 'compiled,numpy,tflite'
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def git_commit():
+    """The commit being benchmarked, marked -dirty with uncommitted changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def prepare_models(workdir, model_dir):
+    """Writes every artifact the backends serve into workdir/models"""
+    from src.model import build_model, export_tflite_model
+    from src.weight_store import load_keras_model, save_model_weights
+
+    store = Path(model_dir) / 'digit_classifier.weights'
+    if store.exists():
+        logging.info(f"Serving trained weights from {store}")
+        model = load_keras_model(store)
+    else:
+        logging.info("No weight store found, serving an untrained model (latency only)")
+        model = build_model()
+
+    models = Path(workdir) / 'models'
+    models.mkdir(parents=True, exist_ok=True)
+    save_model_weights(model, models / 'digit_classifier.weights')
+    export_tflite_model(model, 'dynamic', path=models / 'digit_classifier_dynamic.tflite')
+
+class Server:
+    """The app under gunicorn, started in a scratch directory"""
+
+    def __init__(self, backend, workdir, workers, threads, cache, server_mode='wsgi'):
+        self.backend = backend
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = dict(
+            os.environ,
+            PYTHONPATH=str(REPO_ROOT),
+            PORT=str(self.port),
+            PYTHON_ENV='production',
+            INFERENCE_BACKEND=backend,
+            TFLITE_QUANTIZATION='dynamic',
+            GUNICORN_WORKERS=str(workers),
+            GUNICORN_THREADS=str(threads),
+            SERVER_MODE=server_mode,
+            TF_CPP_MIN_LOG_LEVEL='3',
+            # Skips starting TensorBoard next to the app
+            FLY_APP_NAME='benchmark',
+        )
+        if not cache:
+            env['PREDICTION_CACHE_SIZE'] = '0'
+        self.log = open(Path(workdir) / f"server-{backend}.log", 'w')
+        app_module = 'src.asgi:app' if server_mode == 'asgi' else 'src.app:app'
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', str(REPO_ROOT / 'docker' / 'gunicorn.conf.py'), app_module],
+            cwd=workdir, env=env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+        self.pid = self.process.pid
+
+    def wait_ready(self, timeout=300):
+        """Waits until /health/ready reports a loaded, checked model"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.backend} server exited with code {self.process.returncode}, see {self.log.name}")
+            try:
+                with urllib.request.urlopen(f"{self.url}/health/ready", timeout=5):
+                    return
+            except OSError:
+                pass
+            time.sleep(0.5)
+        raise RuntimeError(f"{self.backend} server not ready after {timeout}s, see {self.log.name}")
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.log.close()
+
+def make_payloads(count, batch_size, seed):
+    """Seeded random images as /predict and /predict/batch request bodies"""
+    rng = np.random.default_rng(seed)
+    images = rng.integers(0, 256, (count, 784), dtype='uint8')
+    singles = [image.tobytes() for image in images]
+    batches = [
+        encode_images(images[rng.choice(count, batch_size, replace=False)].reshape(-1, 28, 28))
+        for _ in range(max(1, count // batch_size))
+    ]
+    return singles, batches
+
+def run_scenarios(url, pid, args, singles, batches):
+    """Runs every requested scenario against one server"""
+    results = []
+
+    def measure(scenario, parameters, run):
+        if pid:
+            with ResourceSampler(pid) as sampler:
+                summary = run()
+            summary.update(sampler.report(summary['requests']))
+        else:
+            summary = run()
+        summary.update(scenario=scenario, **parameters)
+        latency = summary['latency_ms'] or {}
+        logging.info(
+            f"{scenario} {parameters}: {summary['throughput_rps']:.1f} req/s, "
+            f"p50 {latency.get('p50', float('nan')):.2f} ms, p99 {latency.get('p99', float('nan')):.2f} ms, "
+            f"{summary['errors']} errors"
+        )
+        results.append(summary)
+
+    # Warm up every thread's interpreter/connection before measuring
+    run_closed_loop(url, '/predict', singles, BINARY_MIMETYPE, max(args.concurrency), args.warmup)
+
+    if 'single' in args.scenarios:
+        measure('single', {'concurrency': 1}, lambda: run_closed_loop(
+            url, '/predict', singles, BINARY_MIMETYPE, 1, args.duration))
+    if 'concurrent' in args.scenarios:
+        for concurrency in args.concurrency:
+            measure('concurrent', {'concurrency': concurrency}, lambda: run_closed_loop(
+                url, '/predict', singles, BINARY_MIMETYPE, concurrency, args.duration))
+    if 'batch' in args.scenarios:
+        measure('batch', {'concurrency': 1, 'batch_size': args.batch_size}, lambda: run_closed_loop(
+            url, '/predict/batch', batches, BINARY_MIMETYPE, 1, args.duration, args.batch_size))
+    if 'open' in args.scenarios:
+        for rate in args.rates:
+            measure('open', {'rate': rate}, lambda: run_open_loop(
+                url, '/predict', singles, BINARY_MIMETYPE, rate, args.duration, seed=args.seed))
+    return results
+
+def result_key(result):
+    return (result['backend'], result['scenario'], result.get('concurrency'), result.get('rate'), result.get('batch_size'))
+
+def print_results(results, baseline=None):
+    """Prints a results table, with the change against a baseline run where one matches"""
+    previous = {result_key(result): result for result in (baseline or {}).get('results', [])}
+
+    def delta(new, old):
+        if old is None or not old:
+            return ''
+        return f" ({(new - old) / old * 100:+.0f}%)"
+
+    print(f"{'backend':<10} {'scenario':<11} {'level':>6} {'req/s':>16} {'p50 ms':>16} {'p95 ms':>9} "
+          f"{'p99 ms':>16} {'cpu ms/req':>10} {'rss MB':>7} {'errors':>6}")
+    for result in results:
+        old = previous.get(result_key(result), {})
+        latency = result['latency_ms'] or {}
+        old_latency = old.get('latency_ms') or {}
+        level = result.get('rate') or result.get('batch_size') or result.get('concurrency')
+        cpu = result.get('server_cpu_ms_per_request')
+        rss = result.get('server_rss_mb_peak')
+        print(
+            f"{result['backend']:<10} {result['scenario']:<11} {level:>6} "
+            f"{result['throughput_rps']:>8.1f}{delta(result['throughput_rps'], old.get('throughput_rps')):>8} "
+            f"{latency.get('p50', 0):>8.2f}{delta(latency.get('p50', 0), old_latency.get('p50')):>8} "
+            f"{latency.get('p95', 0):>9.2f} "
+            f"{latency.get('p99', 0):>8.2f}{delta(latency.get('p99', 0), old_latency.get('p99')):>8} "
+            f"{cpu if cpu is None else round(cpu, 2)!s:>10} {rss if rss is None else round(rss)!s:>7} {result['errors']:>6}"
+        )
+
+def parse_list(value, cast=int):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', default=DEFAULT_BACKENDS)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', default='8,32', help="Client counts for the concurrent scenario")
+    parser.add_argument('--rates', default='50,200', help="Arrival rates (req/s) for the open scenario")
+    parser.add_argument('--batch-size', type=int, default=32, help="Images per /predict/batch request")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds per measurement")
+    parser.add_argument('--warmup', type=float, default=3.0, help="Seconds of unmeasured load before measuring")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument('--threads', type=int, default=4, help="gunicorn threads per worker (wsgi mode)")
+    parser.add_argument('--server-mode', choices=('wsgi', 'asgi'), default='wsgi', help="Entry point to serve")
+    parser.add_argument('--cache', action='store_true', help="Leave the prediction cache on")
+    parser.add_argument('--model-dir', default=str(REPO_ROOT / 'models'), help="Where to look for trained weights")
+    parser.add_argument('--url', help="Benchmark an already running server instead of starting one")
+    parser.add_argument('--pid', type=int, help="Process of the --url server, for CPU and memory statistics")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help="Earlier JSON output to compare against")
+    parser.add_argument('--output', help="Write the results as JSON to this path")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    args.scenarios = [scenario for scenario in args.scenarios.split(',') if scenario]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    args.concurrency = parse_list(args.concurrency)
+    args.rates = parse_list(args.rates, float)
+
+    singles, batches = make_payloads(1024, args.batch_size, args.seed)
+    results = []
+    if args.url:
+        for result in run_scenarios(args.url, args.pid, args, singles, batches):
+            results.append(dict(result, backend='external'))
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            prepare_models(workdir, args.model_dir)
+            for backend in args.backends.split(','):
+                logging.info(f"Starting {backend} server")
+                server = Server(backend, workdir, args.workers, args.threads, args.cache, args.server_mode)
+                try:
+                    server.wait_ready()
+                    for result in run_scenarios(server.url, server.pid, args, singles, batches):
+                        results.append(dict(result, backend=backend))
+                finally:
+                    server.stop()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'config': {key: value for key, value in vars(args).items() if key not in ('baseline', 'output')},
+        },
+        'results': results,
+    }
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    if baseline:
+        print(f"Compared with {baseline['meta'].get('commit')} ({args.baseline})")
+    print_results(results, baseline)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
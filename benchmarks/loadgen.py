@@ -0,0 +1,299 @@
+"""
+Local HTTP load generator and process statistics for the serving benchmarks.
+
+Two ways of driving a server:
+
+- closed loop: a fixed number of clients, each sending its next request as
+  soon as the previous one returns. Measures capacity at a concurrency
+  level; latency hides queueing because clients back off when slow.
+- open loop: requests arrive on a Poisson schedule at a fixed rate whatever
+  the server does. Latency is measured from the scheduled arrival time, so
+  time spent waiting for a free client counts (no coordinated omission).
+
+Every client thread keeps one persistent HTTP/1.1 connection.
+"""
+import os
+import time
+import queue
+import random
+import threading
+import http.client
+from urllib.parse import urlsplit
+import numpy as np
+
+class Client:
+    """One keep-alive HTTP connection to the server under test"""
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._connection = None
+
+    def post(self, path, body, content_type):
+        """Sends a POST and reads the full response.
+
+        Returns:
+            int: HTTP status, or 0 if the connection failed
+        """
+        for attempt in range(2):
+            try:
+                if self._connection is None:
+                    self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                self._connection.request('POST', path, body=body, headers={
+                    'Content-Type': content_type,
+                    'Accept': 'application/octet-stream',
+                })
+                response = self._connection.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, OSError):
+                # The server may close idle keep-alive connections; reconnect once
+                self.close()
+        return 0
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+def summarize(latencies_ms, statuses, elapsed, images_per_request=1):
+    """Latency percentiles and throughput of a run.
+
+    Args:
+        latencies_ms (list): Per-request latency in milliseconds
+        statuses (list): Per-request HTTP status
+        elapsed (float): Wall time of the run in seconds
+        images_per_request (int, optional): Images carried by each request. Defaults to 1.
+
+    Returns:
+        dict: requests, errors, latency_ms (p50/p95/p99/mean/max), throughput_rps, images_per_second
+    """
+    latencies = np.asarray(latencies_ms, dtype='float64')
+    ok = np.asarray(statuses) == 200
+    summary = {
+        'requests': int(len(latencies)),
+        'errors': int((~ok).sum()),
+        'seconds': elapsed,
+        'throughput_rps': float(ok.sum() / elapsed) if elapsed > 0 else 0.0,
+        'images_per_second': float(ok.sum() * images_per_request / elapsed) if elapsed > 0 else 0.0,
+        'latency_ms': None,
+    }
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        summary['latency_ms'] = {
+            'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+            'mean': float(latencies.mean()), 'max': float(latencies.max()),
+        }
+    return summary
+
+def run_closed_loop(url, path, payloads, content_type, concurrency, duration, images_per_request=1):
+    """Drives the server with back-to-back requests from concurrent clients.
+
+    Args:
+        url (str): Server base URL
+        path (str): Endpoint, e.g. '/predict'
+        payloads (list): Request bodies, cycled through by each client
+        content_type (str): Content-Type of the bodies
+        concurrency (int): Number of clients
+        duration (float): Seconds to run
+        images_per_request (int, optional): Images per body, for images/s. Defaults to 1.
+
+    Returns:
+        dict: See summarize
+    """
+    results = [[] for _ in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def client_loop(index):
+        client = Client(url)
+        records = results[index]
+        position = index
+        barrier.wait()
+        while time.perf_counter() < deadline[0]:
+            body = payloads[position % len(payloads)]
+            position += concurrency
+            started = time.perf_counter()
+            status = client.post(path, body, content_type)
+            records.append(((time.perf_counter() - started) * 1000, status))
+        client.close()
+
+    threads = [threading.Thread(target=client_loop, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    deadline[0] = started + duration
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    records = [record for client_records in results for record in client_records]
+    return summarize([r[0] for r in records], [r[1] for r in records], elapsed, images_per_request)
+
+def run_open_loop(url, path, payloads, content_type, rate, duration, max_clients=64, images_per_request=1, seed=0):
+    """Sends requests on a Poisson arrival schedule at a fixed rate.
+
+    Args:
+        url (str): Server base URL
+        path (str): Endpoint, e.g. '/predict'
+        payloads (list): Request bodies, used in turn
+        content_type (str): Content-Type of the bodies
+        rate (float): Mean arrivals per second
+        duration (float): Seconds of arrivals to schedule
+        max_clients (int, optional): Client threads available to send. Defaults to 64.
+        images_per_request (int, optional): Images per body, for images/s. Defaults to 1.
+        seed (int, optional): Seed of the arrival schedule. Defaults to 0.
+
+    Returns:
+        dict: See summarize, plus the offered rate
+    """
+    rng = random.Random(seed)
+    arrivals = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            break
+        arrivals.append(t)
+
+    pending = queue.Queue()
+    records = []
+    lock = threading.Lock()
+
+    def client_loop():
+        client = Client(url)
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            scheduled, body = item
+            status = client.post(path, body, content_type)
+            latency = (time.perf_counter() - scheduled) * 1000
+            with lock:
+                records.append((latency, status))
+        client.close()
+
+    threads = [threading.Thread(target=client_loop, daemon=True) for _ in range(max_clients)]
+    for thread in threads:
+        thread.start()
+
+    started = time.perf_counter()
+    for i, offset in enumerate(arrivals):
+        scheduled = started + offset
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((scheduled, payloads[i % len(payloads)]))
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    summary = summarize([r[0] for r in records], [r[1] for r in records], elapsed, images_per_request)
+    summary['offered_rps'] = rate
+    return summary
+
+def _children(pid):
+    """Direct children of a process, found by scanning /proc"""
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name may contain spaces; fields resume after the last ')'
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+def process_tree(pid):
+    """A process and all its descendants"""
+    tree = [pid]
+    for child in _children(pid):
+        tree.extend(process_tree(child))
+    return tree
+
+def process_stats(pid):
+    """CPU time and memory of a process tree (Linux /proc).
+
+    PSS splits pages shared between processes (e.g. weights inherited from a
+    preloading gunicorn master) among them, so unlike RSS it can be summed
+    over the tree.
+
+    Returns:
+        dict: cpu_seconds, rss_mb and pss_mb (None where unavailable)
+    """
+    ticks = os.sysconf('SC_CLK_TCK')
+    cpu = rss = 0.0
+    pss = 0.0
+    has_pss = True
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/stat") as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+            cpu += (int(fields[11]) + int(fields[12])) / ticks
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1]) / 1024
+            try:
+                with open(f"/proc/{member}/smaps_rollup") as f:
+                    for line in f:
+                        if line.startswith('Pss:'):
+                            pss += int(line.split()[1]) / 1024
+            except OSError:
+                has_pss = False
+        except OSError:
+            continue
+    return {'cpu_seconds': cpu, 'rss_mb': rss, 'pss_mb': pss if has_pss else None}
+
+class ResourceSampler:
+    """Samples a process tree in the background and keeps its peak memory"""
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.peak_pss_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start_stats = process_stats(self.pid)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        stats = process_stats(self.pid)
+        self.peak_rss_mb = max(self.peak_rss_mb, stats['rss_mb'])
+        if stats['pss_mb'] is not None:
+            self.peak_pss_mb = max(self.peak_pss_mb or 0.0, stats['pss_mb'])
+        return stats
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end_stats = self._sample()
+
+    def report(self, requests):
+        """Server-side resource use over the sampled interval"""
+        cpu_seconds = self.end_stats['cpu_seconds'] - self.start_stats['cpu_seconds']
+        return {
+            'server_cpu_seconds': cpu_seconds,
+            'server_cpu_ms_per_request': cpu_seconds * 1000 / requests if requests else None,
+            'server_rss_mb_peak': self.peak_rss_mb,
+            'server_pss_mb_peak': self.peak_pss_mb,
+        }
@@ -0,0 +1,64 @@
+"""
+Gunicorn settings for the digit classifier.
+
+The app is imported once in the master (``preload_app``) and fork-safe
+backends are loaded there a single time, before any worker is forked, so the
+workers share them copy-on-write. Each worker then makes sure its model is
+ready before accepting requests.
+"""
+import os
+import logging
+import tempfile
+
+# Workers share their Prometheus metrics through memory-mapped files (see
+# src/multiprocess_metrics.py). The directory must be set, and emptied of the
+# previous run's files, before the app (and prometheus_client) is imported.
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'digit-classifier-metrics')
+)
+if os.environ['PROMETHEUS_MULTIPROC_DIR']:
+    from src.multiprocess_metrics import reset_directory
+    reset_directory(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+# SERVER_MODE=asgi serves src.asgi:app from an event loop per worker (see src/asgi.py)
+worker_class = 'uvicorn.workers.UvicornWorker' if os.environ.get('SERVER_MODE', 'wsgi').lower() == 'asgi' else 'gthread'
+timeout = 120
+graceful_timeout = 30
+preload_app = True
+
+def when_ready(server):
+    """Preload fork-safe backends in the master before workers are forked"""
+    from src.app import model_manager
+    model_manager.preload()
+
+def pre_fork(server, worker):
+    """Give the new worker the lowest web worker index not in use"""
+    taken = {getattr(w, 'web_worker_index', None) for w in server.WORKERS.values()}
+    worker.web_worker_index = next(i for i in range(len(taken) + 1) if i not in taken)
+
+def post_fork(server, worker):
+    """Tell the worker its index, so its inference pool pins to its own share of the CPUs"""
+    os.environ['WEB_WORKER_INDEX'] = str(worker.web_worker_index)
+    os.environ['WEB_WORKERS'] = str(server.num_workers)
+
+def post_worker_init(worker):
+    """Load (or adopt the preloaded) model in the worker before it serves"""
+    from src.app import model_manager
+    from src.profiler import start_continuous_profiling
+
+    # Sampler threads do not survive fork, so each worker starts its own
+    start_continuous_profiling()
+    try:
+        model_manager.get()
+    except Exception as e:
+        # The worker still starts; /predict retries the load and /health reports the error
+        logging.error(f"Worker {worker.pid} failed to load model: {str(e)}")
+
+def child_exit(server, worker):
+    """Fold an exited worker's metrics into the totals and drop its gauges"""
+    from src.multiprocess_metrics import merge_dead_processes
+    merge_dead_processes([worker.pid])
@@ -1,20 +1,18 @@
 #!/bin/bash
 set -e
 
-echo "Initializing model..."
+echo "Preparing model artifacts..."
 
-# Initialize the model
-python3 -c "from src.app import initialize_model; initialize_model()"
+# Train/export the model once if it is missing, so workers only load it
+python3 -c "from src.app import prepare_model_artifacts; prepare_model_artifacts()"
 
 # Start Flask application...
 echo "Starting Flask application..."
 echo "Waiting for Flask to start on 0.0.0.0:${PORT:-8080}..."
 
-# Start the Flask application with gunicorn
-exec gunicorn --bind 0.0.0.0:${PORT:-8080} \
-    --workers 2 \
-    --threads 4 \
-    --worker-class gthread \
-    --timeout 120 \
-    --graceful-timeout 30 \
-    "src.app:app" 
\ No newline at end of file
+# Start the Flask application with gunicorn (settings and worker hooks in docker/gunicorn.conf.py);
+# SERVER_MODE=asgi serves it through the ASGI entry point instead
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    exec gunicorn --config docker/gunicorn.conf.py "src.asgi:app"
+fi
+exec gunicorn --config docker/gunicorn.conf.py "src.app:app"
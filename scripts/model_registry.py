@@ -0,0 +1,69 @@
+"""
+Manage the local model registry served with MODEL_REGISTRY_DIR.
+
+    python scripts/model_registry.py list
+    python scripts/model_registry.py publish --tflite dynamic --metadata note="retrained on new data"
+    python scripts/model_registry.py activate v3
+
+Servers watching the registry swap in a newly activated version without a
+restart; activating an older version rolls back.
+"""
+import os
+import sys
+import argparse
+import logging
+
+# Add the src directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.model import tflite_model_path, weight_store_path, TFLITE_QUANTIZATIONS
+from src.registry import ModelRegistry
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Manage the local model registry")
+    parser.add_argument(
+        '--registry', default=os.environ.get('MODEL_REGISTRY_DIR', 'models/registry'),
+        help="Registry directory (default: MODEL_REGISTRY_DIR or models/registry)"
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help="List published versions")
+
+    publish = commands.add_parser('publish', help="Publish the model exported under models/ as a new version")
+    publish.add_argument('--version', help="Version name (default: the next v<N>)")
+    publish.add_argument(
+        '--tflite', nargs='+', choices=TFLITE_QUANTIZATIONS, default=[],
+        help="Include these exported TFLite models"
+    )
+    publish.add_argument('--metadata', nargs='+', default=[], metavar='KEY=VALUE', help="Extra metadata to record")
+    publish.add_argument('--no-activate', action='store_true', help="Publish without serving it yet")
+
+    activate = commands.add_parser('activate', help="Serve a published version")
+    activate.add_argument('version')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    registry = ModelRegistry(args.registry)
+
+    if args.command == 'list':
+        current = registry.current_version()
+        for metadata in registry.versions():
+            marker = '*' if metadata['version'] == current else ' '
+            extra = {key: value for key, value in metadata.items() if key not in ('version', 'created_at', 'artifacts')}
+            print(f"{marker} {metadata['version']:<10} {metadata['created_at']}  {', '.join(metadata['artifacts'])}  {extra or ''}")
+    elif args.command == 'publish':
+        artifacts = [weight_store_path()] + [tflite_model_path(quantization) for quantization in args.tflite]
+        missing = [str(path) for path in artifacts if not path.exists()]
+        if missing:
+            logging.error(f"Missing exported artifacts: {', '.join(missing)}; run scripts/train_model.py first")
+            return 1
+        metadata = dict(item.split('=', 1) for item in args.metadata)
+        registry.publish(artifacts, args.version, metadata, activate=not args.no_activate)
+    elif args.command == 'activate':
+        registry.activate(args.version)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
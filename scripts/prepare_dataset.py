@@ -0,0 +1,50 @@
+"""
+Build or verify the local MNIST cache used by training and the dev server.
+
+    python scripts/prepare_dataset.py
+    python scripts/prepare_dataset.py --source ~/Downloads/mnist/ --rebuild
+    python scripts/prepare_dataset.py --verify --offline
+
+The source is an mnist.npz file or a directory of the four IDX files
+(optionally gzipped). Without one, the Keras download cache is used, or
+mnist.npz is downloaded unless --offline is given.
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+
+# Add the src directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.dataset import DATASET_CACHE_DIR, build_cache, open_dataset
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build or verify the local MNIST cache")
+    parser.add_argument('--source', help="mnist.npz or a directory of IDX files (default: MNIST_SOURCE)")
+    parser.add_argument(
+        '--cache-dir', default=str(DATASET_CACHE_DIR),
+        help="Cache directory (default: DATASET_CACHE_DIR or data/mnist)"
+    )
+    parser.add_argument('--rebuild', action='store_true', help="Rebuild even if the cache is valid")
+    parser.add_argument('--verify', action='store_true', help="Re-hash every cached file")
+    parser.add_argument('--offline', action='store_true', help="Never download")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    offline = True if args.offline else None
+    try:
+        if args.rebuild:
+            build_cache(args.cache_dir, args.source, offline)
+        dataset = open_dataset(args.cache_dir, args.source, verify=args.verify, offline=offline)
+    except (FileNotFoundError, ValueError) as e:
+        logging.error(str(e))
+        return 1
+    print(json.dumps(dataset.manifest, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
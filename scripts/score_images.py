@@ -0,0 +1,102 @@
+"""
+Score a large collection of digit images offline.
+
+    python scripts/score_images.py archive/2024-06.npy --output scores/2024-06
+    python scripts/score_images.py t10k-images-idx3-ubyte --output scores/t10k --backend tflite --workers 8
+    python scripts/score_images.py uploads/ --output scores/uploads --registry models/registry --version v3
+
+Inputs are .npy arrays of 28x28 images, uncompressed IDX image files, or
+directories of PNG/JPEG pictures (normalized like /predict uploads). Results
+go to labels.npy and probabilities.npy in the output directory, with
+checkpoints; run the same command again to resume an interrupted run. A
+throughput report is logged and written to report.json.
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+
+# Add the src directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.process_pool import ProcessPoolEngine, load_replica
+from src.registry import ModelRegistry
+from src.scoring import open_images, score_images
+
+# Each worker runs a whole model replica, so a few are enough to keep the CPUs busy
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score digit images in bulk")
+    parser.add_argument('input', help=".npy file, IDX file or directory of PNG/JPEG images")
+    parser.add_argument('--output', required=True, help="Directory for labels, probabilities and checkpoints")
+    parser.add_argument('--batch-size', type=int, default=1024, help="Images per forward pass (default: 1024)")
+    parser.add_argument(
+        '--workers', type=int, default=DEFAULT_WORKERS,
+        help=f"Inference worker processes; 0 scores in this process (default: {DEFAULT_WORKERS})"
+    )
+    parser.add_argument(
+        '--cpus', default=os.getenv('INFERENCE_WORKER_CPUS'),
+        help="Pin workers to disjoint CPU sets: 'auto', a list such as 0-7, or 'none' "
+             "(default: INFERENCE_WORKER_CPUS, else auto with more than one worker)"
+    )
+    parser.add_argument(
+        '--backend', default=os.getenv('INFERENCE_BACKEND', 'compiled'),
+        help="Inference engine (default: INFERENCE_BACKEND or compiled)"
+    )
+    parser.add_argument(
+        '--registry', default=os.getenv('MODEL_REGISTRY_DIR'),
+        help="Score with a version from this model registry (default: MODEL_REGISTRY_DIR)"
+    )
+    parser.add_argument('--version', help="Registry version (default: the active one)")
+    parser.add_argument(
+        '--checkpoint-every', type=int, default=100000,
+        help="Images between checkpoints (default: 100000)"
+    )
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint and start over")
+    parser.add_argument('--log-every', type=float, default=10.0, help="Seconds between progress lines")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    model_source = None
+    if args.registry:
+        registry = ModelRegistry(args.registry)
+        version = args.version or registry.current_version()
+        if version is None:
+            logging.error(f"No model published in {args.registry}")
+            return 1
+        model_source = (str(registry.root), version)
+
+    backend = args.backend.lower()
+    cpus = args.cpus
+    if cpus is None and args.workers > 1:
+        # Pinned workers size their thread pools to their share, instead of each using every CPU
+        cpus = 'auto'
+    elif cpus == 'none':
+        cpus = None
+    source = open_images(args.input)
+    if args.workers > 0:
+        engine = ProcessPoolEngine(
+            backend, args.workers, slots=2, slot_images=args.batch_size, cpus=cpus, source=model_source
+        )
+    else:
+        engine = load_replica(backend, source=model_source)
+    try:
+        report = score_images(
+            source, engine, args.output, batch_size=args.batch_size,
+            checkpoint_every=args.checkpoint_every, restart=args.restart, log_every=args.log_every
+        )
+    finally:
+        close = getattr(engine, 'close', None)
+        if close is not None:
+            close()
+        source.close()
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
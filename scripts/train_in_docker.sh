@@ -3,7 +3,12 @@
 # Build a temporary Docker image for training
 docker build -f docker/Dockerfile.train -t digit-classifier-train .
 
-# Run the training
-docker run -v $(pwd)/models:/app/models digit-classifier-train
+# Run the training; any arguments are passed to scripts/train_model.py,
+# e.g. --strategy mirrored --replicas 4 --mixed-precision --report models/train_report.json
+if [ $# -gt 0 ]; then
+    docker run -v $(pwd)/models:/app/models digit-classifier-train python3 scripts/train_model.py "$@"
+else
+    docker run -v $(pwd)/models:/app/models digit-classifier-train
+fi
 
-echo "Training completed. Model saved in ./models directory" 
\ No newline at end of file
+echo "Training completed. Model saved in ./models directory"
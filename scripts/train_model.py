@@ -1,26 +1,256 @@
 import os
 import sys
+import json
+import argparse
 import logging
 
 # Add the src directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.model import load_and_preprocess_data, create_and_train_model
+from src.model import (
+    load_raw_data, create_and_train_model, export_tflite_model, load_trained_model, save_trained_model,
+    sample_calibration_images, numpy_model_path, make_dataset, measure_pipeline_throughput,
+    tflite_model_path, weight_store_path, TFLITE_QUANTIZATIONS
+)
+from src.distillation import (
+    DEFAULT_ALPHA, DEFAULT_STUDENTS, DEFAULT_TEMPERATURE, DISTILLATION_BACKENDS, distill, format_report
+)
+from src.numpy_engine import export_numpy_model
+from src.registry import ModelRegistry
+from src.telemetry import TELEMETRY_LEVELS
+from src.training import (
+    STRATEGIES, LR_SCALING_RULES, BASE_LEARNING_RATE, configure_threads, create_strategy,
+    is_chief, scale_hyperparameters, set_mixed_precision, threads_from_env
+)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the digit classifier")
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument(
+        '--tflite', nargs='+', choices=TFLITE_QUANTIZATIONS, default=[],
+        help="Also export post-training quantized TFLite models"
+    )
+    parser.add_argument(
+        '--numpy', action='store_true',
+        help="Also export BatchNorm-folded weights for the TensorFlow-free numpy backend"
+    )
+    parser.add_argument(
+        '--calibration-samples', type=int, default=500,
+        help="Number of training images used to calibrate int8 quantization"
+    )
+    parser.add_argument(
+        '--augment', action='store_true',
+        help="Augment training batches with random shifts, rotations and elastic distortions"
+    )
+    parser.add_argument(
+        '--shards', default=os.getenv('TRAIN_DATA_SHARDS'),
+        help="Glob of extra TFRecord training shards, e.g. 'data/shards/*.tfrecord'"
+    )
+    parser.add_argument('--strategy', choices=STRATEGIES, default='default', help="tf.distribute strategy")
+    parser.add_argument(
+        '--replicas', type=int, default=None,
+        help="Logical CPU devices for the mirrored strategy (default: 2)"
+    )
+    intra_op, inter_op = threads_from_env()
+    parser.add_argument('--intra-op-threads', type=int, default=intra_op, help="Threads used inside one op")
+    parser.add_argument('--inter-op-threads', type=int, default=inter_op, help="Ops run concurrently")
+    parser.add_argument(
+        '--mixed-precision', action='store_true',
+        help="Compute in bfloat16 with float32 variables"
+    )
+    parser.add_argument('--batch-size', type=int, default=128, help="Batch size per replica")
+    parser.add_argument(
+        '--learning-rate', type=float, default=BASE_LEARNING_RATE,
+        help="Learning rate for a global batch of 128, scaled with --lr-scaling"
+    )
+    parser.add_argument(
+        '--lr-scaling', choices=LR_SCALING_RULES, default='linear',
+        help="How the learning rate follows the global batch size"
+    )
+    parser.add_argument('--report', help="Write the run's configuration and per-epoch throughput to this JSON file")
+    parser.add_argument(
+        '--publish', metavar='REGISTRY_DIR', default=os.environ.get('MODEL_REGISTRY_DIR'),
+        help="Publish the trained model as a new version in this registry and activate it (default: MODEL_REGISTRY_DIR)"
+    )
+    parser.add_argument('--version', help="Name of the published version (default: the next v<N>)")
+    parser.add_argument(
+        '--telemetry', choices=TELEMETRY_LEVELS, default=os.getenv('TRAIN_TELEMETRY_LEVEL', 'basic'),
+        help="TensorBoard telemetry: epoch metrics and step timing (basic), plus sampled weight histograms (detailed)"
+    )
+    parser.add_argument(
+        '--pipeline-benchmark', type=int, default=0, metavar='BATCHES',
+        help="Report input pipeline throughput over this many batches before training"
+    )
+    distillation = parser.add_argument_group(
+        'distillation', "Train smaller students from the saved model instead of training it (see src/distillation.py)"
+    )
+    distillation.add_argument(
+        '--distill', action='store_true',
+        help="Distill the saved model into each student, report accuracy and latency, and save the selected student"
+    )
+    distillation.add_argument(
+        '--students', default=','.join(DEFAULT_STUDENTS),
+        help="Comma-separated student specs 'F1-F2[-F3]/D': conv filters per block, hidden dense units"
+    )
+    latency_target = os.getenv('DISTILL_LATENCY_TARGET_MS')
+    distillation.add_argument(
+        '--latency-target-ms', type=float, default=float(latency_target) if latency_target else None,
+        help="Single-image p95 latency budget of the saved student (default: DISTILL_LATENCY_TARGET_MS, "
+             "else the most accurate student)"
+    )
+    backend = os.getenv('INFERENCE_BACKEND', 'compiled').lower()
+    distillation.add_argument(
+        '--distill-backend', choices=DISTILLATION_BACKENDS,
+        default=backend if backend in DISTILLATION_BACKENDS else 'compiled',
+        help="Inference engine latency is measured on (default: INFERENCE_BACKEND, else compiled)"
+    )
+    distillation.add_argument('--temperature', type=float, default=DEFAULT_TEMPERATURE, help="Softening temperature")
+    distillation.add_argument(
+        '--distill-alpha', type=float, default=DEFAULT_ALPHA,
+        help="Weight of the labels in the loss; the rest goes to the teacher's predictions"
+    )
+    distillation.add_argument('--latency-iterations', type=int, default=200, help="Timed calls per batch size")
+    args = parser.parse_args()
+    if args.distill and (args.strategy != 'default' or args.mixed_precision):
+        parser.error("--distill trains on one device in float32; drop --strategy and --mixed-precision")
+    args.students = [spec.strip() for spec in args.students.split(',') if spec.strip()]
+    if args.distill and not args.students:
+        parser.error("--students needs at least one student spec, e.g. '16-32/64'")
+    return args
+
+def run_distillation(args, x_train, y_train, x_test, y_test, batch_size, learning_rate, logger):
+    """Distills the saved model into the students and saves the selected one.
+
+    Returns:
+        tuple: (selected student or None, its test accuracy)
+    """
+    teacher = load_trained_model()
+    if teacher is None:
+        raise FileNotFoundError("--distill needs a trained teacher; train the model without --distill first")
+
+    report, student = distill(
+        teacher, x_train, y_train, x_test, y_test,
+        students=args.students,
+        latency_target_ms=args.latency_target_ms, backend=args.distill_backend,
+        epochs=args.epochs, batch_size=batch_size, learning_rate=learning_rate,
+        temperature=args.temperature, alpha=args.distill_alpha, iterations=args.latency_iterations
+    )
+    print(format_report(report))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Distillation report written to {args.report}")
+
+    if student is None:
+        # select_student only comes back empty when a latency target excluded every student
+        logger.error(f"No student meets the latency target of {args.latency_target_ms} ms; the saved model is unchanged")
+        return None, None
+    # The student replaces the teacher; publish to the registry to keep both
+    save_trained_model(student)
+    selected = next(c for c in report['candidates'] if c['name'] == report['selected'])
+    logger.info(f"Saved student {report['selected']} as the trained model")
+    return student, selected['accuracy']
 
 def main():
+    args = parse_args()
     logging.basicConfig(level=logging.INFO)
     logger = logging.getLogger(__name__)
     
     try:
+        # Thread pools and logical devices are fixed once TensorFlow starts running ops
+        configure_threads(args.intra_op_threads, args.inter_op_threads)
+        strategy = create_strategy(args.strategy, args.replicas)
+        set_mixed_precision(args.mixed_precision)
+        batch_size, learning_rate = scale_hyperparameters(
+            args.batch_size, strategy.num_replicas_in_sync, args.learning_rate, rule=args.lr_scaling
+        )
+        logger.info(f"Global batch size {batch_size}, learning rate {learning_rate:g}")
+
         logger.info("Loading MNIST data...")
-        x_train, y_train, x_test, y_test = load_and_preprocess_data()
-        
-        logger.info("Training model...")
-        model = create_and_train_model(x_train, y_train, epochs=10, save_model=True)
+        # Memory-mapped uint8 arrays from the local cache; batches are normalized as they are used
+        x_train, y_train, x_test, y_test = load_raw_data()
         
-        # Evaluate the model
-        test_loss, test_accuracy = model.evaluate(x_test, y_test, verbose=1)
-        logger.info(f"Test accuracy: {test_accuracy:.4f}")
+        if args.pipeline_benchmark:
+            dataset = make_dataset(x_train, y_train, shard_pattern=args.shards, batch_size=batch_size, augment=args.augment)
+            measure_pipeline_throughput(dataset, args.pipeline_benchmark)
+
+        # Only one process of a multi-worker run writes the model
+        chief = is_chief()
+        if args.distill:
+            model, test_accuracy = run_distillation(
+                args, x_train, y_train, x_test, y_test, batch_size, learning_rate, logger
+            )
+            if model is None:
+                return 1
+            # Exports left over from the teacher would keep serving it; refresh them from the student
+            stale = [q for q in TFLITE_QUANTIZATIONS if q not in args.tflite and tflite_model_path(q).exists()]
+            if stale:
+                logger.info(f"Re-exporting the {', '.join(stale)} TFLite model(s) from the student")
+                args.tflite = args.tflite + stale
+            if not args.numpy and numpy_model_path().exists():
+                logger.info("Re-exporting the NumPy weights from the student")
+                args.numpy = True
+        else:
+            logger.info("Training model...")
+            model = create_and_train_model(
+                x_train, y_train, epochs=args.epochs, save_model=chief,
+                augment=args.augment, shard_pattern=args.shards,
+                batch_size=batch_size, learning_rate=learning_rate, strategy=strategy,
+                telemetry_level=args.telemetry
+            )
+
+            # Evaluate the model
+            test_loss, test_accuracy = model.evaluate(
+                make_dataset(x_test, y_test, batch_size=batch_size, training=False), verbose=1
+            )
+            logger.info(f"Test accuracy: {test_accuracy:.4f}")
+
+        history = model.history.history if model.history is not None else {}
+        # The distillation report was written by run_distillation
+        if args.report and chief and not args.distill:
+            report = {
+                'strategy': args.strategy,
+                'replicas': strategy.num_replicas_in_sync,
+                'intra_op_threads': args.intra_op_threads,
+                'inter_op_threads': args.inter_op_threads,
+                'mixed_precision': args.mixed_precision,
+                'global_batch_size': batch_size,
+                'learning_rate': learning_rate,
+                'epoch_seconds': [float(value) for value in history.get('epoch_seconds', [])],
+                'samples_per_second': [float(value) for value in history.get('samples_per_second', [])],
+                # Mean milliseconds per training step, with --telemetry basic or detailed
+                'step_timing_ms': {
+                    part: [float(value) for value in history.get(f'{part}_ms', [])]
+                    for part in ('data_wait', 'compute', 'callbacks')
+                },
+                'test_accuracy': float(test_accuracy),
+            }
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"Training report written to {args.report}")
+
+        if not chief:
+            return 0
+
+        artifacts = [weight_store_path()]
+        if args.tflite:
+            calibration_images = sample_calibration_images(x_train, args.calibration_samples)
+            for quantization in args.tflite:
+                logger.info(f"Exporting {quantization} TFLite model...")
+                artifacts.append(export_tflite_model(model, quantization, calibration_images))
+
+        if args.numpy:
+            logger.info("Exporting NumPy weights...")
+            export_numpy_model(model, numpy_model_path())
+
+        if args.publish:
+            version = ModelRegistry(args.publish).publish(artifacts, args.version, metadata={
+                'test_accuracy': float(test_accuracy),
+                'epochs': args.epochs,
+                'global_batch_size': batch_size,
+                **({'student': model.name} if args.distill else {}),
+            })
+            logger.info(f"Published and activated model version {version} in {args.publish}")
         
         logger.info("Model training completed and saved successfully")
         return 0
@@ -1,140 +1,223 @@
 from flask import Flask, request, jsonify, render_template_string, g, Response
-from .model import load_and_preprocess_data, create_and_train_model, predict, load_trained_model
-from .monitor import before_request, record_prediction, set_model_info, start_request
+from .model import load_raw_data, create_and_train_model, predict, predict_batch, load_trained_model
+from .inference import artifact_path, create_engine, load_engine
+from .lifecycle import ModelManager
+from .health import create_health_monitor
+from .process_pool import InferenceTimeout, create_worker_pool, inference_workers_from_env
+from .registry import registry_from_env
+from .cache import create_cache
+from .codec import BINARY_MIMETYPE, decode_images, encode_predictions
+from .imaging import IMAGE_MIMETYPES, decode_image_file, normalize_digit
+from .multiprocess_metrics import metrics_registry
+from .monitor import before_request, record_prediction, record_predictions, start_request, time_stage
+from .profiler import profile_window, request_finished, request_started, start_continuous_profiling
+from .logging_setup import add_request_id_header, assign_request_id, configure_logging, log_request
 from prometheus_client import make_wsgi_app
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 import numpy as np
 import logging
 import subprocess
+import socket
+import threading
 from pathlib import Path
 import atexit
 import time
 import os
 import signal
 import requests
-import threading
 
 app = Flask(__name__)
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+configure_logging()
 
-# Add prometheus wsgi middleware to route /metrics requests
+# Add prometheus wsgi middleware to route /metrics requests; under gunicorn
+# it serves the metrics of all workers (see src/multiprocess_metrics.py)
 app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {
-    '/metrics': make_wsgi_app()
+    '/metrics': make_wsgi_app(metrics_registry())
 })
 
 # Register the monitoring functions
 app.before_request(start_request)
 app.after_request(before_request)
 
+# Let the sampling profiler see which threads are serving requests
+app.before_request(request_started)
+app.teardown_request(request_finished)
+
+# Tag every request with an ID and decide whether its routine logs are sampled
+app.before_request(assign_request_id)
+app.after_request(add_request_id_header)
+
 # Global variables
 tensorboard_process = None
-model = None
-model_initialization_thread = None
-model_initialization_started = False
+# PID of the process that started tensorboard_process
+tensorboard_owner = None
+tensorboard_launcher = None
+tensorboard_lock = threading.Lock()
 
-def initialize_model():
-    """Initialize the model based on environment"""
-    global model
-    
-    try:
-        is_development = os.environ.get('PYTHON_ENV', 'production') == 'development'
-        logging.info(f"Initializing model in {'development' if is_development else 'production'} mode")
-        
-        # Create necessary directories
-        Path("logs/fit").mkdir(parents=True, exist_ok=True)
-        Path("models").mkdir(parents=True, exist_ok=True)
-        
-        if model is not None:
-            logging.info("Model already initialized")
-            return model
-            
-        if is_development:
-            # In development, train a new model
-            logging.info("Development mode: Training new model...")
-            x_train, y_train, _, _ = load_and_preprocess_data()
-            model = create_and_train_model(x_train, y_train, epochs=5)
-        else:
-            # In production, load pre-trained model
-            logging.info("Production mode: Loading pre-trained model...")
-            model = load_trained_model()
-            if model is None:
+# Seconds TensorBoard must stay up after launch to count as started
+TENSORBOARD_STARTUP_SECONDS = 3
+
+# Upper bound on the number of images accepted by /predict/batch
+MAX_BATCH_IMAGES = int(os.environ.get('MAX_BATCH_IMAGES', '1024'))
+
+def load_or_train_model():
+    """Load (or train) the serving model based on environment"""
+    is_development = os.environ.get('PYTHON_ENV', 'production') == 'development'
+    logging.info(f"Initializing model in {'development' if is_development else 'production'} mode")
+
+    # Create necessary directories
+    Path("logs/fit").mkdir(parents=True, exist_ok=True)
+    Path("models").mkdir(parents=True, exist_ok=True)
+
+    if is_development:
+        # In development, train a new model
+        logging.info("Development mode: Training new model...")
+        x_train, y_train, _, _ = load_raw_data()
+        model = create_engine(create_and_train_model(x_train, y_train, epochs=5))
+    else:
+        # In production, serve an exported engine directly when the backend
+        # has one, otherwise load the pre-trained Keras model
+        logging.info("Production mode: Loading pre-trained model...")
+        model = load_engine()
+        if model is None:
+            keras_model = load_trained_model()
+            if keras_model is None:
                 logging.warning("No pre-trained model found! Training new model...")
-                x_train, y_train, _, _ = load_and_preprocess_data()
-                model = create_and_train_model(x_train, y_train, epochs=10)
+                x_train, y_train, _, _ = load_raw_data()
+                keras_model = create_and_train_model(x_train, y_train, epochs=10)
                 logging.info("New model trained successfully")
-        
-        if model is not None:
-            logging.info("Model initialized successfully")
-            set_model_info(model)
-            # Start TensorBoard after model is loaded/trained
-            start_tensorboard()
-        else:
-            logging.error("Failed to initialize model")
-        
-        return model
+            model = create_engine(keras_model)
+
+    logging.info("Model initialized successfully")
+    return model
+
+# Versioned models to serve, if MODEL_REGISTRY_DIR is set
+model_registry = registry_from_env()
+
+def load_model(version=None):
+    """Load the serving model for this process.
+
+    Args:
+        version (str, optional): Registry version to load. Defaults to the
+            registry's current version, or the exported model without a registry.
+    """
+    if version is None and model_registry is not None:
+        version = model_registry.current_version()
+    if inference_workers_from_env() > 0:
+        # Each inference worker loads its own replica of the model
+        if version is None:
+            prepare_model_artifacts()
+        model = create_worker_pool(source=(str(model_registry.root), version) if version else None)
+    elif version is not None:
+        model = model_registry.load_engine(version)
+    else:
+        model = load_or_train_model()
+    # Start TensorBoard after model is loaded/trained
+    start_tensorboard()
+    return model
+
+model_manager = ModelManager(load_model, model_registry)
+
+# Cached inference check behind the health endpoints
+health_monitor = create_health_monitor(model_manager)
+
+# Results of recent predictions, keyed by image and model version
+prediction_cache = create_cache()
+
+def initialize_model():
+    """Initialize the model in this process, loading it on first call"""
+    try:
+        return model_manager.get()
     except Exception as e:
         logging.error(f"Error initializing model: {str(e)}")
-        model = None  # Ensure model is None on failure
         raise
 
+def prepare_model_artifacts():
+    """Train and export whatever the configured backend needs, if missing.
+
+    Run once before gunicorn starts so that workers only ever load the model
+    and never train it concurrently.
+    """
+    if model_registry is not None and model_registry.current_version() is not None:
+        logging.info(f"Serving model version {model_registry.current_version()} from {model_registry.root}")
+        return
+    if artifact_path().exists():
+        logging.info(f"Model artifact {artifact_path()} found")
+        return
+    load_or_train_model()
+
+def serving_model():
+    """The model version for this process (a ServingModel), or None if it cannot be loaded"""
+    try:
+        return model_manager.current()
+    except Exception as e:
+        logging.error(f"Model not initialized: {str(e)}")
+        return None
+
 def start_tensorboard():
-    """Start TensorBoard server"""
-    global tensorboard_process
-    
+    """Start a TensorBoard server in the background.
+
+    Returns immediately: the launch runs on a daemon thread. A TensorBoard
+    already listening on the port, such as another worker's, is left alone.
+    """
+    global tensorboard_launcher
+
     # Skip TensorBoard in production/Fly.io environment
     if os.environ.get('FLY_APP_NAME'):
         logging.info("Skipping TensorBoard in Fly.io environment")
         return
-        
-    if tensorboard_process is not None:
-        logging.info("TensorBoard already running")
+    if os.environ.get('TENSORBOARD_AUTOSTART', '1') != '1':
         return
-        
-    try:
-        Path("logs/fit").mkdir(parents=True, exist_ok=True)
-        tensorboard_port = int(os.environ.get('TENSORBOARD_PORT', '6006'))
-        
-        # Kill any existing TensorBoard processes
-        try:
-            subprocess.run(['pkill', '-f', 'tensorboard'], check=False)
-            time.sleep(1)
-        except Exception as e:
-            logging.warning(f"Failed to kill existing TensorBoard processes: {e}")
-        
-        # Start TensorBoard
-        tensorboard_process = subprocess.Popen(
-            ["tensorboard", "--logdir=logs/fit", f"--port={tensorboard_port}", 
-             "--bind_all", "--reload_multifile=false"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        # Wait for TensorBoard to start
-        time.sleep(3)
-        
-        if tensorboard_process.poll() is not None:
-            stderr = tensorboard_process.stderr.read().decode('utf-8')
-            logging.error(f"TensorBoard process died unexpectedly: {stderr}")
-            tensorboard_process = None
+
+    with tensorboard_lock:
+        if tensorboard_launcher is not None:
             return
-            
-        logging.info("TensorBoard started successfully")
-        
-    except Exception as e:
+        tensorboard_launcher = threading.Thread(target=launch_tensorboard, name='tensorboard-launcher', daemon=True)
+        tensorboard_launcher.start()
+
+def launch_tensorboard():
+    """Start TensorBoard unless its port is taken, and report whether it stays up"""
+    global tensorboard_process, tensorboard_owner
+
+    tensorboard_port = int(os.environ.get('TENSORBOARD_PORT', '6006'))
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        if probe.connect_ex(('127.0.0.1', tensorboard_port)) == 0:
+            logging.info(f"TensorBoard already listening on port {tensorboard_port}")
+            return
+
+    log_dir = os.environ.get('TENSORBOARD_LOG_DIR', 'logs/fit/')
+    Path(log_dir).mkdir(parents=True, exist_ok=True)
+    # TensorBoard's own output goes to a file, so a full pipe can never stall it
+    output_path = Path("logs") / "tensorboard.log"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(output_path, 'ab') as output:
+            process = subprocess.Popen(
+                ["tensorboard", f"--logdir={log_dir}", f"--port={tensorboard_port}",
+                 "--bind_all", "--reload_multifile=false"],
+                stdout=output,
+                stderr=subprocess.STDOUT
+            )
+    except OSError as e:
         logging.error(f"Failed to start TensorBoard: {e}")
-        if tensorboard_process is not None:
-            tensorboard_process.kill()
-            tensorboard_process = None
+        return
+    tensorboard_process, tensorboard_owner = process, os.getpid()
+
+    try:
+        process.wait(timeout=TENSORBOARD_STARTUP_SECONDS)
+    except subprocess.TimeoutExpired:
+        logging.info(f"TensorBoard started on port {tensorboard_port}")
+        return
+    logging.error(f"TensorBoard exited with code {process.returncode}; see {output_path}")
+    tensorboard_process = None
 
 def cleanup_tensorboard():
     """Cleanup TensorBoard process"""
     global tensorboard_process
-    if tensorboard_process:
+    # Forked workers inherit the handle; only the process that started TensorBoard stops it
+    if tensorboard_process and tensorboard_owner == os.getpid():
         logging.info("Shutting down TensorBoard...")
         try:
             os.kill(tensorboard_process.pid, signal.SIGTERM)
@@ -151,100 +234,233 @@ def cleanup_tensorboard():
 # Register cleanup function
 atexit.register(cleanup_tensorboard)
 
-# Initialize model at startup in production only
-if os.environ.get('PYTHON_ENV', 'production') == 'production':
-    initialize_model()
+def wants_binary():
+    """Whether the client asked for a binary prediction response"""
+    return request.accept_mimetypes.best_match(['application/json', BINARY_MIMETYPE]) == BINARY_MIMETYPE
 
-def initialize_model_async():
-    """Initialize model in a separate thread"""
-    global model, model_initialization_thread
-    try:
-        initialize_model()
-    except Exception as e:
-        logging.error(f"Async model initialization failed: {str(e)}")
+# Response header naming the model version that made a prediction
+MODEL_VERSION_HEADER = 'X-Model-Version'
+
+def predictions_response(labels, probabilities, version):
+    """Build a batch prediction response in the format the client accepts"""
+    if wants_binary():
+        response = Response(encode_predictions(labels, probabilities), mimetype=BINARY_MIMETYPE)
+    else:
+        response = jsonify({
+            'predicted_labels': labels.tolist(),
+            'probabilities': probabilities.tolist(),
+            'model_version': version
+        })
+    response.headers[MODEL_VERSION_HEADER] = version
+    return response
+
+def predict_many(images):
+    """Run a validated (N, 784) or (N, 28, 28) batch through one forward pass"""
+    with time_stage('validate'):
+        if len(images) > MAX_BATCH_IMAGES:
+            logging.error(f"Batch of {len(images)} images exceeds limit of {MAX_BATCH_IMAGES}")
+            return jsonify({'error': f'At most {MAX_BATCH_IMAGES} images per request'}), 413
+
+    serving = serving_model()
+    if serving is None:
+        return jsonify({'error': 'Model not initialized'}), 503
+
+    # Hold on to this model version even if a newer one is swapped in meanwhile
+    with serving:
+        with time_stage('inference'):
+            labels, probabilities = predict_batch(serving.model, images)
+    log_request("Batch prediction of %d images", len(labels), images=len(labels), model_version=serving.version)
+
+    with time_stage('postprocess'):
+        record_predictions(labels)
+    with time_stage('serialize'):
+        return predictions_response(labels, probabilities, serving.version)
 
 @app.route('/predict', methods=['POST'])
 def predict_digit():
     """Endpoint for digit prediction"""
     try:
-        logging.info("Received prediction request")
-        
-        if not request.is_json:
-            logging.error("Request Content-Type is not application/json")
-            return jsonify({'error': 'Content-Type must be application/json'}), 400
-            
-        data = request.get_json()
-        logging.info(f"Received data keys: {data.keys() if data else 'None'}")
-        
-        if not data or 'image_data' not in data:
-            logging.error("No image data in request")
-            return jsonify({'error': 'No image data provided'}), 400
+        with time_stage('decode'):
+            # A picture of any size that still needs MNIST normalization
+            picture = None
+            if request.mimetype == BINARY_MIMETYPE:
+                # Raw uint8/float32 pixels, or a framed body carrying several images
+                images = decode_images(request.get_data())
+                image_data = None if len(images) > 1 else images[0]
+            elif request.mimetype in IMAGE_MIMETYPES:
+                picture = decode_image_file(request.get_data())
+            elif request.mimetype == 'multipart/form-data':
+                upload = request.files.get('image')
+                if upload is None:
+                    logging.error("No image file in upload")
+                    return jsonify({'error': "No file provided in the 'image' field"}), 400
+                picture = decode_image_file(upload.read())
+            else:
+                if not request.is_json:
+                    logging.error("Request Content-Type is not application/json")
+                    return jsonify({'error': f"Content-Type must be application/json, {BINARY_MIMETYPE}, {', '.join(IMAGE_MIMETYPES)} or multipart/form-data"}), 400
 
-        image_data = np.array(data['image_data'])
-        logging.info(f"Image data shape before reshape: {image_data.shape}")
-        
-        # Ensure the data is properly shaped
-        if len(image_data.shape) != 1 or image_data.shape[0] != 784:  # 28*28 = 784
-            logging.error(f"Invalid image data shape: {image_data.shape}")
-            return jsonify({'error': 'Invalid image data shape'}), 400
-            
-        image_data = image_data.reshape(28, 28)
-        logging.info(f"Image data shape after reshape: {image_data.shape}")
+                data = request.get_json()
+                if not data or 'image_data' not in data:
+                    logging.error("No image data in request")
+                    return jsonify({'error': 'No image data provided'}), 400
 
-        if model is None:
-            logging.error("Model not initialized")
+                image_data = np.asarray(data['image_data'], dtype='float32')
+                if image_data.ndim == 2 and image_data.shape != (28, 28):
+                    picture = image_data
+        if picture is not None:
+            with time_stage('preprocess'):
+                image_data = normalize_digit(picture)
+        elif image_data is None:
+            return predict_many(images)
+
+        with time_stage('validate'):
+            # Ensure the data is properly shaped
+            if image_data.shape not in ((784,), (28, 28)):  # 28*28 = 784
+                logging.error(f"Invalid image data shape: {image_data.shape}")
+                return jsonify({'error': 'Invalid image data shape'}), 400
+
+        serving = serving_model()
+        if serving is None:
             return jsonify({'error': 'Model not initialized'}), 503
 
-        logging.info("Making prediction")
-        predicted_label, probabilities = predict(model, image_data)
-        logging.info(f"Prediction result: {predicted_label}")
-        
-        record_prediction(predicted_label)
-
-        # probabilities is already a list of floats from the predict function
-        response_data = {
-            'predicted_label': int(predicted_label),
-            'probabilities': probabilities
-        }
-        logging.info("Sending prediction response")
-        return jsonify(response_data)
+        # Hold on to this model version even if a newer one is swapped in meanwhile.
+        # The image is normalized once, straight into the model input buffer
+        # (the batcher's, or this thread's), as part of the inference stage.
+        with serving, time_stage('inference'):
+            if serving.batcher is not None:
+                compute = serving.batcher.predict
+            else:
+                compute = lambda image: predict(serving.model, image)
+            if prediction_cache is not None:
+                predicted_label, probabilities = prediction_cache.lookup(image_data, serving.version, compute)
+            else:
+                predicted_label, probabilities = compute(image_data)
+        log_request("Predicted digit %d", predicted_label, predicted_label=int(predicted_label),
+                    mimetype=request.mimetype, model_version=serving.version)
+
+        with time_stage('postprocess'):
+            record_prediction(predicted_label)
+            # probabilities is already a list of floats from the predict function
+            response_data = {
+                'predicted_label': int(predicted_label),
+                'probabilities': probabilities,
+                'model_version': serving.version
+            }
+
+        with time_stage('serialize'):
+            if wants_binary():
+                response = Response(
+                    encode_predictions([predicted_label], [probabilities]),
+                    mimetype=BINARY_MIMETYPE
+                )
+            else:
+                response = jsonify(response_data)
+            response.headers[MODEL_VERSION_HEADER] = serving.version
+            return response
         
     except ValueError as ve:
         logging.error(f"ValueError in prediction: {ve}")
         return jsonify({'error': f'Invalid input data: {str(ve)}'}), 400
+    except InferenceTimeout as e:
+        # The inference workers are down or hung; another web worker may still serve
+        logging.error(f"Prediction timed out: {e}")
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         logging.error(f"Prediction error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_digit_batch():
+    """Endpoint for predicting many digits in one forward pass"""
+    try:
+        with time_stage('decode'):
+            if request.mimetype == BINARY_MIMETYPE:
+                images = decode_images(request.get_data())
+            else:
+                if not request.is_json:
+                    logging.error("Request Content-Type is not application/json")
+                    return jsonify({'error': f'Content-Type must be application/json or {BINARY_MIMETYPE}'}), 400
+
+                data = request.get_json()
+                if not data or 'image_data' not in data:
+                    logging.error("No image data in request")
+                    return jsonify({'error': 'No image data provided'}), 400
+
+                images = np.asarray(data['image_data'], dtype='float32')
+                if images.ndim not in (2, 3) or images.shape[1:] not in ((784,), (28, 28)) or len(images) == 0:
+                    logging.error(f"Invalid batch shape: {images.shape}")
+                    return jsonify({'error': 'Image data must have shape (N, 784) or (N, 28, 28)'}), 400
+
+        return predict_many(images)
+
+    except ValueError as ve:
+        logging.error(f"ValueError in batch prediction: {ve}")
+        return jsonify({'error': f'Invalid input data: {str(ve)}'}), 400
+    except InferenceTimeout as e:
+        # The inference workers are down or hung; another web worker may still serve
+        logging.error(f"Prediction timed out: {e}")
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        logging.error(f"Batch prediction error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/health')
 def health_check():
-    """Health check endpoint"""
-    global model, model_initialization_thread, model_initialization_started
-    
+    """Health check endpoint, answered from the cached background inference check"""
+    # Report the worker as starting until its model is loaded; loading
+    # itself happens on the first prediction or in gunicorn's post_worker_init
+    health_monitor.start()
+    if model_manager.model is None:
+        if model_manager.error:
+            return f"Model failed to load: {model_manager.error}", 503
+        return "Application starting", 200
+    result = health_monitor.result
+    if result is not None and not result['ok']:
+        return "Model prediction error", 503
+    return "OK", 200
+
+@app.route('/health/live')
+def liveness_check():
+    """Liveness probe: the worker is answering requests and inference is not hung"""
+    alive, reason = health_monitor.live()
+    if not alive:
+        return f"Not alive: {reason}", 503
+    return "OK", 200
+
+@app.route('/health/ready')
+def readiness_check():
+    """Readiness probe: the model is loaded, passes its check, and the worker is keeping up"""
+    ready, details = health_monitor.ready()
+    return jsonify(details), 200 if ready else 503
+
+@app.route('/admin/profile', methods=['POST'])
+def profile_requests():
+    """Samples the stacks of this worker's live requests for a window of time.
+
+    Requires ``Authorization: Bearer <ADMIN_TOKEN>``; disabled when
+    ADMIN_TOKEN is not set. Returns folded stacks for flame graph tools.
+    """
+    token = os.environ.get('ADMIN_TOKEN')
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    if request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'error': 'Unauthorized'}), 401
+
     try:
-        # Start model initialization in background if not started
-        if not model_initialization_started and model is None:
-            model_initialization_started = True
-            model_initialization_thread = threading.Thread(target=initialize_model_async)
-            model_initialization_thread.start()
-            logging.info("Started async model initialization")
-        
-        # Always return 200 during initialization
-        if model is None:
-            return "Application starting", 200
-            
-        # Once model is loaded, do a quick prediction
-        test_data = np.zeros((28, 28))
-        try:
-            predict(model, test_data)
-            return "OK", 200
-        except Exception as e:
-            logging.error(f"Health check prediction failed: {str(e)}")
-            return "Model prediction error", 503
-            
-    except Exception as e:
-        logging.error(f"Health check failed: {str(e)}")
-        return f"Health check error: {str(e)}", 503
+        seconds = float(request.args.get('seconds', '10'))
+        interval = float(request.args.get('interval_ms', '5')) / 1000
+    except ValueError:
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    if not 0 < seconds <= 300 or not 0 < interval <= 1:
+        return jsonify({'error': 'seconds must be in (0, 300] and interval_ms in (0, 1000]'}), 400
+
+    logging.info(f"Profiling live requests for {seconds}s")
+    folded, samples = profile_window(seconds, interval)
+    return Response(folded, mimetype='text/plain', headers={
+        'X-Profile-Samples': str(samples),
+        'X-Profile-Pid': str(os.getpid())
+    })
 
 # Set application start time
 app.start_time = time.time()
@@ -384,40 +600,20 @@ def home():
             canvas.addEventListener('mouseup', stopDrawing);
             canvas.addEventListener('mouseout', stopDrawing);
 
-            function getPixelData() {
-                const scaledCanvas = document.createElement('canvas');
-                scaledCanvas.width = 28;
-                scaledCanvas.height = 28;
-                const scaledCtx = scaledCanvas.getContext('2d');
-                
-                // Use nearest-neighbor interpolation for better digit recognition
-                scaledCtx.imageSmoothingEnabled = false;
-                scaledCtx.drawImage(canvas, 0, 0, 28, 28);
-                
-                const imageData = scaledCtx.getImageData(0, 0, 28, 28);
-                const data = [];
-                
-                // Convert to grayscale and normalize
-                for (let i = 0; i < imageData.data.length; i += 4) {
-                    // Take red channel only since it's grayscale
-                    data.push(imageData.data[i] / 255.0);
-                }
-                
-                return data;
-            }
-
             function predict() {
-                const data = getPixelData();
                 document.getElementById('result').textContent = 'Predicting...';
-                
-                fetch('/predict', {
+
+                // Send the full-size drawing; the server crops, scales and
+                // centers it the way MNIST digits were prepared
+                new Promise(resolve => canvas.toBlob(resolve, 'image/png'))
+                .then(png => fetch('/predict', {
                     method: 'POST',
-                    headers: { 
-                        'Content-Type': 'application/json',
+                    headers: {
+                        'Content-Type': 'image/png',
                         'Accept': 'application/json'
                     },
-                    body: JSON.stringify({ image_data: data })
-                })
+                    body: png
+                }))
                 .then(response => {
                     if (!response.ok) {
                         return response.json().then(err => {
@@ -454,5 +650,9 @@ if __name__ == '__main__':
     # Get port from environment variable or default to 8080
     port = int(os.environ.get('PORT', 8080))
     
+    # Load the model before serving; there is no gunicorn worker hook here
+    initialize_model()
+    start_continuous_profiling()
+
     # Bind to 0.0.0.0 to make the app accessible from outside the container
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
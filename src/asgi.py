@@ -0,0 +1,205 @@
+"""
+ASGI entry point serving the Flask app from an asyncio event loop.
+
+The event loop reads request bodies and writes responses, so idle keep-alive
+connections and slow clients cost no threads. Only a fully received request
+is handed to the Flask app (the same ``/predict``, ``/predict/batch``,
+``/health`` and ``/metrics`` routes) on a bounded thread pool, so decoding
+and the forward pass never stall the event loop.
+
+Overload is answered instead of queued indefinitely:
+
+- 429 when ``ASGI_MAX_PENDING`` requests are already waiting for or running on
+  the pool.
+- 503 when a request waited longer than ``ASGI_QUEUE_TIMEOUT_MS`` for a
+  thread; by then the client has likely given up, so it is not run.
+
+``/health`` and ``/metrics`` are never turned away. Run with
+``SERVER_MODE=asgi docker/start.sh`` (gunicorn with uvicorn workers) or
+``uvicorn src.asgi:app``.
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import logging
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from .app import app as flask_app, initialize_model
+from .monitor import ASGI_PENDING, ASGI_REJECTED
+from .profiler import start_continuous_profiling
+
+# Paths answered even when the server is overloaded
+UNLIMITED_PATHS = ('/health', '/health/live', '/health/ready', '/metrics')
+
+class ClientDisconnected(Exception):
+    """The client went away before sending its whole request"""
+
+def wsgi_environ(scope, body):
+    """Builds a WSGI environ for an ASGI HTTP scope and its complete body"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': str(client[0]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+def error_response(status, message, retry_after=None):
+    """A JSON error response as (status, headers, body)"""
+    headers = [(b'content-type', b'application/json')]
+    if retry_after is not None:
+        headers.append((b'retry-after', str(retry_after).encode()))
+    return status, headers, json.dumps({'error': message}).encode()
+
+class BoundedExecutorApp:
+    """ASGI application running a WSGI app on a bounded thread pool.
+
+    Args:
+        wsgi_app (callable): The WSGI application to serve
+        threads (int): Size of the thread pool
+        max_pending (int): Requests queued or running before new ones get a 429
+        queue_timeout (float): Seconds a request may wait for a thread before it gets a 503
+        max_body_bytes (int): Largest accepted request body; larger ones get a 413
+        on_startup (callable, optional): Run on the pool at ASGI lifespan startup
+    """
+
+    def __init__(self, wsgi_app, threads, max_pending, queue_timeout, max_body_bytes, on_startup=None):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.max_body_bytes = max_body_bytes
+        self.on_startup = on_startup
+        self.pending = 0
+        # Worker threads are only started on first use, i.e. after gunicorn forks
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi-worker')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+
+    async def _lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.on_startup is not None:
+                    try:
+                        await loop.run_in_executor(self.executor, self.on_startup)
+                    except Exception as e:
+                        # Still serve; /predict retries the load and /health reports the error
+                        logging.error(f"ASGI startup failed: {str(e)}")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await loop.run_in_executor(None, self.executor.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        """The complete request body, or None if it exceeds max_body_bytes"""
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body_bytes:
+                return None
+            chunks.append(chunk)
+            more_body = message.get('more_body', False)
+        return b''.join(chunks)
+
+    async def _http(self, scope, receive, send):
+        try:
+            body = await self._read_body(receive)
+        except ClientDisconnected:
+            return
+
+        if body is None:
+            response = error_response(413, f'Request body exceeds {self.max_body_bytes} bytes')
+        elif scope['path'] not in UNLIMITED_PATHS and self.pending >= self.max_pending:
+            ASGI_REJECTED.labels(reason='queue_full').inc()
+            response = error_response(429, 'Server is overloaded, retry later', retry_after=1)
+        else:
+            self.pending += 1
+            ASGI_PENDING.inc()
+            try:
+                response = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self._run_wsgi, wsgi_environ(scope, body), time.monotonic()
+                )
+            finally:
+                self.pending -= 1
+                ASGI_PENDING.dec()
+
+        status, headers, content = response
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+    def _run_wsgi(self, environ, admitted_at):
+        """Runs one request through the WSGI app on a pool thread"""
+        if environ['PATH_INFO'] not in UNLIMITED_PATHS and time.monotonic() - admitted_at > self.queue_timeout:
+            ASGI_REJECTED.labels(reason='queue_timeout').inc()
+            return error_response(503, 'Server is overloaded, retry later', retry_after=1)
+
+        response = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+            return chunks.append
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], b''.join(chunks)
+
+def startup():
+    """Loads the model and starts profiling in this process before it serves"""
+    start_continuous_profiling()
+    initialize_model()
+
+# The forward pass already uses every core; threads beyond that only wait on
+# the micro-batcher, and enough of them are needed to fill a batch
+DEFAULT_THREADS = max(os.cpu_count() or 1, int(os.environ.get('BATCH_MAX_SIZE', '32')))
+
+app = BoundedExecutorApp(
+    flask_app,
+    threads=int(os.environ.get('ASGI_THREADS', str(DEFAULT_THREADS))),
+    max_pending=int(os.environ.get('ASGI_MAX_PENDING', '256')),
+    queue_timeout=float(os.environ.get('ASGI_QUEUE_TIMEOUT_MS', '1000')) / 1000,
+    max_body_bytes=int(os.environ.get('ASGI_MAX_BODY_BYTES', str(16 * 1024 * 1024))),
+    on_startup=startup
+)
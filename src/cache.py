@@ -0,0 +1,264 @@
+"""
+Prediction result cache.
+
+Duplicate inputs (blank canvases, zero-image probes, client retries) are
+answered without a forward pass. Images are quantized to uint8, the same
+resolution the canvas and MNIST use, and keyed by a 128-bit BLAKE2b hash of
+the 784 bytes. Entries are tied to the model version they were computed
+with: an entry of another version is a miss and is replaced on the next
+put. Nothing is flushed when the version changes, so during a hot swap,
+while requests on the old and new version overlap, each keeps its entries.
+
+Two backends:
+
+- ``PredictionCache``: in-process, LRU with a TTL.
+- ``SharedPredictionCache``: a fixed-size, direct-mapped table in a
+  memory-mapped file (``/dev/shm`` by default) shared by every gunicorn
+  worker. Readers are lock-free (a per-slot sequence number detects torn
+  reads); writers, which only run after a cache miss, serialize on a file
+  lock. Colliding keys replace each other instead of LRU.
+"""
+import os
+import time
+import fcntl
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy as np
+from .monitor import CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS, labelled
+
+def quantize_image(image_data):
+    """Quantizes an image to the uint8 bytes used as the cache key.
+
+    Follows the same rule as ``prepare_image``: uint8 input and values above
+    1.0 are 0-255 pixels, anything else is already scaled to [0, 1].
+
+    Args:
+        image_data (numpy.array): 784-d or 28x28 image
+
+    Returns:
+        bytes: 784 uint8 pixels
+    """
+    image = np.asarray(image_data)
+    if image.dtype == np.uint8:
+        return image.tobytes()
+    scale = 1.0 if image.max() > 1.0 else 255.0
+    return np.clip(np.rint(image * scale), 0, 255).astype(np.uint8).tobytes()
+
+def image_key(image_data):
+    """128-bit hash of the quantized image"""
+    return hashlib.blake2b(quantize_image(image_data), digest_size=16).digest()
+
+class BaseCache:
+    """Lookup logic shared by the cache backends"""
+
+    backend = None
+
+    def lookup(self, image_data, version, compute):
+        """Returns the cached prediction for an image, computing it on a miss.
+
+        Args:
+            image_data (numpy.array): 784-d or 28x28 image
+            version (str): Version of the model computing the prediction
+            compute (callable): image_data -> (predicted label, probabilities)
+
+        Returns:
+            tuple: (predicted label, probabilities for each digit)
+        """
+        key = image_key(image_data)
+        cached = self.get(key, version)
+        if cached is not None:
+            labelled(CACHE_HITS, self.backend).inc()
+            return cached
+        labelled(CACHE_MISSES, self.backend).inc()
+
+        label, probabilities = compute(image_data)
+        # predict() reports failures as all-zero probabilities; never cache those
+        if any(probabilities):
+            self.put(key, version, label, probabilities)
+        return label, probabilities
+
+class PredictionCache(BaseCache):
+    """Bounded in-process cache with LRU and TTL eviction.
+
+    Args:
+        max_entries (int, optional): Capacity before the least recently used entry is evicted. Defaults to 4096.
+        ttl (float, optional): Seconds an entry stays valid. Defaults to 300.
+    """
+
+    backend = 'local'
+
+    def __init__(self, max_entries=4096, ttl=300.0):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, entry_version, label, probabilities = entry
+            if entry_version != version:
+                # Computed by another model version; aged out by LRU and TTL if never replaced
+                return None
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                labelled(CACHE_EVICTIONS, self.backend, 'ttl').inc()
+                return None
+            self._entries.move_to_end(key)
+            return label, list(probabilities)
+
+    def put(self, key, version, label, probabilities):
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous[1] != version:
+                labelled(CACHE_EVICTIONS, self.backend, 'invalidated').inc()
+            self._entries[key] = (time.monotonic() + self.ttl, version, int(label), tuple(probabilities))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                labelled(CACHE_EVICTIONS, self.backend, 'lru').inc()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# One slot of the shared table; 'seq' is odd while a writer is mid-update
+SLOT_DTYPE = np.dtype([
+    ('seq', '<u4'),
+    ('used', '<u4'),
+    ('key', 'u1', (16,)),
+    ('version', '<u8'),
+    ('expires_at', '<f8'),
+    ('probabilities', '<f4', (10,)),
+])
+
+def default_shared_cache_path():
+    """File backing the shared cache, in tmpfs when available"""
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'digit-classifier-prediction-cache')
+
+class SharedPredictionCache(BaseCache):
+    """Direct-mapped cache in a memory-mapped file shared across processes.
+
+    Args:
+        path (str): Backing file, created and sized on first use
+        slots (int, optional): Number of entries. Defaults to 16384.
+        ttl (float, optional): Seconds an entry stays valid. Defaults to 300.
+    """
+
+    backend = 'shared'
+
+    def __init__(self, path, slots=16384, ttl=300.0):
+        self.path = path
+        self.slots = max(1, int(slots))
+        self.ttl = float(ttl)
+        size = self.slots * SLOT_DTYPE.itemsize
+
+        self._fd = None
+        self._pid = None
+        fd = self._lock_fd()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != size:
+                # Resizing wipes the table; every slot starts out unused
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        # MAP_SHARED: forked workers keep writing to the same pages
+        self._table = np.memmap(path, dtype=SLOT_DTYPE, mode='r+', shape=(self.slots,))
+
+    def _lock_fd(self):
+        """This process's descriptor for the writer lock.
+
+        flock() locks belong to the open file description, which a forked
+        child shares with its parent, so each process opens its own.
+        """
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    @staticmethod
+    def _version_id(version):
+        return int.from_bytes(hashlib.blake2b(str(version).encode(), digest_size=8).digest(), 'little')
+
+    def _slot(self, key):
+        return int.from_bytes(key[:8], 'little') % self.slots
+
+    def get(self, key, version):
+        slot = self._table[self._slot(key)]
+        seq = int(slot['seq'])
+        if seq % 2 or not slot['used'] or slot['key'].tobytes() != key:
+            return None
+        version_id, expires_at = int(slot['version']), float(slot['expires_at'])
+        probabilities = slot['probabilities'].tolist()
+        if int(slot['seq']) != seq:
+            # A writer updated the slot while we were reading it
+            return None
+        if version_id != self._version_id(version):
+            return None
+        if expires_at <= time.time():
+            return None
+        return int(np.argmax(probabilities)), probabilities
+
+    def put(self, key, version, label, probabilities):
+        index = self._slot(key)
+        fd = self._lock_fd()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            slot = self._table[index]
+            if slot['used']:
+                # Expired entries are only dropped when their slot is reused
+                if slot['expires_at'] <= time.time():
+                    labelled(CACHE_EVICTIONS, self.backend, 'ttl').inc()
+                elif slot['key'].tobytes() != key:
+                    labelled(CACHE_EVICTIONS, self.backend, 'collision').inc()
+            slot['seq'] += 1
+            slot['key'] = np.frombuffer(key, dtype='u1')
+            slot['version'] = self._version_id(version)
+            slot['expires_at'] = time.time() + self.ttl
+            slot['probabilities'] = probabilities
+            slot['used'] = 1
+            slot['seq'] += 1
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def clear(self):
+        fd = self._lock_fd()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            self._table[:] = np.zeros(self.slots, dtype=SLOT_DTYPE)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+def create_cache():
+    """Creates the prediction cache from environment settings.
+
+    ``PREDICTION_CACHE_SIZE`` (default 4096, 0 disables) bounds the number of
+    entries and ``PREDICTION_CACHE_TTL`` (default 300) their lifetime in
+    seconds. ``PREDICTION_CACHE_SHARED=true`` shares one table across worker
+    processes, backed by ``PREDICTION_CACHE_PATH``.
+
+    Returns:
+        BaseCache: The cache, or None if caching is disabled
+    """
+    size = int(os.getenv('PREDICTION_CACHE_SIZE', '4096'))
+    ttl = float(os.getenv('PREDICTION_CACHE_TTL', '300'))
+    if size <= 0:
+        return None
+    if os.getenv('PREDICTION_CACHE_SHARED', 'false').lower() == 'true':
+        path = os.getenv('PREDICTION_CACHE_PATH') or default_shared_cache_path()
+        try:
+            return SharedPredictionCache(path, size, ttl)
+        except OSError as e:
+            logging.warning(f"Could not open shared prediction cache at {path}, using in-process cache: {e}")
+    return PredictionCache(size, ttl)
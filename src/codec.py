@@ -0,0 +1,107 @@
+"""
+Compact binary wire format for prediction requests and responses.
+
+Request bodies (``Content-Type: application/octet-stream``) are one of:
+
+- 784 bytes: a single 28x28 image as raw uint8 pixels (0-255)
+- 3136 bytes: a single 28x28 image as little-endian float32 pixels
+- a 12-byte header followed by N images::
+
+      magic    4s   b'DGTI'
+      version  B    1
+      dtype    B    1 = uint8, 2 = float32 (little-endian)
+      reserved H    0
+      count    I    number of images (little-endian)
+
+Response bodies use the same header with magic ``b'DGTP'`` and dtype 2,
+followed by N x 10 float32 probabilities and then N uint8 labels, so the
+probabilities start on an aligned offset.
+"""
+import struct
+import numpy as np
+
+BINARY_MIMETYPE = 'application/octet-stream'
+
+IMAGE_SIZE = 28 * 28
+
+HEADER = struct.Struct('<4sBBHI')
+REQUEST_MAGIC = b'DGTI'
+RESPONSE_MAGIC = b'DGTP'
+VERSION = 1
+
+DTYPES = {1: np.dtype('uint8'), 2: np.dtype('<f4')}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+def decode_images(body):
+    """Decodes a binary request body without copying the pixel data.
+
+    Args:
+        body (bytes): Raw request body
+
+    Returns:
+        numpy.array: Read-only (N, 784) uint8 or float32 view over ``body``
+
+    Raises:
+        ValueError: If the body is not a valid binary image payload
+    """
+    if len(body) == IMAGE_SIZE:
+        return np.frombuffer(body, dtype=DTYPES[1]).reshape(1, IMAGE_SIZE)
+    if len(body) == IMAGE_SIZE * 4 and body[:4] != REQUEST_MAGIC:
+        return np.frombuffer(body, dtype=DTYPES[2]).reshape(1, IMAGE_SIZE)
+
+    if len(body) < HEADER.size:
+        raise ValueError(f"Binary body of {len(body)} bytes is neither a raw image nor a framed batch")
+    magic, version, dtype_code, _, count = HEADER.unpack_from(body)
+    if magic != REQUEST_MAGIC or version != VERSION:
+        raise ValueError("Unrecognized binary header")
+    if dtype_code not in DTYPES:
+        raise ValueError(f"Unsupported pixel dtype code {dtype_code}")
+    dtype = DTYPES[dtype_code]
+    if count == 0 or len(body) != HEADER.size + count * IMAGE_SIZE * dtype.itemsize:
+        raise ValueError(f"Binary body length does not match {count} images of type {dtype.name}")
+
+    return np.frombuffer(body, dtype=dtype, offset=HEADER.size).reshape(count, IMAGE_SIZE)
+
+def encode_images(images):
+    """Encodes a batch of images as a framed binary request body.
+
+    Args:
+        images (numpy.array): (N, 784) or (N, 28, 28) uint8 or float32 images
+
+    Returns:
+        bytes: Header followed by the pixel data
+    """
+    images = np.asarray(images)
+    dtype = np.dtype('uint8') if images.dtype == np.uint8 else np.dtype('<f4')
+    header = HEADER.pack(REQUEST_MAGIC, VERSION, DTYPE_CODES[dtype], 0, len(images))
+    return header + np.ascontiguousarray(images, dtype=dtype).tobytes()
+
+def encode_predictions(labels, probabilities):
+    """Encodes predictions as a binary response body.
+
+    Args:
+        labels (numpy.array): N predicted labels
+        probabilities (numpy.array): (N, 10) class probabilities
+
+    Returns:
+        bytes: Header, float32 probabilities, then uint8 labels
+    """
+    probabilities = np.ascontiguousarray(probabilities, dtype='<f4')
+    header = HEADER.pack(RESPONSE_MAGIC, VERSION, DTYPE_CODES[np.dtype('<f4')], 0, len(probabilities))
+    return header + probabilities.tobytes() + np.asarray(labels, dtype='uint8').tobytes()
+
+def decode_predictions(body):
+    """Decodes a binary response body.
+
+    Args:
+        body (bytes): Raw response body
+
+    Returns:
+        tuple: (numpy.array of N labels, (N, 10) numpy.array of probabilities)
+    """
+    magic, version, _, _, count = HEADER.unpack_from(body)
+    if magic != RESPONSE_MAGIC or version != VERSION:
+        raise ValueError("Unrecognized binary header")
+    probabilities = np.frombuffer(body, dtype='<f4', count=count * 10, offset=HEADER.size).reshape(count, 10)
+    labels = np.frombuffer(body, dtype='uint8', count=count, offset=HEADER.size + count * 40)
+    return labels, probabilities
@@ -0,0 +1,344 @@
+"""
+Local uint8 cache of the MNIST dataset.
+
+The dataset is parsed once, from the Keras ``mnist.npz`` or the four IDX
+files (optionally gzipped), into uncompressed ``.npy`` files in
+``DATASET_CACHE_DIR``. Later runs memory-map them, so opening the dataset
+reads no pixels, and only the pages of the rows actually used are loaded:
+
+    x_train.npy   (60000, 28, 28) uint8
+    y_train.npy   (60000,) uint8
+    x_test.npy    (10000, 28, 28) uint8
+    y_test.npy    (10000,) uint8
+    manifest.json shapes, sizes and sha256 checksums of the files above
+
+Opening compares each file's size and modification time with the manifest
+and re-hashes any file that changed; a corrupted cache is rebuilt from its
+source. Nothing is downloaded when a local source exists, and never with
+``DATASET_OFFLINE=1``. Normalization to float32 and the channel axis are
+added per batch by MnistSplit.batch, never to the whole split.
+"""
+import os
+import gzip
+import json
+import struct
+import hashlib
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+from numpy.lib.format import open_memmap
+
+DATASET_CACHE_DIR = Path(os.environ.get('DATASET_CACHE_DIR', 'data/mnist'))
+MANIFEST_FILE = 'manifest.json'
+CACHE_FORMAT = 1
+
+ARRAYS = ('x_train', 'y_train', 'x_test', 'y_test')
+
+# File names of the original MNIST distribution, each optionally gzipped
+IDX_FILES = {
+    'x_train': 'train-images-idx3-ubyte',
+    'y_train': 'train-labels-idx1-ubyte',
+    'x_test': 't10k-images-idx3-ubyte',
+    'y_test': 't10k-labels-idx1-ubyte',
+}
+
+# Where tf.keras.datasets.mnist.load_data() keeps its download, and its published checksum
+MNIST_URL = 'https://storage.googleapis.com/tensorflow/tf-keras-datasets/mnist.npz'
+MNIST_SHA256 = '731c5ac602752760c8e48fbffcf8c3b850d9dc2a2aedcf2cc48468fc17b673d1'
+
+# IDX type code of unsigned bytes, the only type MNIST files use
+IDX_UBYTE = 0x08
+
+HASH_CHUNK_BYTES = 1 << 20
+
+def read_idx(path):
+    """Reads an IDX file of unsigned bytes.
+
+    Uncompressed files are memory-mapped; ``.gz`` files are decompressed into memory.
+
+    Args:
+        path (str or Path): The IDX file
+
+    Returns:
+        numpy.array: uint8 array of the shape given in the file's header
+
+    Raises:
+        ValueError: If the file is not an IDX file of unsigned bytes
+    """
+    path = Path(path)
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rb') as f:
+        header = f.read(4)
+        if len(header) < 4 or header[:2] != b'\x00\x00':
+            raise ValueError(f"{path} is not an IDX file")
+        if header[2] != IDX_UBYTE:
+            raise ValueError(f"{path} holds IDX type 0x{header[2]:02x}; only unsigned bytes are supported")
+        ndim = header[3]
+        shape = struct.unpack(f'>{ndim}I', f.read(4 * ndim))
+        if opener is gzip.open:
+            data = np.frombuffer(f.read(), dtype=np.uint8)
+            if data.size != np.prod(shape):
+                raise ValueError(f"{path} holds {data.size} bytes, expected {int(np.prod(shape))}")
+            return data.reshape(shape)
+    return np.memmap(path, dtype=np.uint8, mode='r', offset=4 + 4 * ndim, shape=shape)
+
+def file_sha256(path):
+    """Hex sha256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _idx_paths(directory):
+    """The four MNIST IDX files in a directory, or None if any is missing"""
+    paths = {}
+    for name, stem in IDX_FILES.items():
+        candidates = [directory / stem, directory / f'{stem}.gz']
+        found = next((path for path in candidates if path.exists()), None)
+        if found is None:
+            return None
+        paths[name] = found
+    return paths
+
+def keras_cache_path():
+    """Path where Keras stores the downloaded mnist.npz"""
+    return Path(os.environ.get('KERAS_HOME', Path.home() / '.keras')) / 'datasets' / 'mnist.npz'
+
+def find_source(source=None, offline=None):
+    """Locates the MNIST data to build the cache from.
+
+    Looks at ``source`` (or ``MNIST_SOURCE``), then at the Keras download
+    cache. Without either, mnist.npz is downloaded unless running offline.
+
+    Args:
+        source (str or Path, optional): An mnist.npz file or a directory of
+            IDX files. Defaults to the ``MNIST_SOURCE`` environment variable.
+        offline (bool, optional): Never download. Defaults to the
+            ``DATASET_OFFLINE`` environment variable.
+
+    Returns:
+        Path: The npz file or IDX directory
+
+    Raises:
+        FileNotFoundError: If no local source exists and downloading is not allowed
+    """
+    source = source or os.environ.get('MNIST_SOURCE')
+    if source:
+        source = Path(source)
+        if not source.exists():
+            raise FileNotFoundError(f"MNIST source {source} does not exist")
+        if source.is_dir() and _idx_paths(source) is None:
+            raise FileNotFoundError(f"{source} does not hold the four MNIST IDX files")
+        return source
+
+    cached = keras_cache_path()
+    if cached.exists():
+        return cached
+    if offline is None:
+        offline = os.environ.get('DATASET_OFFLINE', '0') == '1'
+    if offline:
+        raise FileNotFoundError(
+            f"No local MNIST data: set MNIST_SOURCE or place mnist.npz at {cached} (DATASET_OFFLINE is set)"
+        )
+
+    import tensorflow as tf
+
+    logging.info(f"Downloading MNIST from {MNIST_URL}")
+    return Path(tf.keras.utils.get_file('mnist.npz', origin=MNIST_URL, file_hash=MNIST_SHA256))
+
+def _source_arrays(source):
+    """Yields (name, array) for each MNIST array of an npz file or IDX directory, one at a time"""
+    if source.is_dir():
+        for name, path in _idx_paths(source).items():
+            yield name, read_idx(path)
+        return
+    with np.load(source) as data:
+        missing = [name for name in ARRAYS if name not in data.files]
+        if missing:
+            raise ValueError(f"{source} is missing {', '.join(missing)}")
+        for name in ARRAYS:
+            yield name, data[name]
+
+def build_cache(cache_dir=None, source=None, offline=None):
+    """Parses MNIST once into the uint8 cache.
+
+    Files are written under temporary names and moved into place with the
+    manifest last, so a reader never sees a half-written cache.
+
+    Args:
+        cache_dir (str or Path, optional): Defaults to DATASET_CACHE_DIR.
+        source (str or Path, optional): See find_source.
+        offline (bool, optional): See find_source.
+
+    Returns:
+        dict: The written manifest
+
+    Raises:
+        ValueError: If the source does not hold 28x28 images with one label each
+    """
+    cache_dir = Path(cache_dir or DATASET_CACHE_DIR)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    source = find_source(source, offline)
+    logging.info(f"Building MNIST cache in {cache_dir} from {source}")
+
+    arrays = {}
+    suffix = f'.tmp-{os.getpid()}'
+    for name, data in _source_arrays(source):
+        data = np.asarray(data)
+        expected = (28, 28) if name.startswith('x') else ()
+        if data.shape[1:] != expected:
+            raise ValueError(f"{name} in {source} has shape {data.shape}")
+        if data.dtype != np.uint8:
+            if data.size and (data.min() < 0 or data.max() > 255):
+                raise ValueError(f"{name} in {source} does not hold 0-255 values")
+            data = data.astype(np.uint8)
+        scratch = cache_dir / f'{name}.npy{suffix}'
+        array = open_memmap(scratch, mode='w+', dtype=np.uint8, shape=data.shape)
+        array[...] = data
+        array.flush()
+        del array
+        path = cache_dir / f'{name}.npy'
+        os.replace(scratch, path)
+        stat = path.stat()
+        arrays[name] = {'shape': list(data.shape), 'bytes': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                        'sha256': file_sha256(path)}
+
+    for split in ('train', 'test'):
+        if arrays[f'x_{split}']['shape'][0] != arrays[f'y_{split}']['shape'][0]:
+            raise ValueError(f"{source} has a different number of {split} images and labels")
+
+    manifest = {
+        'format': CACHE_FORMAT,
+        'source': str(source.resolve()),
+        'arrays': arrays,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    }
+    scratch = cache_dir / f'{MANIFEST_FILE}{suffix}'
+    scratch.write_text(json.dumps(manifest, indent=2))
+    os.replace(scratch, cache_dir / MANIFEST_FILE)
+    logging.info(f"MNIST cache ready: {arrays['x_train']['shape'][0]} train, {arrays['x_test']['shape'][0]} test images")
+    return manifest
+
+def _invalid_arrays(cache_dir, manifest, verify):
+    """Names of cached arrays that are missing or do not match the manifest"""
+    invalid = []
+    for name in ARRAYS:
+        entry = manifest['arrays'].get(name)
+        path = cache_dir / f'{name}.npy'
+        if entry is None or not path.exists():
+            invalid.append(name)
+            continue
+        stat = path.stat()
+        if stat.st_size != entry['bytes']:
+            invalid.append(name)
+        elif (verify or stat.st_mtime_ns != entry['mtime_ns']) and file_sha256(path) != entry['sha256']:
+            invalid.append(name)
+    return invalid
+
+class MnistSplit:
+    """Memory-mapped uint8 images and labels of one split.
+
+    Slicing returns another MnistSplit over a view of the same files, so
+    selecting a subset reads nothing.
+
+    Args:
+        images (numpy.array): (N, 28, 28) uint8 images
+        labels (numpy.array): (N,) uint8 labels
+    """
+
+    def __init__(self, images, labels):
+        self.images = images
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("MnistSplit only supports slicing; index images or labels directly")
+        return MnistSplit(self.images[index], self.labels[index])
+
+    def batch(self, start, stop, out=None):
+        """Normalized images [start, stop) in the model input layout.
+
+        Args:
+            start (int): First row
+            stop (int): Row after the last
+            out (numpy.array, optional): float32 buffer of at least stop - start
+                images to write into, e.g. model.input_buffer
+
+        Returns:
+            tuple: ((n, 28, 28, 1) float32 images in [0, 1], (n,) uint8 labels)
+        """
+        pixels = self.images[start:stop]
+        count = len(pixels)
+        target = np.empty((count, 28, 28, 1), dtype=np.float32) if out is None else out[:count]
+        np.copyto(target, pixels[..., np.newaxis], casting='unsafe')
+        np.divide(target, np.float32(255), out=target)
+        return target, np.asarray(self.labels[start:stop])
+
+    def batches(self, batch_size=1024):
+        """Yields normalized (images, labels) batches in order, see batch"""
+        for start in range(0, len(self), batch_size):
+            yield self.batch(start, start + batch_size)
+
+class MnistDataset:
+    """The cached train and test splits.
+
+    Args:
+        cache_dir (Path): Directory of the cache
+        manifest (dict): Its manifest
+        train (MnistSplit): Training split
+        test (MnistSplit): Test split
+    """
+
+    def __init__(self, cache_dir, manifest, train, test):
+        self.cache_dir = cache_dir
+        self.manifest = manifest
+        self.train = train
+        self.test = test
+
+    def arrays(self):
+        """(x_train, y_train, x_test, y_test) as memory-mapped uint8 arrays"""
+        return self.train.images, self.train.labels, self.test.images, self.test.labels
+
+def open_dataset(cache_dir=None, source=None, verify=False, offline=None):
+    """Opens the MNIST cache, building or repairing it first if needed.
+
+    Args:
+        cache_dir (str or Path, optional): Defaults to DATASET_CACHE_DIR.
+        source (str or Path, optional): Data to build from, see find_source.
+        verify (bool, optional): Re-hash every file, not only those whose size
+            or modification time changed. Defaults to False.
+        offline (bool, optional): See find_source.
+
+    Returns:
+        MnistDataset: Memory-mapped splits
+
+    Raises:
+        FileNotFoundError: If the cache must be built and no source is available
+    """
+    cache_dir = Path(cache_dir or DATASET_CACHE_DIR)
+    manifest_path = cache_dir / MANIFEST_FILE
+    manifest = None
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if manifest.get('format') != CACHE_FORMAT:
+            logging.info(f"MNIST cache in {cache_dir} has an old format, rebuilding")
+            manifest = None
+        else:
+            invalid = _invalid_arrays(cache_dir, manifest, verify)
+            if invalid:
+                logging.warning(f"MNIST cache in {cache_dir} failed validation ({', '.join(invalid)}), rebuilding")
+                manifest = None
+    if manifest is None:
+        manifest = build_cache(cache_dir, source, offline)
+
+    arrays = {name: np.load(cache_dir / f'{name}.npy', mmap_mode='r') for name in ARRAYS}
+    return MnistDataset(
+        cache_dir, manifest,
+        MnistSplit(arrays['x_train'], arrays['y_train']),
+        MnistSplit(arrays['x_test'], arrays['y_test'])
+    )
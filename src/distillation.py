@@ -0,0 +1,336 @@
+"""
+Knowledge distillation of the digit classifier into smaller students.
+
+The CNN of build_model (four conv layers and a 512-unit dense layer) is the
+teacher. Each student of a configurable family is trained on the teacher's
+softened predictions as well as the labels, then measured on the engine it
+would be served with. The report places every model on the accuracy /
+latency plane and marks the Pareto front, and select_student picks the most
+accurate student within a latency budget.
+
+A student is described by a spec ``"F1-F2[-F3]/D"``: conv filters per block,
+then the units of the hidden dense layer (``0`` for none). Each block is a
+3x3 ReLU Conv2D, BatchNormalization and 2x2 max pooling, so every student is
+a plain Sequential that save_trained_model, load_trained_model and the NumPy
+engine handle like the teacher.
+
+The loss, as in Hinton et al., is::
+
+    alpha * CE(labels, p) + (1 - alpha) * T^2 * CE(softmax(log q / T), softmax(log p / T))
+
+with teacher probabilities q and student probabilities p. Both models end
+in a softmax, and softmax(log p / T) equals softmax(z / T) of the logits z,
+so no logits layer is needed. The teacher's softened targets are computed
+once before training and packed with the labels as the fit targets, so the
+teacher does not run again every epoch.
+"""
+import time
+import logging
+import numpy as np
+from .model import VALIDATION_SPLIT, as_uint8_images, compile_model
+from .dataset import MnistSplit
+
+DEFAULT_STUDENTS = ('8-16/32', '16-32/64', '16-32/128', '32-64/128')
+DEFAULT_TEMPERATURE = 4.0
+# Weight of the hard labels in the loss; the rest goes to the teacher's targets
+DEFAULT_ALPHA = 0.1
+DEFAULT_BATCH_SIZES = (1, 32)
+# Latency percentile the budget applies to, as for HEALTH_MAX_INFERENCE_MS
+LATENCY_PERCENTILE = 95
+DISTILLATION_BACKENDS = ('keras', 'compiled', 'numpy')
+
+def parse_student(spec):
+    """Parses a student spec such as '16-32/64'.
+
+    Returns:
+        tuple: (conv filters per block, hidden dense units)
+
+    Raises:
+        ValueError: If the spec is malformed
+    """
+    try:
+        convs, units = spec.split('/')
+        filters = tuple(int(f) for f in convs.split('-'))
+        units = int(units)
+    except ValueError:
+        raise ValueError(f"Invalid student spec {spec!r}, expected e.g. '16-32/64'") from None
+    if not 1 <= len(filters) <= 3 or min(filters) < 1 or units < 0:
+        raise ValueError(f"Invalid student spec {spec!r}: 1 to 3 conv blocks of positive width, dense units >= 0")
+    return filters, units
+
+def build_student(spec):
+    """Builds the (untrained) student of a spec.
+
+    Args:
+        spec (str): Student spec, see parse_student
+
+    Returns:
+        tf.keras.Sequential: The uncompiled model
+    """
+    import tensorflow as tf
+
+    filters, units = parse_student(spec)
+    layers = []
+    for i, width in enumerate(filters):
+        kwargs = {'input_shape': (28, 28, 1)} if i == 0 else {}
+        layers += [
+            tf.keras.layers.Conv2D(width, (3, 3), activation='relu', **kwargs),
+            tf.keras.layers.BatchNormalization(),
+            tf.keras.layers.MaxPooling2D((2, 2)),
+        ]
+    layers.append(tf.keras.layers.Flatten())
+    if units:
+        layers += [tf.keras.layers.Dense(units, activation='relu'), tf.keras.layers.BatchNormalization()]
+    layers.append(tf.keras.layers.Dense(10, activation='softmax', dtype='float32'))
+    name = 'student_' + spec.replace('-', '_').replace('/', '_d')
+    return tf.keras.Sequential(layers, name=name)
+
+def soften(probabilities, temperature):
+    """Temperature-scaled distribution softmax(log p / T) of softmax outputs p"""
+    logits = np.log(np.clip(np.asarray(probabilities, dtype='float64'), 1e-12, 1.0)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return (exp / exp.sum(axis=1, keepdims=True)).astype('float32')
+
+def teacher_targets(teacher, images, labels, temperature, batch_size=512):
+    """Packs labels and the teacher's softened predictions into fit targets.
+
+    Args:
+        teacher (object): Model or engine with predict(images)
+        images (numpy.array): (N, 28, 28) uint8 images
+        labels (numpy.array): (N,) labels
+        temperature (float): Softening temperature
+
+    Returns:
+        numpy.array: (N, 11) float32; column 0 is the label, columns 1-10 the soft targets
+    """
+    split = MnistSplit(as_uint8_images(images), np.asarray(labels))
+    probabilities = np.concatenate([teacher.predict(batch, verbose=0) for batch, _ in split.batches(batch_size)])
+    return np.concatenate([np.asarray(labels, dtype='float32')[:, np.newaxis], soften(probabilities, temperature)], axis=1)
+
+def distillation_loss(temperature=DEFAULT_TEMPERATURE, alpha=DEFAULT_ALPHA):
+    """Keras loss over targets packed by teacher_targets"""
+    import tensorflow as tf
+
+    def loss(y_true, y_pred):
+        y_true = tf.cast(y_true, tf.float32)
+        labels = tf.cast(y_true[:, 0], tf.int32)
+        soft_targets = y_true[:, 1:]
+        y_pred = tf.cast(y_pred, tf.float32)
+        hard = tf.keras.losses.sparse_categorical_crossentropy(labels, y_pred)
+        log_soft = tf.nn.log_softmax(tf.math.log(tf.clip_by_value(y_pred, 1e-7, 1.0)) / temperature)
+        soft = -tf.reduce_sum(soft_targets * log_soft, axis=1) * temperature ** 2
+        return alpha * hard + (1 - alpha) * soft
+
+    return loss
+
+def label_accuracy(y_true, y_pred):
+    """Accuracy against the labels in column 0 of packed targets"""
+    import tensorflow as tf
+
+    return tf.cast(tf.equal(tf.cast(y_true[:, 0], tf.int64), tf.argmax(y_pred, axis=1)), tf.float32)
+
+def distillation_dataset(images, targets, batch_size=128, training=True, seed=None):
+    """tf.data batches of normalized images and packed targets, as make_dataset does for labels"""
+    import tensorflow as tf
+
+    dataset = tf.data.Dataset.from_tensor_slices((as_uint8_images(images), targets))
+    if training:
+        dataset = dataset.shuffle(len(images), seed=seed, reshuffle_each_iteration=True)
+
+    def to_model_input(batch_images, batch_targets):
+        return tf.cast(batch_images, tf.float32)[..., tf.newaxis] / 255.0, batch_targets
+
+    return dataset.batch(batch_size).map(to_model_input, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+
+def train_student(spec, x_train, targets, epochs=10, batch_size=128, learning_rate=None,
+                  temperature=DEFAULT_TEMPERATURE, alpha=DEFAULT_ALPHA):
+    """Trains one student on packed targets; the last VALIDATION_SPLIT is held out.
+
+    Returns:
+        tf.keras.Model: The student, compiled with the standard loss so it saves
+        and loads like the teacher. Its ``history`` is the distillation run.
+    """
+    import tensorflow as tf
+
+    student = build_student(spec)
+    student.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate) if learning_rate else 'adam',
+        loss=distillation_loss(temperature, alpha),
+        metrics=[label_accuracy]
+    )
+    split = int(len(x_train) * (1 - VALIDATION_SPLIT))
+    student.fit(
+        distillation_dataset(x_train[:split], targets[:split], batch_size),
+        epochs=epochs,
+        validation_data=distillation_dataset(x_train[split:], targets[split:], batch_size, training=False),
+        verbose=2
+    )
+    history = student.history
+    compile_model(student)
+    student.history = history
+    return student
+
+def serving_engine(model, backend='compiled'):
+    """The engine a model would be served with, built in memory"""
+    if backend == 'keras':
+        return model
+    if backend == 'compiled':
+        from .inference import CompiledModel, batch_buckets_from_env
+
+        return CompiledModel(model, batch_buckets_from_env())
+    if backend == 'numpy':
+        from .numpy_engine import NumpyModel, fold_model
+
+        return NumpyModel(*fold_model(model))
+    raise ValueError(f"Unknown distillation backend {backend!r}, expected one of {DISTILLATION_BACKENDS}")
+
+def measure_latency(engine, test, batch_sizes=DEFAULT_BATCH_SIZES, iterations=200, warmup=10):
+    """CPU latency of engine.predict per batch size.
+
+    Returns:
+        dict: Batch size to p50_ms, p95_ms and images_per_sec
+    """
+    latency = {}
+    for batch_size in batch_sizes:
+        images, _ = test.batch(0, batch_size)
+        for _ in range(warmup):
+            engine.predict(images)
+        timings = np.empty(iterations)
+        for i in range(iterations):
+            started = time.perf_counter()
+            engine.predict(images)
+            timings[i] = (time.perf_counter() - started) * 1000
+        p50, p95 = np.percentile(timings, [50, LATENCY_PERCENTILE])
+        latency[batch_size] = {'p50_ms': float(p50), 'p95_ms': float(p95), 'images_per_sec': batch_size * 1000 / p50}
+    return latency
+
+def evaluate_candidate(name, role, model, test, backend='compiled', batch_sizes=DEFAULT_BATCH_SIZES, iterations=200):
+    """Accuracy, size and latency of one model on its serving engine.
+
+    Args:
+        name (str): Student spec, or 'teacher'
+        role (str): 'teacher' or 'student'
+        model (tf.keras.Model): The trained model
+        test (MnistSplit): Test split
+
+    Returns:
+        dict: The report entry
+    """
+    engine = serving_engine(model, backend)
+    correct = 0
+    for images, labels in test.batches(256):
+        correct += int((engine.predict(images).argmax(axis=1) == labels).sum())
+    latency = measure_latency(engine, test, batch_sizes, iterations)
+    candidate = {
+        'name': name,
+        'role': role,
+        'parameters': int(model.count_params()),
+        'accuracy': correct / len(test),
+        'latency': latency,
+    }
+    logging.info(
+        f"{role} {name}: accuracy {candidate['accuracy']:.4f}, single-image "
+        f"p{LATENCY_PERCENTILE} {latency[min(latency)]['p95_ms']:.3f} ms, {candidate['parameters']} parameters"
+    )
+    return candidate
+
+def single_image_latency(candidate):
+    """The latency a budget is checked against: p95 of the smallest measured batch"""
+    return candidate['latency'][min(candidate['latency'])]['p95_ms']
+
+def mark_pareto_front(candidates):
+    """Sets 'pareto' on each candidate: True unless another is at least as accurate and as fast, and better in one"""
+    for candidate in candidates:
+        accuracy, latency = candidate['accuracy'], single_image_latency(candidate)
+        candidate['pareto'] = not any(
+            other['accuracy'] >= accuracy and single_image_latency(other) <= latency
+            and (other['accuracy'] > accuracy or single_image_latency(other) < latency)
+            for other in candidates
+        )
+    return candidates
+
+def select_student(candidates, latency_target_ms=None):
+    """The most accurate student within the latency target (or overall without one).
+
+    Returns:
+        dict: The chosen candidate, or None if no student meets the target
+    """
+    students = [c for c in candidates if c['role'] == 'student']
+    if latency_target_ms is not None:
+        students = [c for c in students if single_image_latency(c) <= latency_target_ms]
+    if not students:
+        return None
+    return max(students, key=lambda c: (c['accuracy'], -single_image_latency(c)))
+
+def distill(teacher, x_train, y_train, x_test, y_test, students=DEFAULT_STUDENTS, latency_target_ms=None,
+            backend='compiled', epochs=10, batch_size=128, learning_rate=None, temperature=DEFAULT_TEMPERATURE,
+            alpha=DEFAULT_ALPHA, batch_sizes=DEFAULT_BATCH_SIZES, iterations=200):
+    """Trains every student from the teacher and reports the accuracy / latency trade-off.
+
+    Args:
+        teacher (tf.keras.Model): Trained teacher, e.g. from load_trained_model
+        x_train, y_train, x_test, y_test (numpy.array): uint8 MNIST arrays from load_raw_data
+        students (tuple, optional): Student specs. Defaults to DEFAULT_STUDENTS.
+        latency_target_ms (float, optional): Single-image p95 latency budget of the selected student
+        backend (str, optional): Engine latency is measured on: 'keras', 'compiled' or 'numpy'.
+            Defaults to 'compiled'.
+        batch_sizes (tuple, optional): Batch sizes timed; the smallest is the one budgeted.
+            Defaults to (1, 32).
+        iterations (int, optional): Timed calls per batch size. Defaults to 200.
+
+    Returns:
+        tuple: (report dict, selected student model or None)
+    """
+    if backend not in DISTILLATION_BACKENDS:
+        raise ValueError(f"Unknown distillation backend {backend!r}, expected one of {DISTILLATION_BACKENDS}")
+    for spec in students:
+        parse_student(spec)
+    test = MnistSplit(as_uint8_images(x_test), np.asarray(y_test))
+    batch_sizes = tuple(sorted(batch_sizes))
+
+    logging.info(f"Computing teacher targets at temperature {temperature:g}...")
+    targets = teacher_targets(teacher, x_train, y_train, temperature)
+    candidates = [evaluate_candidate('teacher', 'teacher', teacher, test, backend, batch_sizes, iterations)]
+    models = {}
+    for spec in students:
+        logging.info(f"Distilling student {spec}...")
+        started = time.perf_counter()
+        models[spec] = train_student(spec, x_train, targets, epochs, batch_size, learning_rate, temperature, alpha)
+        train_seconds = time.perf_counter() - started
+        candidate = evaluate_candidate(spec, 'student', models[spec], test, backend, batch_sizes, iterations)
+        candidate['train_seconds'] = train_seconds
+        candidates.append(candidate)
+
+    mark_pareto_front(candidates)
+    selected = select_student(candidates, latency_target_ms)
+    report = {
+        'backend': backend,
+        'latency_target_ms': latency_target_ms,
+        'latency_percentile': LATENCY_PERCENTILE,
+        'temperature': temperature,
+        'alpha': alpha,
+        'epochs': epochs,
+        'candidates': candidates,
+        'selected': selected['name'] if selected else None,
+    }
+    return report, models[selected['name']] if selected else None
+
+def format_report(report):
+    """The report as a table, Pareto-optimal models marked with '*'"""
+    batch_sizes = list(report['candidates'][0]['latency'])
+    header = f"  {'model':<12} {'params':>9} {'accuracy':>8}" + ''.join(
+        f" {f'b{size} p50':>9} {f'b{size} p95':>9}" for size in batch_sizes
+    )
+    lines = [header]
+    for candidate in sorted(report['candidates'], key=single_image_latency):
+        line = f"{'*' if candidate['pareto'] else ' '} {candidate['name']:<12} {candidate['parameters']:>9} " \
+               f"{candidate['accuracy']:>8.4f}"
+        for size in batch_sizes:
+            latency = candidate['latency'][size]
+            line += f" {latency['p50_ms']:>9.3f} {latency['p95_ms']:>9.3f}"
+        lines.append(line)
+    target = report['latency_target_ms']
+    budget = f"p{report['latency_percentile']} <= {target:g} ms" if target is not None else "no latency target"
+    lines.append(f"Selected ({budget}, {report['backend']} backend): {report['selected'] or 'none'}")
+    return '\n'.join(lines)
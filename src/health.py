@@ -0,0 +1,167 @@
+"""
+Liveness and readiness for load balancer and orchestrator probes.
+
+Probes never run the model. A background thread in each worker runs one
+image through the served model every ``HEALTH_CHECK_INTERVAL_SECONDS`` and
+caches the result. The probe endpoints only read that cached result and a
+few counters, so frequent probes do not compete with real traffic.
+"""
+import os
+import time
+import logging
+import threading
+import numpy as np
+from .monitor import HEALTH_CHECK_OK, HEALTH_CHECK_SECONDS, RECENT_INFERENCE_LATENCY
+
+class HealthMonitor:
+    """Runs the deep inference check in the background and judges readiness.
+
+    Args:
+        manager (ModelManager): Holds the served model
+        interval (float, optional): Seconds between inference checks. Defaults to 30.
+        max_queue_depth (int, optional): Queued images above which the worker
+            reports not ready. Defaults to 256.
+        max_inference_ms (float, optional): Recent p95 inference latency above
+            which the worker reports not ready. Defaults to 1000.
+    """
+
+    def __init__(self, manager, interval=30.0, max_queue_depth=256, max_inference_ms=1000.0):
+        self.manager = manager
+        self.interval = interval
+        self.max_queue_depth = max_queue_depth
+        self.max_inference_ms = max_inference_ms
+        self._lock = threading.Lock()
+        self._pid = None
+        self._result = None
+        self._check_started = None
+
+    def start(self):
+        """Starts the check thread in this process if it is not running yet"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._check_started = None
+        threading.Thread(target=self._run, name='health-check', daemon=True).start()
+
+    def _run(self):
+        while True:
+            serving = self.manager.serving
+            if serving is None:
+                # Nothing to check until the model is loaded
+                time.sleep(min(1.0, self.interval))
+                continue
+            self.check(serving)
+            time.sleep(self.interval)
+
+    def check(self, serving):
+        """Runs one image through a served model and caches the outcome.
+
+        Args:
+            serving (ServingModel): The model version to check
+
+        Returns:
+            dict: The cached result
+        """
+        self._check_started = time.monotonic()
+        try:
+            with serving:
+                probabilities = np.asarray(serving.model.predict(np.zeros((1, 28, 28, 1), dtype='float32'), verbose=0))
+            if probabilities.shape != (1, 10) or not np.all(np.isfinite(probabilities)):
+                raise ValueError(f"unexpected output of shape {probabilities.shape}")
+            error = None
+        except Exception as e:
+            error = str(e)
+            logging.error(f"Health check prediction failed: {error}")
+        elapsed = time.monotonic() - self._check_started
+        self._check_started = None
+        if error is None:
+            RECENT_INFERENCE_LATENCY.observe(elapsed)
+        HEALTH_CHECK_OK.set(error is None)
+        HEALTH_CHECK_SECONDS.set(elapsed)
+        result = {
+            'ok': error is None,
+            'error': error,
+            'version': serving.version,
+            'seconds': round(elapsed, 6),
+            'checked_at': time.time(),
+        }
+        self._result = (os.getpid(), result)
+        return result
+
+    @property
+    def result(self):
+        """The last check result for this process, or None before the first one"""
+        # A result cached before fork describes the parent's model
+        if self._result is None or self._result[0] != os.getpid():
+            return None
+        return self._result[1]
+
+    def live(self):
+        """Whether this worker is alive: false only when an inference check has hung.
+
+        Returns:
+            tuple: (alive, reason or None)
+        """
+        self.start()
+        started = self._check_started
+        if started is not None and time.monotonic() - started > 5 * max(self.interval, 1.0):
+            return False, f"inference check running for {time.monotonic() - started:.0f}s"
+        return True, None
+
+    def ready(self):
+        """Whether this worker should receive traffic.
+
+        Returns:
+            tuple: (ready, details dict for the probe response)
+        """
+        self.start()
+        serving = self.manager.serving
+        result = self.result
+        queue_depth = serving.batcher.queue_depth() if serving is not None and serving.batcher is not None else 0
+        p95 = RECENT_INFERENCE_LATENCY.percentile(95)
+        reasons = []
+        if serving is None:
+            reasons.append(f"model failed to load: {self.manager.error}" if self.manager.error else "model loading")
+        elif result is None or result['version'] != serving.version:
+            reasons.append("inference check pending")
+        elif not result['ok']:
+            reasons.append(f"inference check failed: {result['error']}")
+        elif time.time() - result['checked_at'] > 3 * self.interval + 5:
+            reasons.append("inference check stale")
+        # The inference worker pool, when INFERENCE_WORKERS is set
+        workers_down = getattr(serving.model, 'workers_down', None) if serving is not None else None
+        down = workers_down() if workers_down is not None else 0
+        if down:
+            reasons.append(f"{down} of {serving.model.workers} inference workers down")
+        if queue_depth > self.max_queue_depth:
+            reasons.append(f"queue depth {queue_depth} above {self.max_queue_depth}")
+        if p95 is not None and p95 * 1000 > self.max_inference_ms:
+            reasons.append(f"p95 inference latency {p95 * 1000:.0f}ms above {self.max_inference_ms:.0f}ms")
+        details = {
+            'status': 'not ready' if reasons else 'ready',
+            'reasons': reasons,
+            'model_version': serving.version if serving is not None else None,
+            'queue_depth': queue_depth,
+            'inference_p95_ms': round(p95 * 1000, 3) if p95 is not None else None,
+            'last_check': result,
+        }
+        return not reasons, details
+
+def create_health_monitor(manager):
+    """Health monitor for a model manager, configured from the environment.
+
+    Args:
+        manager (ModelManager): Holds the served model
+
+    Returns:
+        HealthMonitor: The monitor; its check thread starts on the first probe
+    """
+    return HealthMonitor(
+        manager,
+        interval=float(os.getenv('HEALTH_CHECK_INTERVAL_SECONDS', '30')),
+        max_queue_depth=int(os.getenv('HEALTH_MAX_QUEUE_DEPTH', '256')),
+        max_inference_ms=float(os.getenv('HEALTH_MAX_INFERENCE_MS', '1000')),
+    )
@@ -0,0 +1,147 @@
+"""
+Server-side ingestion of uploaded images and arbitrary-size grayscale arrays.
+
+Raw pictures of a digit are normalized the way MNIST was built: the digit's
+bounding box is cropped, resized with its aspect ratio kept so the longer
+side is 20 pixels, and placed in a 28x28 field so its center of mass sits
+at the center. Dark ink on a light background is inverted to MNIST's light
+on dark. Everything after decoding is vectorized NumPy; resizing is one
+small matrix product per axis.
+
+PNG and JPEG decoding uses Pillow, imported on first use.
+"""
+import io
+import os
+from functools import lru_cache
+import numpy as np
+
+# Side of the MNIST field and of the box the digit is scaled into
+MNIST_SIZE = 28
+DIGIT_BOX = 20
+
+# Pixels at or below this intensity (in [0, 1]) do not count toward the bounding box
+INK_THRESHOLD = 0.1
+
+IMAGE_MIMETYPES = ('image/png', 'image/jpeg')
+
+# Largest image accepted, in pixels; guards against decompression bombs
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', str(2048 * 2048)))
+
+def decode_image_file(data):
+    """Decodes a PNG or JPEG file to grayscale pixels.
+
+    Transparent pixels count as background. Large JPEGs are decoded at a
+    reduced DCT scale, since the digit ends up 20 pixels tall anyway.
+
+    Args:
+        data (bytes): The encoded file
+
+    Returns:
+        numpy.array: 2-D uint8 array of 0-255 pixels
+
+    Raises:
+        ValueError: If the data is not a decodable image or is too large
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        raise ValueError("Body is not a PNG or JPEG image")
+    if image.format not in ('PNG', 'JPEG'):
+        raise ValueError(f"Unsupported image format {image.format}")
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image of {width}x{height} pixels exceeds {MAX_IMAGE_PIXELS} pixels")
+    if image.format == 'JPEG':
+        image.draft('L', (4 * MNIST_SIZE, 4 * MNIST_SIZE))
+
+    try:
+        if 'A' in image.getbands() or 'transparency' in image.info:
+            # Composite onto the background the ink is not: inverted later if needed
+            rgba = image.convert('RGBA')
+            pixels = np.asarray(rgba.convert('L'), dtype=np.float32)
+            alpha = np.asarray(rgba.getchannel('A'), dtype=np.float32) / 255.0
+            ink = pixels[alpha > 0.5]
+            background = 255.0 if ink.size and ink.mean() < 128 else 0.0
+            pixels = pixels * alpha + background * (1.0 - alpha)
+            return np.rint(pixels).astype(np.uint8)
+        return np.asarray(image if image.mode == 'L' else image.convert('L'))
+    except OSError as e:
+        raise ValueError(f"Could not decode image: {e}")
+
+@lru_cache(maxsize=512)
+def _resample_matrix(source, target):
+    """(target, source) weights of an antialiased linear resize along one axis"""
+    scale = source / target
+    support = max(scale, 1.0)
+    centers = (np.arange(target) + 0.5) * scale - 0.5
+    weights = np.maximum(0.0, 1.0 - np.abs(np.arange(source)[None, :] - centers[:, None]) / support)
+    weights = (weights / weights.sum(axis=1, keepdims=True)).astype(np.float32)
+    # Shared between calls through the cache
+    weights.setflags(write=False)
+    return weights
+
+def normalize_digit(image_data):
+    """Converts a grayscale picture of a single digit to the MNIST layout.
+
+    Args:
+        image_data (numpy.array): 2-D array of any size; uint8 pixels, or floats
+            in [0, 1] or 0-255. Light ink on a dark background or the reverse.
+
+    Returns:
+        numpy.array: float32 array of shape (28, 28) with values in [0, 1];
+            all zeros if the image is blank
+
+    Raises:
+        ValueError: If the array is not 2-D or is too large
+    """
+    image = np.asarray(image_data)
+    if image.ndim != 2 or 0 in image.shape:
+        raise ValueError(f"Expected a 2-D grayscale image, got shape {image.shape}")
+    if image.size > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Image of {image.shape[1]}x{image.shape[0]} pixels exceeds {MAX_IMAGE_PIXELS} pixels")
+
+    # Same scaling rule as prepare_image: uint8 and anything above 1.0 is 0-255.
+    # The bounding box is found on the raw pixels so only the crop is converted.
+    scale = 255.0 if image.dtype == np.uint8 or image.max() > 1.0 else 1.0
+
+    # The border is background; MNIST digits are light on dark
+    border = np.concatenate([image[0], image[-1], image[1:-1, 0], image[1:-1, -1]])
+    inverted = border.mean() > 0.5 * scale
+    # Integer thresholds keep the comparison in the pixels' own dtype
+    integer = image.dtype.kind in 'ui'
+    if inverted:
+        limit = (1.0 - INK_THRESHOLD) * scale
+        ink = image < (int(np.ceil(limit)) if integer else limit)
+    else:
+        limit = INK_THRESHOLD * scale
+        ink = image > (int(limit) if integer else limit)
+
+    rows = np.flatnonzero(ink.any(axis=1))
+    if len(rows) == 0:
+        return np.zeros((MNIST_SIZE, MNIST_SIZE), dtype=np.float32)
+    cols = np.flatnonzero(ink[rows[0]:rows[-1] + 1].any(axis=0))
+    digit = image[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1].astype(np.float32)
+    digit /= scale
+    if inverted:
+        np.subtract(1.0, digit, out=digit)
+    np.clip(digit, 0.0, 1.0, out=digit)
+
+    # Longer side to 20 pixels, aspect ratio kept
+    height, width = digit.shape
+    factor = DIGIT_BOX / max(height, width)
+    target_height = max(1, int(round(height * factor)))
+    target_width = max(1, int(round(width * factor)))
+    digit = _resample_matrix(height, target_height) @ digit @ _resample_matrix(width, target_width).T
+
+    # Shift the center of mass to the center of the field, keeping the digit inside it
+    total = digit.sum()
+    center_y = (digit.sum(axis=1) @ np.arange(target_height)) / total
+    center_x = (digit.sum(axis=0) @ np.arange(target_width)) / total
+    top = int(np.clip(np.rint((MNIST_SIZE - 1) / 2 - center_y), 0, MNIST_SIZE - target_height))
+    left = int(np.clip(np.rint((MNIST_SIZE - 1) / 2 - center_x), 0, MNIST_SIZE - target_width))
+    field = np.zeros((MNIST_SIZE, MNIST_SIZE), dtype=np.float32)
+    field[top:top + target_height, left:left + target_width] = digit
+    np.clip(field, 0.0, 1.0, out=field)
+    return field
@@ -0,0 +1,257 @@
+"""
+Inference engines for the serving path.
+
+Every engine exposes the same ``predict(images, verbose=0)`` call as
+``tf.keras.Model``, taking a float32 (N, 28, 28, 1) batch and returning
+(N, 10) probabilities, so it can be passed anywhere a model is expected
+(``predict``, ``predict_batch``, ``MicroBatcher``). The engine is chosen
+with the ``INFERENCE_BACKEND`` environment variable.
+
+TensorFlow is only imported by the engines that need it, so the numpy
+backend, and the TFLite backend running on ``tflite_runtime``, keep full
+TensorFlow out of the serving process.
+"""
+import os
+import logging
+import threading
+import numpy as np
+from .model import MODEL_PATH, TFLITE_QUANTIZATIONS, tflite_model_path, export_tflite_model, numpy_model_path, weight_store_path
+from .numpy_engine import NumpyModel, export_numpy_model
+from .weight_store import WeightStore, load_numpy_model
+
+# Batch sizes traced and warmed up ahead of the first request
+DEFAULT_BATCH_BUCKETS = (1, 4, 16, 64)
+
+def batch_buckets_from_env():
+    """Parse ``INFERENCE_BATCH_BUCKETS`` (e.g. "1,4,16,64")"""
+    value = os.getenv('INFERENCE_BATCH_BUCKETS')
+    if not value:
+        return DEFAULT_BATCH_BUCKETS
+    return tuple(int(size) for size in value.split(',') if size.strip())
+
+class CompiledModel:
+    """Serves a Keras model through pre-traced concrete functions.
+
+    ``model.predict`` builds a data adapter and runs the Keras predict loop on
+    every call, which costs milliseconds for a 28x28 input. This engine traces
+    ``model(images, training=False)`` once per batch-size bucket with a fixed
+    input signature, warms each one up, and pads incoming batches to the
+    nearest bucket. Batches larger than the biggest bucket are split.
+    """
+
+    backend = 'compiled'
+
+    def __init__(self, keras_model, buckets=DEFAULT_BATCH_BUCKETS):
+        """
+        Args:
+            keras_model (tf.keras.Model): Trained neural network model
+            buckets (tuple, optional): Batch sizes to trace. Defaults to DEFAULT_BATCH_BUCKETS.
+        """
+        import tensorflow as tf
+
+        self.keras_model = keras_model
+        self.buckets = tuple(sorted({int(size) for size in buckets if int(size) > 0}))
+        if not self.buckets:
+            raise ValueError("At least one positive batch-size bucket is required")
+
+        forward = tf.function(lambda images: keras_model(images, training=False))
+        self._functions = {
+            size: forward.get_concrete_function(tf.TensorSpec((size, 28, 28, 1), tf.float32))
+            for size in self.buckets
+        }
+        self.warmup()
+
+    def warmup(self):
+        """Run every bucket once so the first real request pays no setup cost"""
+        import tensorflow as tf
+
+        for size, function in self._functions.items():
+            function(tf.zeros((size, 28, 28, 1), tf.float32))
+
+    def predict(self, images, verbose=0):
+        """Predicts class probabilities for a batch of images.
+
+        Args:
+            images (numpy.array): float32 array of shape (N, 28, 28, 1)
+            verbose (int, optional): Ignored; kept for tf.keras.Model compatibility.
+
+        Returns:
+            numpy.array: (N, 10) class probabilities
+        """
+        import tensorflow as tf
+
+        images = np.asarray(images, dtype='float32')
+        largest = self.buckets[-1]
+        if len(images) > largest:
+            return np.concatenate([
+                self.predict(images[start:start + largest])
+                for start in range(0, len(images), largest)
+            ])
+
+        count = len(images)
+        size = next(size for size in self.buckets if size >= count)
+        if size != count:
+            padded = np.zeros((size, 28, 28, 1), dtype='float32')
+            padded[:count] = images
+            images = padded
+        return self._functions[size](tf.constant(images)).numpy()[:count]
+
+def tflite_interpreter_class():
+    """The TFLite interpreter, preferring the standalone tflite_runtime package"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+class TFLiteModel:
+    """Serves a (quantized) TFLite export through the TFLite interpreter.
+
+    Interpreters are not thread-safe, so each request thread lazily gets its
+    own; they all map the same model file. The input tensor is resized only
+    when the batch size changes.
+    """
+
+    backend = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        """
+        Args:
+            model_path (str): Path of the .tflite file
+            num_threads (int, optional): Interpreter threads per request thread. Defaults to TFLite's choice.
+        """
+        self.model_path = str(model_path)
+        self.num_threads = num_threads
+        self._interpreter_class = tflite_interpreter_class()
+        self._local = threading.local()
+        # Fail fast on a bad file and warm up the loading thread's interpreter
+        self.predict(np.zeros((1, 28, 28, 1), dtype='float32'))
+
+    def _interpreter(self, batch_size):
+        """This thread's interpreter, sized for batch_size"""
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            interpreter = self._interpreter_class(model_path=self.model_path, num_threads=self.num_threads)
+            interpreter.allocate_tensors()
+            input_details = interpreter.get_input_details()[0]
+            output_index = interpreter.get_output_details()[0]['index']
+            state = self._local.state = [interpreter, input_details['index'], output_index, int(input_details['shape'][0])]
+
+        interpreter, input_index, _, allocated_size = state
+        if allocated_size != batch_size:
+            interpreter.resize_tensor_input(input_index, [batch_size, 28, 28, 1])
+            interpreter.allocate_tensors()
+            state[3] = batch_size
+        return state
+
+    def predict(self, images, verbose=0):
+        """Predicts class probabilities for a batch of images.
+
+        Args:
+            images (numpy.array): float32 array of shape (N, 28, 28, 1)
+            verbose (int, optional): Ignored; kept for tf.keras.Model compatibility.
+
+        Returns:
+            numpy.array: (N, 10) class probabilities
+        """
+        images = np.ascontiguousarray(images, dtype='float32')
+        interpreter, input_index, output_index, _ = self._interpreter(len(images))
+        interpreter.set_tensor(input_index, images)
+        interpreter.invoke()
+        return interpreter.get_tensor(output_index).copy()
+
+def tflite_quantization_from_env():
+    """Quantization scheme served by the tflite backend (``TFLITE_QUANTIZATION``)"""
+    quantization = os.getenv('TFLITE_QUANTIZATION', 'dynamic').lower()
+    if quantization not in TFLITE_QUANTIZATIONS:
+        raise ValueError(f"Unknown TFLITE_QUANTIZATION {quantization!r}, expected one of {TFLITE_QUANTIZATIONS}")
+    return quantization
+
+def tflite_threads_from_env():
+    """Interpreter thread count (``TFLITE_NUM_THREADS``), or None for the default"""
+    value = os.getenv('TFLITE_NUM_THREADS')
+    return int(value) if value else None
+
+def numpy_store_path():
+    """The weight store, if it exists and carries the NumPy engine's weights"""
+    path = weight_store_path()
+    try:
+        if path.exists() and 'numpy' in WeightStore(path).metadata:
+            return path
+    except ValueError as e:
+        logging.warning(f"Ignoring unreadable weight store {path}: {e}")
+    return None
+
+def artifact_path(backend=None):
+    """The on-disk model a backend is served from.
+
+    Args:
+        backend (str, optional): Defaults to the ``INFERENCE_BACKEND`` environment variable.
+
+    Returns:
+        Path: The export for tflite/numpy, otherwise the SavedModel at MODEL_PATH
+    """
+    backend = (backend or os.getenv('INFERENCE_BACKEND', 'compiled')).lower()
+    if backend == 'tflite':
+        return tflite_model_path(tflite_quantization_from_env())
+    if backend == 'numpy':
+        return numpy_store_path() or numpy_model_path()
+    return MODEL_PATH
+
+def load_engine(backend=None):
+    """Loads an engine straight from its exported artifact, without Keras.
+
+    Args:
+        backend (str, optional): Defaults to the ``INFERENCE_BACKEND`` environment variable.
+
+    Returns:
+        object: The engine, or None if the backend needs a Keras model or its artifact does not exist yet
+    """
+    backend = (backend or os.getenv('INFERENCE_BACKEND', 'compiled')).lower()
+    if backend == 'tflite':
+        path = tflite_model_path(tflite_quantization_from_env())
+        if path.exists():
+            logging.info(f"Using tflite inference backend with {path}")
+            return TFLiteModel(path, tflite_threads_from_env())
+    if backend == 'numpy':
+        # Prefer the memory-mapped store: its pages are shared by every worker
+        path = numpy_store_path()
+        if path is not None:
+            logging.info(f"Using numpy inference backend with memory-mapped {path}")
+            return load_numpy_model(path)
+        path = numpy_model_path()
+        if path.exists():
+            logging.info(f"Using numpy inference backend with {path}")
+            return NumpyModel.load(path)
+    return None
+
+def create_engine(model, backend=None):
+    """Wraps a trained model in the configured inference engine.
+
+    Args:
+        model (tf.keras.Model): Trained neural network model
+        backend (str, optional): "keras", "compiled", "tflite" or "numpy". Defaults to
+            the ``INFERENCE_BACKEND`` environment variable, or "compiled".
+
+    Returns:
+        object: An engine with a ``predict(images, verbose=0)`` method
+    """
+    backend = (backend or os.getenv('INFERENCE_BACKEND', 'compiled')).lower()
+    logging.info(f"Using {backend} inference backend")
+    if backend == 'keras':
+        return model
+    if backend == 'compiled':
+        return CompiledModel(model, batch_buckets_from_env())
+    if backend == 'tflite':
+        path = tflite_model_path(tflite_quantization_from_env())
+        if not path.exists():
+            # int8 needs a calibration set and is only produced by scripts/train_model.py
+            path = export_tflite_model(model, tflite_quantization_from_env())
+        return TFLiteModel(path, tflite_threads_from_env())
+    if backend == 'numpy':
+        path = numpy_model_path()
+        if not path.exists():
+            export_numpy_model(model, path)
+        return NumpyModel.load(path)
+    raise ValueError(f"Unknown inference backend: {backend}")
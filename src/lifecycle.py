@@ -0,0 +1,286 @@
+"""
+Serving model lifecycle across gunicorn's fork.
+
+With ``gunicorn --preload`` the app is imported once in the master and each
+worker is forked from it. Backends whose state is plain memory (the NumPy
+engine's weight arrays, the memory-mapped TFLite flatbuffer) are loaded in
+the master so every worker shares the weights copy-on-write. TensorFlow's
+runtime does not survive fork, so the Keras-based backends are instead
+loaded lazily, once per worker, on first use after the fork.
+
+With a model registry (``MODEL_REGISTRY_DIR``) every worker also watches for
+a newly activated version. It loads and warms the new version in the
+background and then swaps it in. Requests already running finish on the
+version they started with, and the old version is released after them.
+"""
+import os
+import time
+import logging
+import threading
+import numpy as np
+from .inference import artifact_path, load_engine
+from .model import create_batcher, weight_store_path
+from .monitor import MODEL_LOAD_SECONDS, set_model_info
+from .process_pool import inference_workers_from_env
+
+# Backends that can be loaded before fork and shared by the workers
+FORK_SAFE_BACKENDS = ('numpy', 'tflite')
+
+def model_version(model):
+    """Identifies the weights a model serves.
+
+    Processes serving the same exported artifact get the same version, so
+    results cached by one are valid for the others. A model trained in
+    this process gets a version of its own.
+
+    Args:
+        model (object): The inference engine
+
+    Returns:
+        str: The model version
+    """
+    version = getattr(model, 'version', None)
+    if version is not None:
+        return str(version)
+    backend = getattr(model, 'backend', 'keras')
+    if os.environ.get('PYTHON_ENV', 'production') != 'development':
+        version = artifact_version(backend)
+        if version is not None:
+            return version
+    return f"{backend}-{os.getpid()}-{time.time_ns():x}"
+
+def artifact_version(backend):
+    """Version of the backend's exported artifact from its mtime and size, or None when there is none"""
+    path = artifact_path(backend)
+    if backend in ('keras', 'compiled') and weight_store_path().exists():
+        path = weight_store_path()
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return f"{backend}-{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+class ServingModel:
+    """One loaded model version and its micro-batcher.
+
+    Use as a context manager around a request: the version it was entered
+    on stays usable until exit, even if a newer one is swapped in meanwhile.
+
+    Args:
+        model (object): The inference engine
+        batcher (MicroBatcher): Micro-batcher in front of the model, or None
+        version (str): The model version
+    """
+
+    def __init__(self, model, batcher, version):
+        self.model = model
+        self.batcher = batcher
+        self.version = version
+        self._leases = 0
+        self._idle = threading.Condition()
+
+    def __enter__(self):
+        with self._idle:
+            self._leases += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._idle:
+            self._leases -= 1
+            if self._leases == 0:
+                self._idle.notify_all()
+
+    def retire(self, timeout=60.0):
+        """Waits for in-flight requests, then stops the batcher and any worker processes.
+
+        Args:
+            timeout (float, optional): Longest wait for requests to finish. Defaults to 60.
+        """
+        with self._idle:
+            if not self._idle.wait_for(lambda: self._leases == 0, timeout):
+                logging.warning(f"Retiring model version {self.version} with {self._leases} requests still running")
+        if self.batcher is not None:
+            self.batcher.close()
+        close = getattr(self.model, 'close', None)
+        if close is not None:
+            close()
+        logging.info(f"Retired model version {self.version}")
+
+def warm_up(model):
+    """Runs a single image and a full micro-batch through a freshly loaded model"""
+    for batch_size in sorted({1, int(os.getenv('BATCH_MAX_SIZE', '32'))}):
+        model.predict(np.zeros((batch_size, 28, 28, 1), dtype='float32'), verbose=0)
+
+class ModelManager:
+    """Loads the serving model at most once per process and hands it out.
+
+    Args:
+        loader (callable): Returns a ready inference engine (see src.inference);
+            called with a registry version when swapping one in
+        registry (ModelRegistry, optional): Registry to watch for new versions
+    """
+
+    def __init__(self, loader, registry=None):
+        self._loader = loader
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._serving = None
+        self._pid = None
+        self._shared = False
+        self._watcher_pid = None
+        self._failed_version = None
+        self.error = None
+
+    @property
+    def backend(self):
+        return os.getenv('INFERENCE_BACKEND', 'compiled').lower()
+
+    def _usable(self):
+        # A model loaded before fork is only reused by the children if it is fork-safe
+        return self._serving is not None and (self._shared or self._pid == os.getpid())
+
+    def _install(self, model, mode, started):
+        """Makes a loaded model the served one; returns the version it replaces"""
+        elapsed = time.perf_counter() - started
+        MODEL_LOAD_SECONDS.labels(backend=getattr(model, 'backend', 'keras'), mode=mode).set(elapsed)
+        logging.info(f"Model loaded in {elapsed:.2f}s ({mode})")
+        version = model_version(model)
+        set_model_info(model, version)
+        previous = self._serving
+        self._serving = ServingModel(model, create_batcher(model), version)
+        self._pid = os.getpid()
+        self.error = None
+        return previous
+
+    def preload(self):
+        """Loads a fork-safe backend from its exported artifact before fork.
+
+        Does nothing for TensorFlow-based backends, or when the artifact is
+        missing, so importing the app in the gunicorn master never starts
+        the TensorFlow runtime.
+
+        Returns:
+            bool: Whether the model was preloaded
+        """
+        if inference_workers_from_env() > 0:
+            logging.info("Inference runs in worker processes; deferring pool start to workers")
+            return False
+        if self.backend not in FORK_SAFE_BACKENDS:
+            logging.info(f"{self.backend} backend is not fork-safe; deferring model load to workers")
+            return False
+        with self._lock:
+            if self._usable():
+                return True
+            started = time.perf_counter()
+            version = self.registry.current_version() if self.registry is not None else None
+            if version is not None:
+                model = self.registry.load_engine(version, self.backend)
+            else:
+                model = load_engine(self.backend)
+            if model is None:
+                logging.info(f"No exported {self.backend} model; deferring model load to workers")
+                return False
+            self._install(model, 'preload', started)
+            self._shared = True
+            return True
+
+    def current(self):
+        """The serving model version for this process, loading it on first use.
+
+        Returns:
+            ServingModel: The model, its batcher and its version
+
+        Raises:
+            Exception: Whatever the loader raised if loading failed
+        """
+        if not self._usable():
+            with self._lock:
+                if not self._usable():
+                    started = time.perf_counter()
+                    try:
+                        model = self._loader()
+                    except Exception as e:
+                        self.error = str(e)
+                        raise
+                    self._install(model, 'worker', started)
+                    self._shared = False
+        if self.registry is not None and self._watcher_pid != os.getpid():
+            self._start_watching()
+        return self._serving
+
+    def get(self):
+        """The model for this process, loading it on first use.
+
+        Returns:
+            object: The inference engine
+
+        Raises:
+            Exception: Whatever the loader raised if loading failed
+        """
+        return self.current().model
+
+    def swap(self, version):
+        """Loads and warms up a registry version, then serves it instead of the current one.
+
+        Requests already running finish on the old version, which is retired
+        in the background once they have.
+
+        Args:
+            version (str): Registry version to serve
+        """
+        started = time.perf_counter()
+        model = self._loader(version)
+        warm_up(model)
+        with self._lock:
+            previous = self._install(model, 'swap', started)
+            self._shared = False
+        logging.info(f"Now serving model version {version}")
+        if previous is not None and previous.model is not model:
+            threading.Thread(target=previous.retire, name='model-retire', daemon=True).start()
+
+    def _start_watching(self):
+        with self._lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        interval = float(os.getenv('MODEL_REGISTRY_POLL_SECONDS', '10'))
+        threading.Thread(target=self._watch, args=(interval,), name='model-registry-watcher', daemon=True).start()
+
+    def _watch(self, interval):
+        """Polls the registry and swaps in each newly activated version"""
+        while True:
+            time.sleep(interval)
+            version = None
+            try:
+                version = self.registry.current_version()
+                if version != self._failed_version:
+                    # Another version was activated since the failure; the failed one gets a new attempt
+                    self._failed_version = None
+                if version is None or version == self.version or version == self._failed_version:
+                    continue
+                logging.info(f"Model version {version} activated; loading it")
+                self.swap(version)
+                self._failed_version = None
+            except Exception as e:
+                # Keep serving the current version; retry once another version is activated
+                self._failed_version = version or self._failed_version
+                logging.error(f"Could not swap in model version {version}: {str(e)}")
+
+    @property
+    def version(self):
+        """Version of the loaded model, or None"""
+        return self._serving.version if self._serving is not None else None
+
+    @property
+    def serving(self):
+        """The loaded ServingModel, or None without triggering a load"""
+        return self._serving if self._usable() else None
+
+    @property
+    def model(self):
+        """The loaded model, or None without triggering a load"""
+        return self._serving.model if self._usable() else None
+
+    @property
+    def batcher(self):
+        """The micro-batcher for the loaded model, or None"""
+        return self._serving.batcher if self._usable() else None
@@ -0,0 +1,150 @@
+"""
+Structured, non-blocking logging for the serving path.
+
+Request threads never write to stdout. Every record goes through a bounded
+queue to a listener thread that formats it (JSON via python-json-logger, or
+plain text with ``LOG_FORMAT=text``) and writes it; when the queue is full the
+record is dropped and counted instead of blocking the request. Formatting,
+including ``%``-style arguments, happens on the listener thread.
+
+Each request gets an ID (taken from an incoming ``X-Request-ID`` header or
+generated) that is attached to every record logged while serving it and
+echoed in the response. Routine per-request logs go through ``log_request``
+and are only emitted for a sampled fraction of requests
+(``LOG_SAMPLE_RATE``); warnings and errors are always emitted.
+"""
+import os
+import sys
+import uuid
+import queue
+import random
+import atexit
+import logging
+import logging.handlers
+from flask import g, request, has_request_context
+from .monitor import LOG_RECORDS_DROPPED
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+class RequestContextFilter(logging.Filter):
+    """Tags records with the ID of the request being served, if any"""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Shutting down may wait for room in a full queue; logging may not
+        self.queue.put(self._sentinel)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a listener thread without formatting or blocking.
+
+    The queue and listener are created per process, so a handler set up
+    before gunicorn forks keeps working in every worker.
+
+    Args:
+        target (logging.Handler): Handler the listener writes records to
+        max_queue_size (int, optional): Records buffered before dropping. Defaults to 10000.
+    """
+
+    def __init__(self, target, max_queue_size=10000):
+        super().__init__(queue.Queue(max_queue_size))
+        self.target = target
+        self.max_queue_size = max_queue_size
+        self.listener = None
+        self._pid = None
+
+    def _ensure_listener(self):
+        if self._pid != os.getpid():
+            # Neither the listener thread nor the queue's locks survive fork
+            self.queue = queue.Queue(self.max_queue_size)
+            self.listener = _QueueListener(self.queue, self.target, respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Defer formatting to the listener; only pin down what the record
+        # needs from this thread
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def stop(self):
+        """Flushes queued records and stops the listener"""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self._pid = None
+
+def make_formatter(log_format):
+    """JSON formatter from python-json-logger, or the plain text format"""
+    if log_format == 'json':
+        from pythonjsonlogger import jsonlogger
+        return jsonlogger.JsonFormatter(
+            '%(asctime)s %(levelname)s %(name)s %(message)s %(request_id)s',
+            rename_fields={'levelname': 'level'}
+        )
+    return logging.Formatter('%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s')
+
+def configure_logging():
+    """Routes the root logger through a NonBlockingQueueHandler.
+
+    ``LOG_LEVEL`` (default INFO) sets the level, ``LOG_FORMAT`` (json or
+    text, default json) the output format and ``LOG_QUEUE_SIZE`` (default
+    10000) how many records may wait before new ones are dropped.
+
+    Returns:
+        NonBlockingQueueHandler: The installed handler
+    """
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            return handler
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(make_formatter(os.environ.get('LOG_FORMAT', 'json').lower()))
+    handler = NonBlockingQueueHandler(stream, int(os.environ.get('LOG_QUEUE_SIZE', '10000')))
+    handler.addFilter(RequestContextFilter())
+
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    atexit.register(handler.stop)
+    return handler
+
+# Fraction of requests whose routine log lines are emitted
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.01'))
+
+def assign_request_id():
+    """Flask before_request hook: request ID and log sampling decision"""
+    g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+    g.log_sampled = random.random() < LOG_SAMPLE_RATE
+
+def add_request_id_header(response):
+    """Flask after_request hook: echo the request ID to the client"""
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+def log_request(message, *args, **fields):
+    """Logs a routine per-request event if this request is sampled.
+
+    Args:
+        message (str): %-style message, formatted on the listener thread
+        *args: Message arguments
+        **fields: Structured fields added to the record
+    """
+    if has_request_context() and g.get('log_sampled'):
+        logging.info(message, *args, extra=fields)
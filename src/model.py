@@ -1,51 +1,305 @@
-import tensorflow as tf
 import numpy as np
 from datetime import datetime
 import os
 from pathlib import Path
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from prometheus_client import Histogram
+
+# TensorFlow is imported inside the functions that need it, so serving
+# backends that do not use it (e.g. TFLite via tflite_runtime) never load it.
 
 MODEL_PATH = Path("models/digit_classifier")
 
+# Micro-batching metrics
+BATCH_SIZE = Histogram(
+    'digit_predict_batch_size',
+    'Number of images per batched forward pass',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+BATCH_QUEUE_WAIT = Histogram(
+    'digit_predict_batch_queue_wait_seconds',
+    'Time a prediction request waits in the batching queue',
+    buckets=(.0005, .001, .002, .005, .01, .025, .05, .1, .25)
+)
+
+def load_raw_data():
+    """Loads the MNIST dataset as raw uint8 pixels from the local dataset cache.
+
+    The arrays are memory-mapped (see src/dataset.py): nothing is read until
+    rows are used, and the cache is built from mnist.npz or IDX files on first call.
+
+    Returns:
+        tuple: (x_train, y_train, x_test, y_test); images are (N, 28, 28) uint8
+    """
+    from .dataset import open_dataset
+
+    return open_dataset().arrays()
+
 def load_and_preprocess_data():
     """Loads and preprocesses the MNIST dataset.
 
+    This materializes float32 copies of all 70000 images (about 220 MB).
+    Training and evaluation take the uint8 arrays of load_raw_data and
+    normalize per batch instead.
+
     Returns:
         tuple: A tuple containing the training data (x_train, y_train), the testing data (x_test, y_test)
     """
     # Load the MNIST dataset
-    (x_train, y_train), (x_test, y_test) = tf.keras.datasets.mnist.load_data()
+    x_train, y_train, x_test, y_test = load_raw_data()
 
     # Add channel dimension and normalize
-    x_train = x_train.reshape((60000, 28, 28, 1)).astype('float32') / 255
-    x_test = x_test.reshape((10000, 28, 28, 1)).astype('float32') / 255
+    x_train = x_train.reshape((len(x_train), 28, 28, 1)).astype('float32') / 255
+    x_test = x_test.reshape((len(x_test), 28, 28, 1)).astype('float32') / 255
 
     return x_train, y_train, x_test, y_test
 
-def create_and_train_model(x_train, y_train, epochs=10, save_model=True):
-    """Creates and trains a neural network model.
+# Fraction of the training arrays held out for validation, as fit(validation_split=...) did
+VALIDATION_SPLIT = 0.2
+
+# Augmentation strengths: translation and elastic displacement in pixels, rotation in degrees
+AUGMENT_MAX_SHIFT = 2.0
+AUGMENT_MAX_ROTATION = 10.0
+AUGMENT_ELASTIC_ALPHA = 1.5
+# Side of the coarse random grid upsampled into the smooth elastic displacement field
+AUGMENT_ELASTIC_GRID = 4
+
+def as_uint8_images(images):
+    """Converts images to (N, 28, 28) uint8 pixels.
 
     Args:
-        x_train (numpy.array): Training data
-        y_train (numpy.array): Training labels
-        epochs (int, optional): Number of epochs to train for. Defaults to 10.
-        save_model (bool, optional): Whether to save the model after training. Defaults to True.
+        images (numpy.array): uint8 pixels, or floats scaled to [0, 1] as returned by load_and_preprocess_data
 
     Returns:
-        tf.keras.Model: Trained neural network model.
+        numpy.array: (N, 28, 28) uint8 array
     """
-    # Set up TensorBoard logging with configurable directory
-    log_dir = os.getenv('TENSORBOARD_LOG_DIR', 'logs/fit/') + datetime.now().strftime("%Y%m%d-%H%M%S")
-    tensorboard_callback = tf.keras.callbacks.TensorBoard(
-        log_dir=log_dir,
-        histogram_freq=1,
-        write_graph=True,
-        write_images=True,
-        update_freq='epoch'
-    )
+    images = np.asarray(images)
+    if images.dtype != np.uint8:
+        images = np.clip(np.rint(images * 255.0), 0, 255).astype('uint8')
+    return images.reshape(-1, 28, 28)
+
+def write_tfrecord_shards(images, labels, directory, shard_size=10000, prefix='digits'):
+    """Writes labelled digits to TFRecord shards read by make_dataset.
+
+    Each record holds the 784 raw uint8 pixels and the label, so the shards
+    can hold production-collected digits or datasets larger than memory.
+
+    Args:
+        images (numpy.array): (N, 28, 28) or (N, 784) images, uint8 or scaled to [0, 1]
+        labels (numpy.array): (N,) integer labels
+        directory (Path): Output directory
+        shard_size (int, optional): Records per shard. Defaults to 10000.
+        prefix (str, optional): Shard file name prefix. Defaults to 'digits'.
+
+    Returns:
+        list: Paths of the written shards
+    """
+    import tensorflow as tf
+
+    images = as_uint8_images(images)
+    labels = np.asarray(labels)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    num_shards = max(1, -(-len(images) // shard_size))
+    paths = []
+    for shard in range(num_shards):
+        path = directory / f"{prefix}-{shard:05d}-of-{num_shards:05d}.tfrecord"
+        with tf.io.TFRecordWriter(str(path)) as writer:
+            for image, label in zip(images[shard * shard_size:(shard + 1) * shard_size],
+                                    labels[shard * shard_size:(shard + 1) * shard_size]):
+                example = tf.train.Example(features=tf.train.Features(feature={
+                    'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+                    'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[int(label)])),
+                }))
+                writer.write(example.SerializeToString())
+        paths.append(path)
+    logging.info(f"Wrote {len(images)} digits to {num_shards} shards in {directory}")
+    return paths
+
+def _parse_record(record):
+    """Decodes one TFRecord into a (28, 28) uint8 image and uint8 label"""
+    import tensorflow as tf
+
+    features = tf.io.parse_single_example(record, {
+        'image': tf.io.FixedLenFeature([], tf.string),
+        'label': tf.io.FixedLenFeature([], tf.int64),
+    })
+    image = tf.reshape(tf.io.decode_raw(features['image'], tf.uint8), (28, 28))
+    return image, tf.cast(features['label'], tf.uint8)
+
+def _warp(images, flow_x, flow_y):
+    """Bilinearly resamples (B, H, W, 1) images at each pixel plus a displacement.
+
+    Pixels sampled from outside the image are zero, the MNIST background.
+    """
+    import tensorflow as tf
+
+    shape = tf.shape(images)
+    batch, height, width = shape[0], shape[1], shape[2]
+    grid_y, grid_x = tf.meshgrid(tf.range(height, dtype=tf.float32), tf.range(width, dtype=tf.float32), indexing='ij')
+    x = grid_x + flow_x
+    y = grid_y + flow_y
+    x0 = tf.floor(x)
+    y0 = tf.floor(y)
+    wx = (x - x0)[..., tf.newaxis]
+    wy = (y - y0)[..., tf.newaxis]
+
+    # One pixel of zero padding; coordinates beyond it are clamped onto it
+    padded = tf.pad(images, [[0, 0], [1, 1], [1, 1], [0, 0]])
+    batch_index = tf.broadcast_to(tf.range(batch)[:, tf.newaxis, tf.newaxis], tf.shape(x))
+
+    def gather(yi, xi):
+        yi = tf.cast(tf.clip_by_value(yi, -1.0, tf.cast(height, tf.float32)), tf.int32) + 1
+        xi = tf.cast(tf.clip_by_value(xi, -1.0, tf.cast(width, tf.float32)), tf.int32) + 1
+        return tf.gather_nd(padded, tf.stack([batch_index, yi, xi], axis=-1))
+
+    top = (1 - wx) * gather(y0, x0) + wx * gather(y0, x0 + 1)
+    bottom = (1 - wx) * gather(y0 + 1, x0) + wx * gather(y0 + 1, x0 + 1)
+    return (1 - wy) * top + wy * bottom
+
+def augment_batch(images):
+    """Applies a random shift, rotation and elastic distortion to each image.
+
+    All three are combined into one displacement field per image, so the
+    batch is resampled once.
+
+    Args:
+        images (tf.Tensor): float32 (B, 28, 28, 1) batch
+
+    Returns:
+        tf.Tensor: The augmented batch
+    """
+    import math
+    import tensorflow as tf
+
+    shape = tf.shape(images)
+    batch, height, width = shape[0], shape[1], shape[2]
+    grid_y, grid_x = tf.meshgrid(tf.range(height, dtype=tf.float32), tf.range(width, dtype=tf.float32), indexing='ij')
+    center_y = (tf.cast(height, tf.float32) - 1) / 2
+    center_x = (tf.cast(width, tf.float32) - 1) / 2
+
+    # Source of each output pixel under rotation about the center, then shift
+    angle = tf.random.uniform((batch, 1, 1), -1.0, 1.0) * AUGMENT_MAX_ROTATION * math.pi / 180
+    shift = tf.random.uniform((batch, 2, 1, 1), -AUGMENT_MAX_SHIFT, AUGMENT_MAX_SHIFT)
+    cos, sin = tf.cos(angle), tf.sin(angle)
+    dy, dx = grid_y - center_y, grid_x - center_x
+    source_x = cos * dx - sin * dy + center_x - shift[:, 1]
+    source_y = sin * dx + cos * dy + center_y - shift[:, 0]
+
+    # Smooth elastic field: a coarse random grid upsampled to full resolution
+    coarse = tf.random.uniform((batch, AUGMENT_ELASTIC_GRID, AUGMENT_ELASTIC_GRID, 2), -1.0, 1.0)
+    elastic = tf.image.resize(coarse, (height, width), method='bicubic') * AUGMENT_ELASTIC_ALPHA
+
+    return _warp(images, source_x - grid_x + elastic[..., 0], source_y - grid_y + elastic[..., 1])
+
+def make_dataset(images=None, labels=None, shard_pattern=None, batch_size=128, training=True,
+                 augment=False, cache=True, shuffle_buffer=10000, seed=None):
+    """Builds the streaming tf.data input pipeline.
+
+    Examples stay uint8 from the sources through batching; each batch is
+    then normalized to float32 (and augmented) in one vectorized map that
+    runs in parallel with training, and batches are prefetched.
+
+    Args:
+        images (numpy.array, optional): In-memory images, e.g. the MNIST arrays (uint8 or scaled to [0, 1])
+        labels (numpy.array, optional): Labels of ``images``
+        shard_pattern (str, optional): Glob of TFRecord shards from write_tfrecord_shards,
+            streamed and interleaved with the in-memory examples
+        batch_size (int, optional): Defaults to 128.
+        training (bool, optional): Shuffle every epoch. Defaults to True.
+        augment (bool, optional): Apply augment_batch to training batches. Defaults to False.
+        cache (bool or str, optional): Cache decoded shard records in memory (True) or in
+            the given file, so only the first epoch reads the shards. Defaults to True.
+        shuffle_buffer (int, optional): Shuffle buffer for streamed shard records. Defaults to 10000.
+        seed (int, optional): Shuffle seed. Defaults to None.
+
+    Returns:
+        tf.data.Dataset: Batches of ((B, 28, 28, 1) float32 images, (B,) int32 labels)
+    """
+    import tensorflow as tf
 
-    # Build the CNN model
-    model = tf.keras.Sequential([
+    autotune = tf.data.AUTOTUNE
+    sources = []
+    if images is not None:
+        dataset = tf.data.Dataset.from_tensor_slices((as_uint8_images(images), np.asarray(labels, dtype='uint8')))
+        if training:
+            dataset = dataset.shuffle(len(images), seed=seed, reshuffle_each_iteration=True)
+        sources.append(dataset)
+    if shard_pattern:
+        files = tf.data.Dataset.list_files(shard_pattern, shuffle=training, seed=seed)
+        dataset = files.interleave(
+            tf.data.TFRecordDataset,
+            cycle_length=4,
+            num_parallel_calls=autotune,
+            deterministic=not training
+        ).map(_parse_record, num_parallel_calls=autotune)
+        if cache:
+            dataset = dataset.cache('' if cache is True else str(cache))
+        if training:
+            dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        sources.append(dataset)
+    if not sources:
+        raise ValueError("make_dataset needs in-memory images or a shard pattern")
+
+    if len(sources) == 1:
+        dataset = sources[0]
+    else:
+        # Alternate between sources until the smaller one runs out
+        dataset = tf.data.Dataset.sample_from_datasets(sources, seed=seed, stop_on_empty_dataset=False)
+
+    def to_model_input(batch_images, batch_labels):
+        batch_images = tf.cast(batch_images, tf.float32)[..., tf.newaxis] / 255.0
+        if training and augment:
+            batch_images = augment_batch(batch_images)
+        return batch_images, tf.cast(batch_labels, tf.int32)
+
+    return dataset.batch(batch_size).map(to_model_input, num_parallel_calls=autotune).prefetch(autotune)
+
+def measure_pipeline_throughput(dataset, num_batches=200):
+    """Measures how fast an input pipeline produces batches, without training.
+
+    Args:
+        dataset (tf.data.Dataset): Pipeline from make_dataset
+        num_batches (int, optional): Batches to time after the first. Defaults to 200.
+
+    Returns:
+        dict: batches, images, seconds and images_per_second
+    """
+    iterator = iter(dataset)
+    # The first batch pays for pipeline startup (shuffle buffer fill, thread pools)
+    next(iterator)
+    batches = images = 0
+    started = time.perf_counter()
+    for batch_images, _ in iterator:
+        batches += 1
+        images += int(batch_images.shape[0])
+        if batches >= num_batches:
+            break
+    seconds = time.perf_counter() - started
+    report = {
+        'batches': batches,
+        'images': images,
+        'seconds': seconds,
+        'images_per_second': images / seconds if seconds > 0 else 0.0,
+    }
+    logging.info(f"Input pipeline: {report['images_per_second']:.0f} images/s over {batches} batches")
+    return report
+
+def build_model():
+    """Builds the (untrained) CNN architecture.
+
+    Returns:
+        tf.keras.Sequential: The uncompiled model
+    """
+    import tensorflow as tf
+
+    return tf.keras.Sequential([
         # First Convolutional Block
         tf.keras.layers.Conv2D(32, (3, 3), activation='relu', input_shape=(28, 28, 1)),
         tf.keras.layers.BatchNormalization(),
@@ -67,54 +321,357 @@ def create_and_train_model(x_train, y_train, epochs=10, save_model=True):
         tf.keras.layers.Dense(512, activation='relu'),
         tf.keras.layers.BatchNormalization(),
         tf.keras.layers.Dropout(0.5),
-        tf.keras.layers.Dense(10, activation='softmax')
+        # Softmax stays in float32 under mixed precision
+        tf.keras.layers.Dense(10, activation='softmax', dtype='float32')
     ])
 
-    # Compile the model
+def compile_model(model, learning_rate=None):
+    """Compiles a model with the training optimizer, loss and metrics.
+
+    Args:
+        model (tf.keras.Model): Model from build_model
+        learning_rate (float, optional): Adam learning rate. Defaults to Adam's default.
+    """
+    import tensorflow as tf
+
     model.compile(
-        optimizer='adam',
+        optimizer=tf.keras.optimizers.Adam(learning_rate) if learning_rate else 'adam',
         loss='sparse_categorical_crossentropy',
         metrics=['accuracy']
     )
 
-    # Train the model with TensorBoard callback
-    model.fit(
-        x_train, 
-        y_train, 
-        epochs=epochs, 
-        batch_size=128,
-        validation_split=0.2,
-        callbacks=[tensorboard_callback],
-        verbose=1
+def float32_copy(model):
+    """Copies a trained model into a plain float32, single-device model.
+
+    Models trained under a distribution strategy hold mirrored variables,
+    and under mixed precision compute in bfloat16; the copy is what gets
+    saved, exported and served.
+
+    Args:
+        model (tf.keras.Model): Trained model from build_model
+
+    Returns:
+        tf.keras.Model: Compiled copy with the same weights and training history
+    """
+    import tensorflow as tf
+
+    policy = tf.keras.mixed_precision.global_policy()
+    tf.keras.mixed_precision.set_global_policy('float32')
+    try:
+        copy = build_model()
+        copy.set_weights(model.get_weights())
+    finally:
+        tf.keras.mixed_precision.set_global_policy(policy)
+    compile_model(copy)
+    copy.history = getattr(model, 'history', None)
+    return copy
+
+def epoch_throughput_callback(batch_size):
+    """Keras callback reporting training throughput every epoch.
+
+    Adds ``epoch_seconds`` (wall time including validation) and
+    ``samples_per_second`` (training steps only, counting full batches) to
+    the epoch logs, so they land in the fit history and TensorBoard.
+
+    Args:
+        batch_size (int): Global batch size
+
+    Returns:
+        tf.keras.callbacks.Callback: The callback
+    """
+    import tensorflow as tf
+
+    state = {}
+
+    def on_epoch_begin(epoch, logs=None):
+        state['started'] = state['train_end'] = time.perf_counter()
+        state['steps'] = 0
+
+    def on_train_batch_end(batch, logs=None):
+        state['steps'] += 1
+        state['train_end'] = time.perf_counter()
+
+    def on_epoch_end(epoch, logs=None):
+        epoch_seconds = time.perf_counter() - state['started']
+        train_seconds = state['train_end'] - state['started']
+        samples_per_second = state['steps'] * batch_size / train_seconds if train_seconds > 0 else 0.0
+        logging.info(f"Epoch {epoch + 1}: {epoch_seconds:.1f}s, {samples_per_second:.0f} samples/s")
+        if logs is not None:
+            logs['epoch_seconds'] = epoch_seconds
+            logs['samples_per_second'] = samples_per_second
+
+    return tf.keras.callbacks.LambdaCallback(
+        on_epoch_begin=on_epoch_begin,
+        on_train_batch_end=on_train_batch_end,
+        on_epoch_end=on_epoch_end
+    )
+
+def create_and_train_model(x_train, y_train, epochs=10, save_model=True, augment=False, shard_pattern=None,
+                           batch_size=128, learning_rate=None, strategy=None, telemetry_level=None):
+    """Creates and trains a neural network model.
+
+    Training data is streamed through make_dataset; the last VALIDATION_SPLIT
+    of the arrays is held out for validation.
+
+    Args:
+        x_train (numpy.array): Training data (uint8 or scaled to [0, 1])
+        y_train (numpy.array): Training labels
+        epochs (int, optional): Number of epochs to train for. Defaults to 10.
+        save_model (bool, optional): Whether to save the model after training. Defaults to True.
+        augment (bool, optional): Augment training batches with shifts, rotations and
+            elastic distortions. Defaults to False.
+        shard_pattern (str, optional): Glob of extra TFRecord training shards. Defaults to
+            the ``TRAIN_DATA_SHARDS`` environment variable.
+        batch_size (int, optional): Global batch size, split across replicas. Defaults to 128.
+        learning_rate (float, optional): Adam learning rate. Defaults to Adam's default.
+        strategy (tf.distribute.Strategy, optional): Strategy to train under (see
+            src/training.py). Defaults to the current strategy.
+        telemetry_level (str, optional): 'off', 'basic' or 'detailed'. Defaults to
+            the ``TRAIN_TELEMETRY_LEVEL`` environment variable, else 'basic'.
+
+    Returns:
+        tf.keras.Model: Trained neural network model. Its ``history`` carries the
+        per-epoch ``epoch_seconds`` and ``samples_per_second``, and with telemetry
+        the mean ``data_wait_ms``, ``compute_ms`` and ``callbacks_ms`` per step.
+    """
+    import tensorflow as tf
+    from .telemetry import create_telemetry
+
+    # Training telemetry for TensorBoard, written by a background thread (see src/telemetry.py)
+    log_dir = os.getenv('TENSORBOARD_LOG_DIR', 'logs/fit/') + datetime.now().strftime("%Y%m%d-%H%M%S")
+    telemetry = create_telemetry(log_dir, telemetry_level)
+
+    # Build and compile the CNN model; its variables are mirrored across the strategy's replicas
+    strategy = strategy or tf.distribute.get_strategy()
+    with strategy.scope():
+        model = build_model()
+        compile_model(model, learning_rate)
+
+    # Stream the training data; the held-out tail of the arrays is the validation set
+    split = int(len(x_train) * (1 - VALIDATION_SPLIT))
+    train_dataset = make_dataset(
+        x_train[:split], y_train[:split],
+        shard_pattern=shard_pattern or os.getenv('TRAIN_DATA_SHARDS'),
+        batch_size=batch_size,
+        augment=augment
     )
+    validation_dataset = make_dataset(x_train[split:], y_train[split:], batch_size=batch_size, training=False)
+
+    callbacks = [epoch_throughput_callback(batch_size)]
+    if telemetry is not None:
+        # Distributed input is split across replicas after the pipeline, so its
+        # data wait is not separated from compute
+        if strategy.num_replicas_in_sync == 1:
+            train_dataset = telemetry.instrument(train_dataset)
+        callbacks.append(telemetry.callback())
+
+    # Train the model with throughput reporting and telemetry callbacks
+    try:
+        model.fit(
+            train_dataset,
+            epochs=epochs,
+            validation_data=validation_dataset,
+            callbacks=callbacks,
+            verbose=1
+        )
+    finally:
+        # on_train_end is skipped when fit raises; stop the writer thread anyway
+        if telemetry is not None:
+            telemetry.close()
+
+    if strategy.num_replicas_in_sync > 1 or tf.keras.mixed_precision.global_policy().name != 'float32':
+        model = float32_copy(model)
     
     if save_model:
         save_trained_model(model)
     
     return model
 
+def weight_store_path():
+    """Path of the memory-mapped weight store written alongside the SavedModel.
+
+    Returns:
+        Path: models/digit_classifier.weights
+    """
+    return MODEL_PATH.with_name(f"{MODEL_PATH.name}.weights")
+
 def save_trained_model(model):
     """Saves the trained model to disk.
 
+    Writes the SavedModel and, alongside it, a memory-mapped weight store
+    (see src/weight_store.py) that loads without deserializing the graph.
+
     Args:
         model (tf.keras.Model): The trained model to save
     """
+    from src.weight_store import save_model_weights
+
     MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
     model.save(MODEL_PATH)
+    save_model_weights(model, weight_store_path())
 
 def load_trained_model():
     """Loads a trained model from disk.
 
+    Prefers the memory-mapped weight store and falls back to the SavedModel.
+    A model from the weight store is compiled like a trained one, so it can
+    be evaluated as loaded.
+
     Returns:
         tf.keras.Model: The loaded model, or None if no saved model exists
     """
+    import tensorflow as tf
+    from src.weight_store import load_keras_model
+
+    if weight_store_path().exists():
+        try:
+            model = load_keras_model(weight_store_path())
+            compile_model(model)
+            return model
+        except Exception as e:
+            logging.warning(f"Could not load weight store {weight_store_path()}, falling back to SavedModel: {e}")
     if MODEL_PATH.exists():
         return tf.keras.models.load_model(MODEL_PATH)
     return None
 
+# Post-training quantization schemes supported by export_tflite_model
+TFLITE_QUANTIZATIONS = ('dynamic', 'float16', 'int8')
+
+def tflite_model_path(quantization):
+    """Path of the TFLite export for a quantization scheme.
+
+    Args:
+        quantization (str): One of TFLITE_QUANTIZATIONS
+
+    Returns:
+        Path: e.g. models/digit_classifier_dynamic.tflite
+    """
+    return MODEL_PATH.with_name(f"{MODEL_PATH.name}_{quantization}.tflite")
+
+def numpy_model_path():
+    """Path of the flat NumPy weight export served by the numpy backend.
+
+    Returns:
+        Path: models/digit_classifier.npz
+    """
+    return MODEL_PATH.with_name(f"{MODEL_PATH.name}.npz")
+
+def sample_calibration_images(images, num_samples=500, seed=0):
+    """Draws a reproducible calibration set for post-training quantization.
+
+    Args:
+        images (numpy.array): uint8 (N, 28, 28) images from load_raw_data, or
+            preprocessed (N, 28, 28, 1) images from load_and_preprocess_data
+        num_samples (int, optional): Number of images to draw. Defaults to 500.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        numpy.array: float32 array of shape (num_samples, 28, 28, 1)
+    """
+    rng = np.random.default_rng(seed)
+    indices = rng.choice(len(images), size=min(num_samples, len(images)), replace=False)
+    # Only the drawn rows are read, and normalized
+    sample = np.asarray(images[np.sort(indices)])
+    if sample.dtype == np.uint8:
+        return prepare_batch(sample.reshape(len(sample), 28, 28))
+    return np.asarray(sample, dtype='float32')
+
+def export_tflite_model(model, quantization='dynamic', calibration_images=None, path=None):
+    """Exports a post-training quantized TFLite model next to the SavedModel.
+
+    - ``dynamic``: int8 weights, float activations (dynamic-range quantization)
+    - ``float16``: float16 weights
+    - ``int8``: int8 weights and activations with float input/output, with
+      activation ranges calibrated on ``calibration_images``
+
+    Args:
+        model (tf.keras.Model): Trained neural network model
+        quantization (str, optional): One of TFLITE_QUANTIZATIONS. Defaults to 'dynamic'.
+        calibration_images (numpy.array, optional): Calibration set from
+            sample_calibration_images. Required for ``int8``.
+        path (Path, optional): Destination. Defaults to tflite_model_path(quantization).
+
+    Returns:
+        Path: Path of the written .tflite file
+    """
+    import tensorflow as tf
+
+    if quantization not in TFLITE_QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization!r}, expected one of {TFLITE_QUANTIZATIONS}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if calibration_images is None:
+            raise ValueError("int8 quantization requires calibration images")
+        converter.representative_dataset = lambda: ([image[np.newaxis]] for image in calibration_images)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    path = Path(path or tflite_model_path(quantization))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(converter.convert())
+    logging.info(f"Exported {quantization} TFLite model to {path}")
+    return path
+
+# Reusable (N, 28, 28, 1) model inputs, one per thread
+_input_buffers = threading.local()
+
+def input_buffer(batch_size=1):
+    """A float32 model input of shape (batch_size, 28, 28, 1) owned by the calling thread.
+
+    The same memory is handed out on every call from a thread, so the
+    contents are only valid until that thread asks for a buffer again.
+
+    Args:
+        batch_size (int, optional): Number of images. Defaults to 1.
+
+    Returns:
+        numpy.array: Uninitialized float32 array of shape (batch_size, 28, 28, 1)
+    """
+    buffer = getattr(_input_buffers, 'array', None)
+    if buffer is None or len(buffer) < batch_size:
+        buffer = _input_buffers.array = np.empty((batch_size, 28, 28, 1), dtype='float32')
+    return buffer[:batch_size]
+
+def prepare_image(image_data, out=None):
+    """Converts a single image to the normalized MNIST input layout.
+
+    uint8 pixels are always 0-255; float images whose maximum is above 1.0
+    are rescaled from 0-255. The result is written in a single cast-copy
+    followed by an in-place divide, so nothing is allocated when ``out`` is given.
+
+    Args:
+        image_data (numpy.array): 784-d or 28x28 array representation of image.
+        out (numpy.array, optional): Contiguous float32 array of 784 elements to
+            write into, e.g. a row of input_buffer(). Defaults to a new array.
+
+    Returns:
+        numpy.array: float32 array of shape (28, 28, 1) with values in [0, 1]
+
+    Raises:
+        ValueError: If the image does not have 784 pixels
+    """
+    image_data = np.asarray(image_data)
+    if image_data.size != 784:
+        raise ValueError(f"Expected a 784-pixel image, got shape {image_data.shape}")
+    if out is None:
+        out = np.empty((28, 28, 1), dtype='float32')
+    target = out.reshape(784)
+    # Raw uint8 pixels are always 0-255
+    rescale = image_data.dtype == np.uint8 or image_data.max() > 1.0
+    np.copyto(target, image_data.reshape(784), casting='unsafe')
+    if rescale:
+        np.divide(target, np.float32(255.0), out=target)
+    return target.reshape(28, 28, 1)
+
 def predict(model, image_data):
     """Predicts the label of an input image.
 
+    The image is written into this thread's reusable input buffer, and the
+    probabilities are converted straight from the model's output row.
+
     Args:
         model (tf.keras.Model): Trained neural network model
         image_data (numpy.array): 784-d array representation of image.
@@ -123,42 +680,240 @@ def predict(model, image_data):
         tuple: (predicted label, probabilities for each digit)
     """
     try:
-        # Convert input to numpy array and normalize
-        image_data = np.array(image_data, dtype='float32')
-        if image_data.max() > 1.0:
-            image_data /= 255.0
-        
-        # Reshape to match MNIST format (28x28)
-        if image_data.shape != (28, 28):
-            image_data = image_data.reshape(28, 28)
-        
-        # Add batch and channel dimensions
-        image_data = image_data.reshape(1, 28, 28, 1)
+        batch = input_buffer(1)
+        prepare_image(image_data, out=batch[0])
+        probabilities = np.asarray(model.predict(batch, verbose=0))[0]
+        return int(probabilities.argmax()), probabilities.tolist()
 
-        # Get predictions
-        predictions = model.predict(image_data, verbose=0)
-        
-        # Ensure predictions is a numpy array
-        predictions = np.array(predictions)
-        predicted_label = int(np.argmax(predictions[0]))
-        
-        # Convert to Python list of floats
-        probabilities = [float(p) for p in predictions[0]]
-        
-        return predicted_label, probabilities
-        
     except Exception as e:
         logging.error(f"Error in predict function: {str(e)}")
         # Return a safe default in case of error
         return 0, [0.0] * 10
 
+def prepare_batch(images):
+    """Converts a batch of images to the normalized MNIST input layout.
+
+    Rows given in the 0-255 range are rescaled individually, the same check
+    ``predict`` applies to a single image, but vectorized over the batch.
+    uint8 batches are always treated as 0-255 pixels.
+
+    Args:
+        images (numpy.array): (N, 784) or (N, 28, 28) array of images.
+
+    Returns:
+        numpy.array: float32 array of shape (N, 28, 28, 1) with values in [0, 1]
+
+    Raises:
+        ValueError: If the batch is empty or not made of 28x28 images
+    """
+    is_uint8 = getattr(images, 'dtype', None) == np.uint8
+    images = np.array(images, dtype='float32')
+    if images.ndim not in (2, 3) or images.shape[1:] not in ((784,), (28, 28)) or len(images) == 0:
+        raise ValueError(f"Expected a non-empty (N, 784) or (N, 28, 28) batch, got shape {images.shape}")
+
+    images = images.reshape(len(images), 28, 28, 1)
+    if is_uint8:
+        images /= 255.0
+        return images
+    row_max = images.reshape(len(images), -1).max(axis=1)
+    images /= np.where(row_max > 1.0, 255.0, 1.0).astype('float32')[:, None, None, None]
+    return images
+
+def predict_batch(model, images):
+    """Predicts the labels of a batch of images in one forward pass.
+
+    Args:
+        model (tf.keras.Model): Trained neural network model
+        images (numpy.array): (N, 784) or (N, 28, 28) array of images.
+
+    Returns:
+        tuple: (numpy.array of N predicted labels, (N, 10) numpy.array of probabilities)
+    """
+    predictions = np.asarray(model.predict(prepare_batch(images), verbose=0))
+    return predictions.argmax(axis=1), predictions
+
+class MicroBatcher:
+    """Dynamic micro-batching scheduler in front of ``model.predict``.
+
+    Images submitted from concurrent request threads are queued and a single
+    scheduler thread coalesces them into one (N, 28, 28, 1) batch, bounded by
+    ``max_batch_size`` and ``max_wait_ms``. Each caller gets back its own row
+    of the batched predictions, so the per-call Keras overhead is paid once
+    per batch instead of once per request.
+    """
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=2.0):
+        """
+        Args:
+            model (tf.keras.Model): Trained neural network model
+            max_batch_size (int, optional): Largest batch to run in one forward pass. Defaults to 32.
+            max_wait_ms (float, optional): How long to wait for more requests once one is queued. Defaults to 2.0.
+        """
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._inputs = None
+
+    def _ensure_started(self):
+        """Start the scheduler thread in the current process if needed"""
+        # Threads do not survive fork, so a batcher created before gunicorn
+        # forks its workers gets a fresh queue and thread in each worker
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._queue,), name='micro-batcher', daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, image_data):
+        """Queues a single image for prediction.
+
+        Args:
+            image_data (numpy.array): 784-d or 28x28 array representation of image.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the image's probability vector
+        """
+        # The scheduler normalizes the image straight into its batch buffer;
+        # only the size is checked here so a bad image never fails a batch
+        image = np.asarray(image_data)
+        if image.size != 784:
+            raise ValueError(f"Expected a 784-pixel image, got shape {image.shape}")
+        future = Future()
+        self._ensure_started()
+        self._queue.put((image, future, time.perf_counter()))
+        return future
+
+    def predict(self, image_data, timeout=None):
+        """Predicts the label of an input image through the shared batch.
+
+        Args:
+            image_data (numpy.array): 784-d or 28x28 array representation of image.
+            timeout (float, optional): Seconds to wait for the result. Defaults to the
+                engine's ``timeout`` (the inference worker pool's), else no limit.
+
+        Returns:
+            tuple: (predicted label, probabilities for each digit)
+        """
+        future = self.submit(image_data)
+        timeout = timeout if timeout is not None else getattr(self.model, 'timeout', None)
+        if timeout is None:
+            probabilities = future.result()
+        else:
+            from .process_pool import wait_result
+            probabilities = wait_result(future, timeout)
+        return int(probabilities.argmax()), probabilities.tolist()
+
+    def queue_depth(self):
+        """Number of images queued in this process and not yet gathered into a batch"""
+        if self._pid != os.getpid() or self._queue is None:
+            return 0
+        return self._queue.qsize()
+
+    def close(self):
+        """Stops the scheduler thread after the queued requests are served"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+            self._pid = None
+
+    def _run(self, requests):
+        """Scheduler loop: gather a batch, run it, repeat"""
+        running = True
+        while running:
+            item = requests.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = requests.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        """Runs one forward pass and resolves every caller's future"""
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            BATCH_QUEUE_WAIT.observe(started - enqueued)
+        BATCH_SIZE.observe(len(batch))
+
+        try:
+            # Engines copy their input before predict or submit returns, so the
+            # scheduler reuses one input buffer for every batch
+            if self._inputs is None:
+                self._inputs = np.empty((self.max_batch_size, 28, 28, 1), dtype='float32')
+            images = self._inputs[:len(batch)]
+            for row, (image, _, _) in zip(images, batch):
+                prepare_image(image, out=row)
+            submit = getattr(self.model, 'submit', None)
+            if submit is not None:
+                # Engines that run the forward pass in other processes take
+                # this batch without blocking, so the next one can be gathered
+                submit(images).add_done_callback(lambda done: self._resolve(batch, done))
+                return
+            predictions = np.asarray(self.model.predict(images, verbose=0))
+        except Exception as e:
+            self._fail(batch, e)
+            return
+
+        for probabilities, (_, future, _) in zip(predictions, batch):
+            future.set_result(probabilities)
+
+    def _resolve(self, batch, done):
+        """Resolves every caller's future from a batch run by ``model.submit``"""
+        if done.exception() is not None:
+            self._fail(batch, done.exception())
+            return
+        for probabilities, (_, future, _) in zip(done.result(), batch):
+            future.set_result(probabilities)
+
+    def _fail(self, batch, error):
+        logging.error(f"Error in batched prediction of {len(batch)} images: {str(error)}")
+        for _, future, _ in batch:
+            future.set_exception(error)
+
+def create_batcher(model):
+    """Creates a micro-batcher for the model from environment settings.
+
+    ``BATCH_MAX_SIZE`` (default 32) bounds the batch size and
+    ``BATCH_MAX_WAIT_MS`` (default 2) bounds how long a request waits for
+    others to join it. A maximum batch size of 1 disables batching.
+
+    Args:
+        model (tf.keras.Model): Trained neural network model
+
+    Returns:
+        MicroBatcher: The batcher, or None if batching is disabled
+    """
+    max_batch_size = int(os.getenv('BATCH_MAX_SIZE', '32'))
+    if model is None or max_batch_size <= 1:
+        return None
+    return MicroBatcher(model, max_batch_size, float(os.getenv('BATCH_MAX_WAIT_MS', '2')))
+
 if __name__ == '__main__':
-    x_train, y_train, x_test, y_test = load_and_preprocess_data()
+    x_train, y_train, x_test, y_test = load_raw_data()
     model = create_and_train_model(x_train, y_train)
     print("Model trained and ready to predict.")
     
     # Evaluate the model
-    test_loss, test_accuracy = model.evaluate(x_test, y_test, verbose=0)
+    test_loss, test_accuracy = model.evaluate(make_dataset(x_test, y_test, training=False), verbose=0)
     print(f"Test accuracy: {test_accuracy:.4f}")
     
     # example prediction
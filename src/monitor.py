@@ -3,9 +3,13 @@ import webbrowser
 from pathlib import Path
 import time
 import logging
-from prometheus_client import Counter, Histogram, Info
+import threading
+import numpy as np
+from collections import deque
+from prometheus_client import Counter, Gauge, Histogram
 from functools import wraps
-from flask import request, g
+from contextlib import contextmanager
+from flask import request, g, has_request_context
 
 def start_tensorboard(logdir="logs/fit", port=6006):
     """
@@ -37,7 +41,9 @@ def start_tensorboard(logdir="logs/fit", port=6006):
     logging.info(f"TensorBoard is running at {url}")
     return tensorboard
 
-# Create metrics
+# Create metrics. Under gunicorn every process writes them to shared files
+# (see src/multiprocess_metrics.py); gauges name how the processes' values
+# combine, and live* modes drop a process's values when it exits.
 REQUEST_COUNT = Counter(
     'flask_request_count', 'App Request Count',
     ['method', 'endpoint', 'http_status']
@@ -55,7 +61,126 @@ PREDICTION_COUNT = Counter(
     ['predicted_digit']
 )
 
-MODEL_INFO = Info('digit_classifier_model', 'Information about the digit classifier model')
+# An Info metric cannot be merged across processes: the labels describe the
+# model and the value is 1 while some live process serves it
+MODEL_INFO = Gauge(
+    'digit_classifier_model_info',
+    'Information about the digit classifier model',
+    ['type', 'backend', 'version', 'layers', 'optimizer'],
+    multiprocess_mode='livemax'
+)
+
+MODEL_LOAD_SECONDS = Gauge(
+    'digit_classifier_model_load_seconds',
+    'Time taken to load the serving model',
+    ['backend', 'mode'],
+    multiprocess_mode='livemax'
+)
+
+STAGE_LATENCY = Histogram(
+    'digit_predict_stage_duration_seconds',
+    'Time spent in each stage of a prediction request',
+    ['endpoint', 'stage'],
+    buckets=(.00001, .000025, .00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1)
+)
+
+CACHE_HITS = Counter(
+    'digit_prediction_cache_hits',
+    'Predictions answered from the prediction cache',
+    ['backend']
+)
+
+CACHE_MISSES = Counter(
+    'digit_prediction_cache_misses',
+    'Predictions not found in the prediction cache',
+    ['backend']
+)
+
+CACHE_EVICTIONS = Counter(
+    'digit_prediction_cache_evictions',
+    'Entries dropped from the prediction cache',
+    ['backend', 'reason']
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped',
+    'Log records dropped because the logging queue was full'
+)
+
+INFERENCE_WORKER_RESTARTS = Counter(
+    'inference_worker_restarts',
+    'Inference worker processes restarted after exiting unexpectedly',
+    ['worker']
+)
+
+ASGI_PENDING = Gauge(
+    'asgi_pending_requests',
+    'Requests admitted by the ASGI server and not yet answered',
+    multiprocess_mode='livesum'
+)
+
+ASGI_REJECTED = Counter(
+    'asgi_rejected_requests',
+    'Requests turned away by the ASGI server because it was overloaded',
+    ['reason']
+)
+
+HEALTH_CHECK_OK = Gauge(
+    'digit_classifier_health_check_ok',
+    'Whether the last background inference check succeeded (the worst of the live processes)',
+    multiprocess_mode='livemin'
+)
+
+HEALTH_CHECK_SECONDS = Gauge(
+    'digit_classifier_health_check_seconds',
+    'Duration of the last background inference check (the slowest of the live processes)',
+    multiprocess_mode='livemax'
+)
+
+class RecentLatency:
+    """Latencies observed over the last few seconds, for readiness checks.
+
+    Args:
+        window_seconds (float, optional): How long an observation counts. Defaults to 60.
+        max_samples (int, optional): Most recent observations kept. Defaults to 512.
+    """
+
+    def __init__(self, window_seconds=60.0, max_samples=512):
+        self.window_seconds = window_seconds
+        self._samples = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds))
+
+    def percentile(self, q):
+        """The q-th percentile of the recent latencies in seconds, or None without any"""
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            recent = [seconds for observed, seconds in self._samples if observed >= cutoff]
+        if not recent:
+            return None
+        return float(np.percentile(recent, q))
+
+# Inference stage latency of this process's recent requests
+RECENT_INFERENCE_LATENCY = RecentLatency()
+
+# Children of labelled metrics, looked up once: labels() validates the
+# values and takes the metric's lock on every call
+_children = {}
+
+def labelled(metric, *values):
+    """The child of a labelled metric for the given label values, in label order.
+
+    Only for label values from a small fixed set (endpoints, stages, digits),
+    since every child is kept.
+    """
+    key = (metric, values)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*values)
+    return child
 
 def start_request():
     """Store request start time"""
@@ -68,31 +193,64 @@ def before_request(response):
         
     request_latency = time.time() - g.start_time
     if request.endpoint:
-        REQUEST_LATENCY.labels(
-            method=request.method,
-            endpoint=request.endpoint
-        ).observe(request_latency)
-
-        REQUEST_COUNT.labels(
-            method=request.method,
-            endpoint=request.endpoint,
-            http_status=response.status_code
-        ).inc()
+        labelled(REQUEST_LATENCY, request.method, request.endpoint).observe(request_latency)
+        labelled(REQUEST_COUNT, request.method, request.endpoint, response.status_code).inc()
     
     return response
 
+@contextmanager
+def time_stage(stage):
+    """Times a stage of the current request into STAGE_LATENCY.
+
+    Args:
+        stage (str): decode, validate, inference, postprocess or serialize
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint if has_request_context() else None
+        labelled(STAGE_LATENCY, endpoint or 'none', stage).observe(elapsed)
+        if stage == 'inference':
+            RECENT_INFERENCE_LATENCY.observe(elapsed)
+
 def record_prediction(digit):
     """Record a prediction in the metrics"""
-    PREDICTION_COUNT.labels(predicted_digit=str(digit)).inc()
+    labelled(PREDICTION_COUNT, int(digit)).inc()
+
+def record_predictions(digits):
+    """Record a batch of predictions in the metrics"""
+    for digit, count in enumerate(np.bincount(digits, minlength=10)):
+        if count:
+            labelled(PREDICTION_COUNT, digit).inc(int(count))
+
+# Label values of the model this process currently reports in MODEL_INFO
+_model_info_labels = None
 
-def set_model_info(model):
+def set_model_info(model, version=None):
     """Set information about the model in the metrics"""
-    config = model.get_config()
-    MODEL_INFO.info({
+    global _model_info_labels
+    # Inference engines keep the Keras model they wrap, if any, as keras_model
+    keras_model = getattr(model, 'keras_model', model)
+    info = {
         'type': 'CNN',
-        'layers': str(len(config['layers'])),
-        'optimizer': model.optimizer.__class__.__name__
-    })
+        'backend': getattr(model, 'backend', 'keras'),
+        'version': '' if version is None else str(version),
+        'layers': '',
+        'optimizer': '',
+    }
+    if hasattr(keras_model, 'get_config'):
+        info['layers'] = str(len(keras_model.get_config()['layers']))
+    if getattr(keras_model, 'optimizer', None) is not None:
+        info['optimizer'] = keras_model.optimizer.__class__.__name__
+    labels = tuple(info.values())
+    if _model_info_labels is not None and _model_info_labels != labels:
+        # Shared metric files cannot drop a series, so a replaced model is reported as 0
+        MODEL_INFO.labels(*_model_info_labels).set(0)
+        MODEL_INFO.remove(*_model_info_labels)
+    MODEL_INFO.labels(*labels).set(1)
+    _model_info_labels = labels
 
 if __name__ == "__main__":
     logging.basicConfig(
@@ -0,0 +1,171 @@
+"""
+Prometheus metrics aggregated across gunicorn workers.
+
+By default prometheus_client keeps metric values in the memory of the
+process that updates them, so each /metrics scrape only saw the worker that
+happened to answer it. With ``PROMETHEUS_MULTIPROC_DIR`` set before
+prometheus_client is imported, each process writes its values to its own
+memory-mapped files in that directory instead, and /metrics merges the files
+of all processes. docker/gunicorn.conf.py sets it to a directory in
+``/dev/shm``, so the files live in shared memory.
+
+Updates stay process-local. Each value is a struct write into the process's
+own mapping, so workers never lock each other. The only lock is the client's
+in-process one, which the worker's own threads share.
+
+When a process exits, merge_dead_processes folds its counters, histograms and
+summaries into ``<type>_archive.db`` files so totals never go backwards. It
+also deletes the process's gauges, which all use ``live*`` modes. The
+directory, and so the cost of a scrape, stays bounded by the number of live
+processes. Merges and scrapes exclude each other through a file lock, so a
+scrape never counts a value twice or misses it.
+"""
+import os
+import glob
+import fcntl
+import logging
+from contextlib import contextmanager
+from prometheus_client import REGISTRY, CollectorRegistry
+from prometheus_client.metrics_core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.mmap_dict import MmapedDict
+from prometheus_client.multiprocess import MultiProcessCollector
+
+LOCK_FILE = '.lock'
+ARCHIVE = 'archive'
+
+# File types whose values add up across processes
+ACCUMULATING_TYPES = ('counter', 'histogram', 'summary')
+
+def multiprocess_dir():
+    """The shared metrics directory, or None when metrics are per process"""
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR') or None
+
+def reset_directory(path):
+    """Creates the metrics directory and removes the files of a previous run.
+
+    Must run before any process of this run writes a metric, i.e. before the
+    app is imported.
+
+    Args:
+        path (str or Path): The directory
+    """
+    os.makedirs(path, exist_ok=True)
+    for f in glob.glob(os.path.join(path, '*.db')):
+        os.remove(f)
+
+@contextmanager
+def _locked(path, exclusive):
+    """Holds the directory's lock file, shared by scrapes and exclusive for merges"""
+    with open(os.path.join(path, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _process_files(path):
+    """Maps each pid with metric files to its [(type, file)]; archives are skipped"""
+    processes = {}
+    for f in glob.glob(os.path.join(path, '*.db')):
+        parts = os.path.basename(f)[:-3].split('_')
+        pid = parts[-1]
+        if pid == ARCHIVE or not pid.isdigit():
+            continue
+        processes.setdefault(int(pid), []).append((parts[0], f))
+    return processes
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def merge_dead_processes(pids=None, path=None):
+    """Folds the metric files of exited processes into the archive files.
+
+    Args:
+        pids (list, optional): Processes known to have exited. Defaults to
+            every process with metric files that is no longer running.
+        path (str, optional): Defaults to PROMETHEUS_MULTIPROC_DIR.
+
+    Returns:
+        int: Number of processes whose files were merged
+    """
+    path = path or multiprocess_dir()
+    if path is None:
+        return 0
+    merged = 0
+    with _locked(path, exclusive=True):
+        for pid, files in _process_files(path).items():
+            if (pid not in pids) if pids is not None else _alive(pid):
+                continue
+            for typ, f in files:
+                if typ in ACCUMULATING_TYPES:
+                    archive = MmapedDict(os.path.join(path, f'{typ}_{ARCHIVE}.db'))
+                    try:
+                        for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(f):
+                            total, _ = archive.read_value(key)
+                            archive.write_value(key, total + value, timestamp)
+                    finally:
+                        archive.close()
+                os.remove(f)
+            merged += 1
+    if merged:
+        logging.info(f"Merged the metrics of {merged} exited processes")
+    return merged
+
+class SharedMetricsCollector(MultiProcessCollector):
+    """MultiProcessCollector that reads the files while no merge is running"""
+
+    def collect(self):
+        with _locked(self._path, exclusive=False):
+            files = glob.glob(os.path.join(self._path, '*.db'))
+            return list(self.merge(files, accumulate=True))
+
+class WorkerProcessCollector:
+    """Memory and CPU time of every live process with metric files, labelled by pid.
+
+    Stands in for prometheus_client's process collector, which only
+    describes the process answering the scrape.
+
+    Args:
+        path (str): The shared metrics directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._page_size = os.sysconf('SC_PAGE_SIZE')
+        self._ticks = os.sysconf('SC_CLK_TCK')
+
+    def collect(self):
+        memory = GaugeMetricFamily('process_resident_memory_bytes', 'Resident memory size in bytes', labels=['pid'])
+        cpu = CounterMetricFamily('process_cpu_seconds_total', 'Total user and system CPU time spent in seconds',
+                                  labels=['pid'])
+        for pid in sorted(_process_files(self.path)):
+            try:
+                with open(f'/proc/{pid}/stat', 'rb') as f:
+                    # Fields after the parenthesized command name, which may contain spaces
+                    fields = f.read().rsplit(b')', 1)[1].split()
+            except OSError:
+                continue
+            memory.add_metric([str(pid)], int(fields[21]) * self._page_size)
+            cpu.add_metric([str(pid)], (int(fields[11]) + int(fields[12])) / self._ticks)
+        return [memory, cpu]
+
+def metrics_registry():
+    """The registry /metrics exposes.
+
+    Returns:
+        CollectorRegistry: Merged metrics of all processes when
+        PROMETHEUS_MULTIPROC_DIR is set, else this process's default registry
+    """
+    path = multiprocess_dir()
+    if path is None:
+        return REGISTRY
+    registry = CollectorRegistry()
+    SharedMetricsCollector(registry, path)
+    registry.register(WorkerProcessCollector(path))
+    return registry
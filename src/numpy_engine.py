@@ -0,0 +1,290 @@
+"""
+Pure-NumPy inference engine for the digit classifier CNN.
+
+``export_numpy_model`` flattens a trained ``tf.keras.Sequential`` into a list
+of ops plus their weight arrays in a single ``.npz`` file, folding every
+BatchNormalization into an adjacent Conv2D/Dense layer:
+
+- into the preceding layer when that layer has no activation
+  (``conv(x) * s + t`` is a conv with scaled kernel and bias), otherwise
+- into the following Conv2D/Dense layer (``conv(x * s + t)`` is a conv with
+  kernel scaled per input channel and a shifted bias), carried across
+  Dropout, Flatten and, when every scale is non-negative, MaxPooling2D.
+
+Where neither is exact the scale and shift are kept as a standalone
+per-channel affine op. ``NumpyModel`` runs the ops with im2col and batched
+matmul and never imports TensorFlow.
+"""
+import json
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+FORMAT_VERSION = 1
+
+def _conv_output_size(size, kernel, stride, padding):
+    if padding == 'same':
+        return -(-size // stride)
+    return (size - kernel) // stride + 1
+
+def _batchnorm_affine(layer):
+    """Per-channel (scale, shift) equivalent of an inference-mode BatchNormalization"""
+    config = layer.get_config()
+    weights = list(layer.get_weights())
+    gamma = weights.pop(0) if config.get('scale', True) else None
+    beta = weights.pop(0) if config.get('center', True) else None
+    mean, variance = weights
+    scale = 1.0 / np.sqrt(variance + config['epsilon'])
+    if gamma is not None:
+        scale = scale * gamma
+    shift = -mean * scale
+    if beta is not None:
+        shift = shift + beta
+    return scale.astype('float64'), shift.astype('float64')
+
+def fold_model(model):
+    """Flattens a trained Sequential model into NumpyModel ops and weights.
+
+    Args:
+        model (tf.keras.Sequential): Trained model made of Conv2D, BatchNormalization,
+            MaxPooling2D, Dropout, Flatten and Dense layers
+
+    Returns:
+        tuple: (spec dict, dict of float32 weight arrays referenced by the spec)
+
+    Raises:
+        ValueError: If the model uses a layer or option the engine does not support
+    """
+    ops = []
+    arrays = {}
+    # Shape of one example as it flows through the network, without the batch dimension
+    shape = tuple(model.input_shape[1:])
+    # Affine transform (scale, shift) waiting to be folded into the next linear layer
+    pending = None
+
+    def add_array(value):
+        name = f"a{len(arrays)}"
+        arrays[name] = np.asarray(value, dtype='float32')
+        return name
+
+    def flush_pending():
+        nonlocal pending
+        if pending is not None:
+            scale, shift = pending
+            ops.append({'op': 'affine', 'scale': add_array(scale), 'shift': add_array(shift)})
+            pending = None
+
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        config = layer.get_config()
+
+        if kind in ('Conv2D', 'Dense'):
+            kernel = layer.get_weights()[0].astype('float64')
+            bias = layer.get_weights()[1].astype('float64') if config.get('use_bias', True) else np.zeros(kernel.shape[-1])
+            padding = config.get('padding', 'valid')
+
+            if pending is not None and (kind == 'Dense' or padding == 'valid'):
+                # kernel @ (x * s + t) + b == (kernel * s) @ x + (b + kernel @ t)
+                scale, shift = pending
+                if kind == 'Conv2D':
+                    bias = bias + (kernel * shift[None, None, :, None]).sum(axis=(0, 1, 2))
+                    kernel = kernel * scale[None, None, :, None]
+                else:
+                    bias = bias + shift @ kernel
+                    kernel = kernel * scale[:, None]
+                pending = None
+            flush_pending()
+
+            op = {
+                'op': kind.lower(),
+                'kernel': add_array(kernel),
+                'bias': add_array(bias),
+                'activation': config.get('activation', 'linear'),
+            }
+            if kind == 'Conv2D':
+                op['strides'] = list(config['strides'])
+                op['padding'] = padding
+                shape = (
+                    _conv_output_size(shape[0], kernel.shape[0], op['strides'][0], padding),
+                    _conv_output_size(shape[1], kernel.shape[1], op['strides'][1], padding),
+                    kernel.shape[-1],
+                )
+            else:
+                shape = (kernel.shape[-1],)
+            if op['activation'] not in ('linear', 'relu', 'softmax'):
+                raise ValueError(f"Unsupported activation {op['activation']!r} in layer {layer.name}")
+            ops.append(op)
+
+        elif kind == 'BatchNormalization':
+            scale, shift = _batchnorm_affine(layer)
+            previous = ops[-1] if ops else None
+            if pending is None and previous is not None and previous['op'] in ('conv2d', 'dense') \
+                    and previous['activation'] == 'linear':
+                # (kernel @ x + b) * s + t == (kernel * s) @ x + (b * s + t)
+                kernel = arrays[previous['kernel']].astype('float64')
+                bias = arrays[previous['bias']].astype('float64')
+                arrays[previous['kernel']] = (kernel * scale).astype('float32')
+                arrays[previous['bias']] = (bias * scale + shift).astype('float32')
+            elif pending is None:
+                pending = (scale, shift)
+            else:
+                pending = (pending[0] * scale, pending[1] * scale + shift)
+
+        elif kind == 'MaxPooling2D':
+            if pending is not None and (pending[0] < 0).any():
+                # max(x * s + t) == max(x) * s + t only holds for s >= 0
+                flush_pending()
+            pool = list(config['pool_size'])
+            strides = list(config['strides'] or pool)
+            padding = config.get('padding', 'valid')
+            if padding != 'valid':
+                raise ValueError(f"Unsupported pooling padding {padding!r} in layer {layer.name}")
+            ops.append({'op': 'maxpool2d', 'pool_size': pool, 'strides': strides})
+            shape = (
+                _conv_output_size(shape[0], pool[0], strides[0], 'valid'),
+                _conv_output_size(shape[1], pool[1], strides[1], 'valid'),
+                shape[2],
+            )
+
+        elif kind == 'Flatten':
+            if pending is not None:
+                # Channels-last flatten: feature index is (h * W + w) * C + c
+                spatial = int(np.prod(shape[:-1]))
+                pending = (np.tile(pending[0], spatial), np.tile(pending[1], spatial))
+            ops.append({'op': 'flatten'})
+            shape = (int(np.prod(shape)),)
+
+        elif kind == 'Dropout':
+            continue
+
+        else:
+            raise ValueError(f"Unsupported layer type {kind} ({layer.name})")
+
+    flush_pending()
+
+    spec = {'version': FORMAT_VERSION, 'input_shape': list(model.input_shape[1:]), 'ops': ops}
+    return spec, arrays
+
+def export_numpy_model(model, path):
+    """Exports a trained Sequential model to a flat .npz for NumpyModel.
+
+    Args:
+        model (tf.keras.Sequential): Trained model (see fold_model)
+        path (Path): Destination .npz file
+
+    Returns:
+        Path: The path written
+    """
+    spec, arrays = fold_model(model)
+    with open(path, 'wb') as f:
+        np.savez(f, spec=np.array(json.dumps(spec)), **arrays)
+    return path
+
+def conv2d(x, kernel, bias, strides=(1, 1), padding='valid'):
+    """2-D convolution of an NHWC batch via im2col and a single matmul"""
+    kh, kw, channels, filters = kernel.shape
+    sh, sw = strides
+    if padding == 'same':
+        out_h, out_w = -(-x.shape[1] // sh), -(-x.shape[2] // sw)
+        pad_h = max((out_h - 1) * sh + kh - x.shape[1], 0)
+        pad_w = max((out_w - 1) * sw + kw - x.shape[2], 0)
+        x = np.pad(x, ((0, 0), (pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)))
+
+    # (N, H', W', C, kh, kw) view of every receptive field, no copy yet
+    windows = sliding_window_view(x, (kh, kw), axis=(1, 2))[:, ::sh, ::sw]
+    n, out_h, out_w = windows.shape[:3]
+    # Match the kernel's (kh, kw, C) flattening order; this reshape is the im2col copy
+    columns = windows.transpose(0, 1, 2, 4, 5, 3).reshape(n * out_h * out_w, kh * kw * channels)
+    out = columns @ kernel.reshape(kh * kw * channels, filters)
+    out += bias
+    return out.reshape(n, out_h, out_w, filters)
+
+def maxpool2d(x, pool_size=(2, 2), strides=(2, 2)):
+    """Max pooling of an NHWC batch with 'valid' padding"""
+    ph, pw = pool_size
+    sh, sw = strides
+    n, h, w, c = x.shape
+    if (ph, pw) == (sh, sw):
+        out_h, out_w = h // ph, w // pw
+        return x[:, :out_h * ph, :out_w * pw].reshape(n, out_h, ph, out_w, pw, c).max(axis=(2, 4))
+    return sliding_window_view(x, (ph, pw), axis=(1, 2))[:, ::sh, ::sw].max(axis=(4, 5))
+
+def relu(x):
+    return np.maximum(x, 0, out=x)
+
+def softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=-1, keepdims=True)
+    return x
+
+ACTIVATIONS = {'linear': lambda x: x, 'relu': relu, 'softmax': softmax}
+
+class NumpyModel:
+    """Runs an exported model with NumPy only.
+
+    Exposes the same ``predict(images, verbose=0)`` call as ``tf.keras.Model``.
+    """
+
+    backend = 'numpy'
+
+    def __init__(self, spec, arrays):
+        """
+        Weight arrays that are already contiguous float32 (e.g. memory-mapped
+        from a weight store) are used in place, without copying.
+
+        Args:
+            spec (dict): Op list from fold_model
+            arrays (dict): Weight arrays referenced by the ops
+        """
+        if spec.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported NumPy model format version {spec.get('version')}")
+        self.input_shape = tuple(spec['input_shape'])
+        self.ops = []
+        for op in spec['ops']:
+            op = dict(op)
+            for key in ('kernel', 'bias', 'scale', 'shift'):
+                if key in op:
+                    op[key] = np.ascontiguousarray(arrays[op[key]], dtype='float32')
+            self.ops.append(op)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a model written by export_numpy_model.
+
+        Args:
+            path (Path): .npz file
+
+        Returns:
+            NumpyModel: The loaded model
+        """
+        with np.load(path, allow_pickle=False) as data:
+            spec = json.loads(str(data['spec']))
+            arrays = {name: data[name] for name in data.files if name != 'spec'}
+        return cls(spec, arrays)
+
+    def predict(self, images, verbose=0):
+        """Predicts class probabilities for a batch of images.
+
+        Args:
+            images (numpy.array): float32 array of shape (N, 28, 28, 1)
+            verbose (int, optional): Ignored; kept for tf.keras.Model compatibility.
+
+        Returns:
+            numpy.array: (N, 10) class probabilities
+        """
+        x = np.asarray(images, dtype='float32').reshape((-1,) + self.input_shape)
+        for op in self.ops:
+            kind = op['op']
+            if kind == 'conv2d':
+                x = ACTIVATIONS[op['activation']](conv2d(x, op['kernel'], op['bias'], op['strides'], op['padding']))
+            elif kind == 'dense':
+                x = x @ op['kernel']
+                x += op['bias']
+                x = ACTIVATIONS[op['activation']](x)
+            elif kind == 'maxpool2d':
+                x = maxpool2d(x, op['pool_size'], op['strides'])
+            elif kind == 'flatten':
+                x = x.reshape(len(x), -1)
+            elif kind == 'affine':
+                x = x * op['scale'] + op['shift']
+        return x
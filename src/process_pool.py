@@ -0,0 +1,503 @@
+"""
+Inference in a pool of worker processes, each owning a model replica.
+
+With ``INFERENCE_WORKERS=N`` the web process no longer runs the forward pass.
+Each worker gets its own shared-memory region, split into a ring of slots
+that each hold one batch of input images and its output probabilities. Only
+a ``(slot, count)`` pair crosses the process boundary; images and
+probabilities are never pickled. The worker runs its replica on the slot in
+place and writes the probabilities back into the same slot.
+
+Workers are started with ``spawn`` because TensorFlow does not survive fork.
+``INFERENCE_WORKER_CPUS`` can pin each worker to its own share of the CPUs.
+A worker that dies fails only its in-flight batches and is started again.
+Callers wait at most ``INFERENCE_WORKER_TIMEOUT`` seconds for a free slot
+and for their result, then get an InferenceTimeout, so a pool whose workers
+are all down or hung fails requests instead of blocking their threads.
+"""
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+import numpy as np
+from .monitor import INFERENCE_WORKER_RESTARTS
+from .multiprocess_metrics import merge_dead_processes
+
+IMAGE_SHAPE = (28, 28, 1)
+NUM_CLASSES = 10
+
+# Seconds before the first restart attempt of a dead worker; doubles on each failure
+RESTART_BACKOFF = 0.5
+MAX_RESTART_BACKOFF = 30.0
+
+# Seconds a caller waits for a free slot, and then for its result
+DEFAULT_TIMEOUT = 30.0
+
+class InferenceTimeout(RuntimeError):
+    """No inference worker answered in time; the app answers 503"""
+
+def inference_workers_from_env():
+    """Number of inference worker processes (``INFERENCE_WORKERS``); 0 runs inference in-process"""
+    return int(os.getenv('INFERENCE_WORKERS', '0'))
+
+def inference_timeout_from_env():
+    """Seconds to wait for the inference workers (``INFERENCE_WORKER_TIMEOUT``)"""
+    return float(os.getenv('INFERENCE_WORKER_TIMEOUT', str(DEFAULT_TIMEOUT)))
+
+def parse_cpu_list(spec):
+    """Parses a CPU list such as '0-3,6' into [0, 1, 2, 3, 6]"""
+    cpus = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def web_worker_from_env():
+    """(index, count) of this web worker among ``WEB_WORKERS``, set by docker/gunicorn.conf.py.
+
+    Outside that config the index is None and the count is ``GUNICORN_WORKERS``
+    (default 1).
+    """
+    index = os.getenv('WEB_WORKER_INDEX')
+    count = os.getenv('WEB_WORKERS') or os.getenv('GUNICORN_WORKERS') or '1'
+    return (int(index) if index else None), int(count)
+
+def assign_cpus(workers, spec=None, web_worker=None):
+    """Splits a set of CPUs into one disjoint group per worker.
+
+    With several web workers, each starting its own pool, the CPUs are first
+    split between the web workers, so their pools do not pin to the same CPUs.
+
+    Args:
+        workers (int): Number of workers
+        spec (str, optional): 'auto' for every CPU this process may run on, a
+            CPU list such as '0-7', or None/'' to leave workers unpinned
+        web_worker (tuple, optional): (index, count) of the web worker starting
+            the pool; an unknown (None) index with several web workers leaves
+            the workers unpinned. Defaults to a single web worker.
+
+    Returns:
+        list: One list of CPUs per worker, or None per worker when unpinned
+    """
+    if not spec:
+        return [None] * workers
+    cpus = sorted(os.sched_getaffinity(0)) if spec == 'auto' else parse_cpu_list(spec)
+    index, web_workers = web_worker or (0, 1)
+    if web_workers > 1:
+        if index is None:
+            logging.warning(f"Web worker index unknown with {web_workers} web workers; leaving inference workers unpinned")
+            return [None] * workers
+        cpus = _split(cpus, web_workers)[index % web_workers]
+    return _split(cpus, workers)
+
+def _split(cpus, groups):
+    """Splits CPUs into disjoint groups, sharing them round-robin when there are fewer CPUs than groups"""
+    if len(cpus) < groups:
+        return [[cpus[i % len(cpus)]] for i in range(groups)]
+    return [[int(cpu) for cpu in group] for group in np.array_split(cpus, groups)]
+
+def _slot_arrays(buffer, slots, slot_images):
+    """Views of a worker's shared memory as (inputs, outputs) slot arrays"""
+    inputs = np.ndarray((slots, slot_images) + IMAGE_SHAPE, dtype='float32', buffer=buffer)
+    outputs = np.ndarray((slots, slot_images, NUM_CLASSES), dtype='float32', buffer=buffer, offset=inputs.nbytes)
+    return inputs, outputs
+
+def load_replica(backend, cpus=None, source=None):
+    """Loads the backend's exported model, or a registry version, sized for its CPUs.
+
+    Args:
+        backend (str): Engine to load (see src.inference)
+        cpus (list, optional): CPUs the calling process is pinned to. Defaults to None.
+        source (tuple, optional): (registry root, version) to load instead of the exported model
+
+    Returns:
+        object: The inference engine
+    """
+    from .inference import create_engine, load_engine
+    from .model import load_trained_model
+
+    if cpus:
+        # Use exactly the CPUs this worker is pinned to
+        os.environ.setdefault('TFLITE_NUM_THREADS', str(len(cpus)))
+        if backend in ('keras', 'compiled'):
+            from .training import configure_threads
+            configure_threads(len(cpus), 1)
+
+    if source is not None:
+        from .registry import ModelRegistry
+        registry_root, version = source
+        return ModelRegistry(registry_root).load_engine(version, backend)
+
+    model = load_engine(backend)
+    if model is None:
+        keras_model = load_trained_model()
+        if keras_model is None:
+            raise RuntimeError("No trained model to serve; export one before starting inference workers")
+        model = create_engine(keras_model, backend)
+    return model
+
+def _worker_main(index, shm_name, slots, slot_images, conn, backend, cpus, source=None):
+    """Entry point of an inference worker process"""
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    try:
+        model = load_replica(backend, cpus, source)
+    except Exception as e:
+        conn.send(('error', str(e)))
+        return
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    inputs, outputs = _slot_arrays(shm.buf, slots, slot_images)
+    conn.send(('ready', os.getpid()))
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            slot, count = message
+            try:
+                outputs[slot, :count] = model.predict(inputs[slot, :count], verbose=0)
+                conn.send((slot, None))
+            except Exception as e:
+                conn.send((slot, str(e)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        # The views must go before the mapping can be closed
+        del inputs, outputs
+        shm.close()
+
+class _Worker:
+    """Parent-side state of one worker process and its slot ring"""
+
+    def __init__(self, index, slots, slot_images, cpus):
+        self.index = index
+        self.cpus = cpus
+        size = slots * slot_images * (int(np.prod(IMAGE_SHAPE)) + NUM_CLASSES) * 4
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.inputs, self.outputs = _slot_arrays(self.shm.buf, slots, slot_images)
+        self.process = None
+        self.conn = None
+        # Guards ready, pending, parked and sends on conn
+        self.lock = threading.Lock()
+        self.ready = False
+        # slot -> (future, image count) of batches the worker is running
+        self.pending = {}
+        # Free slots held back while the worker is down
+        self.parked = []
+
+class ProcessPoolEngine:
+    """Inference engine that runs the forward pass in worker processes.
+
+    Has the same ``predict(images, verbose=0)`` interface as the in-process
+    engines, plus a non-blocking ``submit``.
+
+    Args:
+        backend (str): Engine each worker loads (see src.inference)
+        workers (int): Number of worker processes
+        slots (int, optional): Batches each worker can have queued or running. Defaults to 2.
+        slot_images (int, optional): Images per slot; larger batches are split. Defaults to 64.
+        cpus (str, optional): CPU pinning, see assign_cpus. Defaults to None.
+        web_worker (tuple, optional): (index, count) of the web worker starting the pool, see assign_cpus
+        start_timeout (float, optional): Seconds a worker may take to load its model. Defaults to 300.
+        source (tuple, optional): (registry root, version) to load instead of the exported model
+        timeout (float, optional): Seconds to wait for a free slot and for a result. Defaults to 30.
+    """
+
+    def __init__(self, backend, workers, slots=2, slot_images=64, cpus=None, start_timeout=300.0, source=None,
+                 timeout=DEFAULT_TIMEOUT, web_worker=None):
+        self.backend = backend
+        self.timeout = timeout
+        self.keras_model = None
+        self.source = source
+        if source is not None:
+            self.version = source[1]
+        self.slots = slots
+        self.slot_images = slot_images
+        self.start_timeout = start_timeout
+        self._context = multiprocessing.get_context('spawn')
+        self._free = queue.Queue()
+        self._closing = False
+        self._workers = [
+            _Worker(index, slots, slot_images, worker_cpus)
+            for index, worker_cpus in enumerate(assign_cpus(workers, cpus, web_worker))
+        ]
+        try:
+            for worker in self._workers:
+                self._start(worker)
+            for worker in self._workers:
+                self._wait_ready(worker)
+        except Exception:
+            self.close()
+            raise
+
+        for worker in self._workers:
+            worker.ready = True
+            threading.Thread(
+                target=self._supervise, args=(worker,), name=f'inference-worker-{worker.index}', daemon=True
+            ).start()
+        # Interleave the slots so consecutive batches go to different workers
+        for slot in range(slots):
+            for worker in self._workers:
+                self._free.put((worker.index, slot))
+        logging.info(f"Started {workers} {backend} inference workers with {slots} slots of {slot_images} images each")
+
+    @property
+    def workers(self):
+        return len(self._workers)
+
+    def workers_down(self):
+        """Number of workers that are dead or restarting"""
+        return sum(not worker.ready for worker in self._workers)
+
+    def _start(self, worker):
+        parent_conn, child_conn = self._context.Pipe()
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(worker.index, worker.shm.name, self.slots, self.slot_images, child_conn, self.backend, worker.cpus,
+                  self.source),
+            name=f'inference-worker-{worker.index}',
+            daemon=True
+        )
+        worker.process.start()
+        child_conn.close()
+        worker.conn = parent_conn
+
+    def _wait_ready(self, worker):
+        """Waits for a started worker to load its model"""
+        if not worker.conn.poll(self.start_timeout):
+            raise RuntimeError(f"Inference worker {worker.index} did not load its model within {self.start_timeout}s")
+        try:
+            status, detail = worker.conn.recv()
+        except EOFError:
+            worker.process.join()
+            raise RuntimeError(f"Inference worker {worker.index} exited with code {worker.process.exitcode} while starting")
+        if status != 'ready':
+            raise RuntimeError(f"Inference worker {worker.index} failed to load its model: {detail}")
+
+    def _release(self, worker, slot):
+        """Returns a slot to the free ring, or parks it while its worker is down"""
+        with worker.lock:
+            if not worker.ready:
+                worker.parked.append(slot)
+                return
+        self._free.put((worker.index, slot))
+
+    def _supervise(self, worker):
+        """Collects a worker's results; restarts the worker when it dies"""
+        while not self._closing:
+            try:
+                slot, error = worker.conn.recv()
+            except (EOFError, OSError):
+                if self._closing:
+                    return
+                self._restart(worker)
+                continue
+
+            with worker.lock:
+                future, count = worker.pending.pop(slot)
+            if error is None:
+                probabilities = worker.outputs[slot, :count].copy()
+            self._release(worker, slot)
+            if error is None:
+                future.set_result(probabilities)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def _restart(self, worker):
+        with worker.lock:
+            worker.ready = False
+            pending, worker.pending = worker.pending, {}
+        worker.process.join(timeout=5)
+        logging.error(
+            f"Inference worker {worker.index} (pid {worker.process.pid}) exited with code "
+            f"{worker.process.exitcode}; failing {len(pending)} batches and restarting it"
+        )
+        INFERENCE_WORKER_RESTARTS.labels(worker=str(worker.index)).inc()
+        merge_dead_processes([worker.process.pid])
+        error = RuntimeError(f"Inference worker {worker.index} exited")
+        for slot, (future, _) in pending.items():
+            self._release(worker, slot)
+            future.set_exception(error)
+
+        backoff = RESTART_BACKOFF
+        while not self._closing:
+            worker.conn.close()
+            try:
+                self._start(worker)
+                self._wait_ready(worker)
+                break
+            except Exception as e:
+                logging.error(f"Restarting inference worker {worker.index} failed: {str(e)}")
+                if worker.process.is_alive():
+                    worker.process.kill()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RESTART_BACKOFF)
+
+        with worker.lock:
+            worker.ready = True
+            parked, worker.parked = worker.parked, []
+        for slot in parked:
+            self._free.put((worker.index, slot))
+
+    def _submit_slot(self, images, deadline):
+        """Dispatches at most slot_images images to the next free slot"""
+        while True:
+            try:
+                index, slot = self._free.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise InferenceTimeout(
+                    f"No inference worker slot became free within {self.timeout:g}s "
+                    f"({self.workers_down()} of {self.workers} workers down)"
+                ) from None
+            worker = self._workers[index]
+            # The slot is ours until its result is collected
+            worker.inputs[slot, :len(images)] = images
+            with worker.lock:
+                if not worker.ready:
+                    worker.parked.append(slot)
+                    continue
+                future = Future()
+                worker.pending[slot] = (future, len(images))
+                try:
+                    worker.conn.send((slot, len(images)))
+                except OSError:
+                    # The supervisor sees the dead worker and fails this batch
+                    pass
+                return future
+
+    def submit(self, images):
+        """Queues a batch on the workers without waiting for it.
+
+        Blocks only while every slot is busy.
+
+        Args:
+            images (numpy.array): float32 array of shape (N, 28, 28, 1)
+
+        Returns:
+            concurrent.futures.Future: Resolves to the (N, 10) class probabilities
+
+        Raises:
+            InferenceTimeout: If no slot became free within the timeout
+        """
+        images = np.asarray(images, dtype='float32')
+        deadline = time.monotonic() + self.timeout
+        chunks = [
+            self._submit_slot(images[start:start + self.slot_images], deadline)
+            for start in range(0, len(images), self.slot_images)
+        ]
+        if len(chunks) == 1:
+            return chunks[0]
+
+        combined = Future()
+        if not chunks:
+            combined.set_result(np.zeros((0, NUM_CLASSES), dtype='float32'))
+            return combined
+        remaining = [len(chunks)]
+        lock = threading.Lock()
+
+        def chunk_done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            errors = [chunk.exception() for chunk in chunks if chunk.exception() is not None]
+            if errors:
+                combined.set_exception(errors[0])
+            else:
+                combined.set_result(np.concatenate([chunk.result() for chunk in chunks]))
+
+        for chunk in chunks:
+            chunk.add_done_callback(chunk_done)
+        return combined
+
+    def predict(self, images, verbose=0):
+        """Predicts class probabilities for a batch of preprocessed images.
+
+        Args:
+            images (numpy.array): float32 array of shape (N, 28, 28, 1)
+            verbose (int, optional): Ignored; kept for tf.keras.Model compatibility.
+
+        Returns:
+            numpy.array: (N, 10) class probabilities
+
+        Raises:
+            InferenceTimeout: If the workers did not answer within the timeout
+        """
+        return wait_result(self.submit(images), self.timeout)
+
+    def close(self):
+        """Stops the workers and frees their shared memory"""
+        if self._closing:
+            return
+        self._closing = True
+        for worker in self._workers:
+            if worker.conn is not None:
+                with worker.lock:
+                    try:
+                        worker.conn.send(None)
+                    except OSError:
+                        pass
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.kill()
+                    worker.process.join()
+            if worker.conn is not None:
+                worker.conn.close()
+            worker.inputs = worker.outputs = None
+            worker.shm.close()
+            worker.shm.unlink()
+        merge_dead_processes([worker.process.pid for worker in self._workers if worker.process is not None])
+
+def wait_result(future, timeout):
+    """future.result(timeout), raising InferenceTimeout when it expires"""
+    try:
+        return future.result(timeout)
+    except FutureTimeout:
+        raise InferenceTimeout(f"Inference workers did not answer within {timeout:g}s") from None
+
+def create_worker_pool(backend=None, source=None):
+    """Starts the inference worker pool configured by the environment.
+
+    ``INFERENCE_WORKERS`` sets the number of processes, ``INFERENCE_WORKER_CPUS``
+    their CPU pinning ('auto' or a list such as '0-7', shared out between the
+    web workers; unset leaves them unpinned), ``INFERENCE_WORKER_SLOTS`` (default 2) the batches each worker
+    can have in flight, ``INFERENCE_WORKER_SLOT_IMAGES`` (default 64) the
+    images per batch and ``INFERENCE_WORKER_TIMEOUT`` (default 30) how long
+    callers wait for them.
+
+    Args:
+        backend (str, optional): Defaults to the ``INFERENCE_BACKEND`` environment variable.
+        source (tuple, optional): (registry root, version) the workers load instead of the exported model
+
+    Returns:
+        ProcessPoolEngine: The running pool, or None if INFERENCE_WORKERS is 0
+    """
+    workers = inference_workers_from_env()
+    if workers <= 0:
+        return None
+    pool = ProcessPoolEngine(
+        (backend or os.getenv('INFERENCE_BACKEND', 'compiled')).lower(),
+        workers,
+        slots=int(os.getenv('INFERENCE_WORKER_SLOTS', '2')),
+        slot_images=int(os.getenv('INFERENCE_WORKER_SLOT_IMAGES', '64')),
+        cpus=os.getenv('INFERENCE_WORKER_CPUS') or None,
+        source=source,
+        timeout=inference_timeout_from_env(),
+        web_worker=web_worker_from_env()
+    )
+    atexit.register(pool.close)
+    return pool
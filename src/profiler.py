@@ -0,0 +1,148 @@
+"""
+Opt-in sampling profiler for live requests.
+
+A background thread snapshots the Python stack of every thread currently
+handling a request at a fixed interval and counts identical stacks. The
+result is in the "folded" format (``frame;frame;frame count`` per line)
+read by flamegraph.pl, speedscope and inferno. Time spent in native code
+(TensorFlow kernels, NumPy) is attributed to the Python frame that called
+it.
+
+Only the worker process that runs the sampler is profiled. Two ways to use it:
+
+- ``POST /admin/profile?seconds=10`` returns the folded stacks of the live
+  requests seen during the window (enabled when ``ADMIN_TOKEN`` is set).
+- ``PROFILE_SAMPLING=true`` samples continuously and writes a file every
+  ``PROFILE_WINDOW_SECONDS`` to ``PROFILE_DIR``.
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from pathlib import Path
+from collections import Counter
+
+# Threads currently handling a request
+_active_requests = set()
+
+# (pid, sampler) of the continuous profiler started in this process
+_continuous = None
+
+def request_started():
+    """Marks the calling thread as handling a request"""
+    _active_requests.add(threading.get_ident())
+
+def request_finished(exc=None):
+    """Unmarks the calling thread; usable as a Flask teardown_request handler"""
+    _active_requests.discard(threading.get_ident())
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+def collapse_stack(frame):
+    """Folds a frame and its callers into a root-first 'a;b;c' stack"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+class StackSampler:
+    """Samples the stacks of request-handling threads at a fixed interval.
+
+    Args:
+        interval (float, optional): Seconds between samples. Defaults to 0.005.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = [collapse_stack(frames[ident]) for ident in list(_active_requests) if ident in frames]
+            with self._lock:
+                self.samples += 1
+                self._counts.update(stacks)
+
+    def drain(self):
+        """Returns the folded stacks collected so far and starts a new window.
+
+        Returns:
+            str: One 'stack count' line per distinct stack, most frequent first
+        """
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+def profile_window(seconds, interval=0.005):
+    """Samples live requests for a window of time.
+
+    Args:
+        seconds (float): Length of the window
+        interval (float, optional): Seconds between samples. Defaults to 0.005.
+
+    Returns:
+        tuple: (folded stacks, number of samples taken)
+    """
+    # The calling request only waits; leave it out of its own profile
+    request_finished()
+    sampler = StackSampler(interval).start()
+    try:
+        time.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler.drain(), sampler.samples
+
+def start_continuous_profiling():
+    """Starts the background sampler if ``PROFILE_SAMPLING`` is enabled.
+
+    Every ``PROFILE_WINDOW_SECONDS`` (default 60) the window's folded stacks are
+    written to ``PROFILE_DIR`` (default logs/profiles) as
+    ``profile-<pid>-<timestamp>.folded``.
+
+    Returns:
+        StackSampler: The running sampler, or None if profiling is disabled
+    """
+    global _continuous
+    if os.getenv('PROFILE_SAMPLING', 'false').lower() != 'true':
+        return None
+    if _continuous is not None and _continuous[0] == os.getpid():
+        return _continuous[1]
+    window = float(os.getenv('PROFILE_WINDOW_SECONDS', '60'))
+    interval = float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000
+    directory = Path(os.getenv('PROFILE_DIR', 'logs/profiles'))
+    directory.mkdir(parents=True, exist_ok=True)
+    sampler = StackSampler(interval).start()
+
+    def flush_loop():
+        while True:
+            time.sleep(window)
+            folded = sampler.drain()
+            if folded:
+                path = directory / f"profile-{os.getpid()}-{int(time.time())}.folded"
+                path.write_text(folded)
+                logging.info(f"Wrote request profile to {path}")
+
+    threading.Thread(target=flush_loop, name='profile-writer', daemon=True).start()
+    logging.info(f"Sampling request stacks every {interval * 1000:g}ms into {directory}")
+    _continuous = (os.getpid(), sampler)
+    return sampler
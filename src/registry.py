@@ -0,0 +1,200 @@
+"""
+Local, directory-based registry of versioned models.
+
+    models/registry/
+        v1/
+            digit_classifier.weights
+            digit_classifier_dynamic.tflite    (optional)
+            metadata.json
+        v2/
+            ...
+        CURRENT                                (name of the version to serve)
+
+A version is published by writing it to a hidden scratch directory and
+renaming it into place, and activated by atomically replacing ``CURRENT``.
+Servers watching the registry therefore never see a half-written version.
+Without a ``CURRENT`` file the most recently published version is served.
+"""
+import os
+import re
+import json
+import shutil
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from .inference import TFLiteModel, create_engine, tflite_quantization_from_env, tflite_threads_from_env
+from .model import numpy_model_path, tflite_model_path, weight_store_path
+from .numpy_engine import NumpyModel
+
+CURRENT_FILE = 'CURRENT'
+METADATA_FILE = 'metadata.json'
+VERSION_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+class ModelRegistry:
+    """Versioned models under a root directory.
+
+    Args:
+        root (str or Path): Registry directory, created on first publish
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path(self, version):
+        """Directory of a version"""
+        if not VERSION_PATTERN.match(version):
+            raise ValueError(f"Invalid model version {version!r}")
+        return self.root / version
+
+    def metadata(self, version):
+        """Metadata recorded when a version was published"""
+        return json.loads((self.path(version) / METADATA_FILE).read_text())
+
+    def versions(self):
+        """Metadata of every published version, oldest first"""
+        if not self.root.is_dir():
+            return []
+        versions = [
+            json.loads((entry / METADATA_FILE).read_text())
+            for entry in self.root.iterdir()
+            if not entry.name.startswith('.') and (entry / METADATA_FILE).exists()
+        ]
+        return sorted(versions, key=lambda metadata: (metadata['created_at'], metadata['version']))
+
+    def current_version(self):
+        """The version to serve: the one named in CURRENT, else the latest published.
+
+        Returns:
+            str: The version, or None if nothing has been published
+        """
+        current = self.root / CURRENT_FILE
+        if current.exists():
+            version = current.read_text().strip()
+            if version:
+                return version
+        versions = self.versions()
+        return versions[-1]['version'] if versions else None
+
+    def next_version(self):
+        """The next free version name of the form v<N>"""
+        numbers = [int(metadata['version'][1:]) for metadata in self.versions()
+                   if re.fullmatch(r'v\d+', metadata['version'])]
+        return f"v{max(numbers, default=0) + 1}"
+
+    def publish(self, artifacts, version=None, metadata=None, activate=True):
+        """Adds a version made of existing artifact files.
+
+        Args:
+            artifacts (list): Paths of the files to copy in, e.g. the weight store
+                and TFLite exports; they keep their file names
+            version (str, optional): Version name. Defaults to next_version().
+            metadata (dict, optional): Extra metadata to record, e.g. test accuracy
+            activate (bool, optional): Make it the served version. Defaults to True.
+
+        Returns:
+            str: The published version
+
+        Raises:
+            ValueError: If the version already exists
+        """
+        version = version or self.next_version()
+        target = self.path(version)
+        if target.exists():
+            raise ValueError(f"Model version {version} already exists in {self.root}")
+
+        scratch = self.root / f".{version}.tmp-{os.getpid()}"
+        scratch.mkdir(parents=True)
+        try:
+            for artifact in artifacts:
+                shutil.copy2(artifact, scratch / Path(artifact).name)
+            record = dict(metadata or {})
+            record.update(
+                version=version,
+                created_at=datetime.now(timezone.utc).isoformat(),
+                artifacts=sorted(Path(artifact).name for artifact in artifacts),
+            )
+            (scratch / METADATA_FILE).write_text(json.dumps(record, indent=2))
+            os.rename(scratch, target)
+        except Exception:
+            shutil.rmtree(scratch, ignore_errors=True)
+            raise
+        logging.info(f"Published model version {version} to {self.root}")
+
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        """Makes a published version the one servers load"""
+        if not (self.path(version) / METADATA_FILE).exists():
+            raise ValueError(f"Model version {version} is not in {self.root}")
+        scratch = self.root / f".{CURRENT_FILE}.tmp-{os.getpid()}"
+        scratch.write_text(version + '\n')
+        os.replace(scratch, self.root / CURRENT_FILE)
+        logging.info(f"Activated model version {version}")
+
+    def load_engine(self, version, backend=None):
+        """Loads a version as an inference engine.
+
+        Args:
+            version (str): Published version
+            backend (str, optional): Defaults to the ``INFERENCE_BACKEND`` environment variable.
+
+        Returns:
+            object: The engine, with its ``version`` attribute set
+
+        Raises:
+            FileNotFoundError: If the version lacks the artifact the backend needs
+        """
+        from .weight_store import WeightStore, load_keras_model, load_numpy_model
+
+        backend = (backend or os.getenv('INFERENCE_BACKEND', 'compiled')).lower()
+        directory = self.path(version)
+        store = directory / weight_store_path().name
+        if backend == 'tflite':
+            path = directory / tflite_model_path(tflite_quantization_from_env()).name
+            if not path.exists():
+                raise FileNotFoundError(f"Model version {version} has no {path.name}")
+            engine = TFLiteModel(path, tflite_threads_from_env())
+        elif backend == 'numpy' and store.exists() and 'numpy' in WeightStore(store).metadata:
+            engine = load_numpy_model(store)
+        elif backend == 'numpy' and (directory / numpy_model_path().name).exists():
+            engine = NumpyModel.load(directory / numpy_model_path().name)
+        elif store.exists():
+            engine = create_engine(load_keras_model(store), backend)
+        else:
+            raise FileNotFoundError(f"Model version {version} has no {store.name}")
+        engine.version = version
+        logging.info(f"Loaded model version {version} with the {backend} backend")
+        return engine
+
+def publish_model(registry, model, version=None, metadata=None, tflite_quantizations=('dynamic',), activate=True):
+    """Exports a trained Keras model and publishes it as a new version.
+
+    Args:
+        registry (ModelRegistry): Where to publish
+        model (tf.keras.Model): The trained model
+        version (str, optional): Version name. Defaults to registry.next_version().
+        metadata (dict, optional): Extra metadata to record
+        tflite_quantizations (tuple, optional): TFLite exports to include. Defaults to ('dynamic',).
+        activate (bool, optional): Make it the served version. Defaults to True.
+
+    Returns:
+        str: The published version
+    """
+    import tempfile
+    from .model import export_tflite_model
+    from .weight_store import save_model_weights
+
+    with tempfile.TemporaryDirectory() as scratch:
+        artifacts = [Path(scratch) / weight_store_path().name]
+        save_model_weights(model, artifacts[0])
+        for quantization in tflite_quantizations:
+            artifacts.append(export_tflite_model(
+                model, quantization, path=Path(scratch) / tflite_model_path(quantization).name))
+        return registry.publish(artifacts, version, metadata, activate)
+
+def registry_from_env():
+    """The registry at ``MODEL_REGISTRY_DIR``, or None if it is not set"""
+    root = os.getenv('MODEL_REGISTRY_DIR')
+    return ModelRegistry(root) if root else None
@@ -0,0 +1,284 @@
+"""
+Offline bulk scoring of large image collections.
+
+Images are streamed in chunks of ``batch_size`` from a ``.npy`` or IDX
+file, both memory-mapped so only the chunk being read is paged in, or from
+a directory of PNG/JPEG files decoded on a thread pool. Each chunk is handed
+to the inference worker pool (src.process_pool) without waiting for the
+previous one, so reading and preprocessing overlap with the forward passes.
+Results are written in input order to memory-mapped files in the output
+directory:
+
+    labels.npy          (N,) uint8 predicted labels
+    probabilities.npy   (N, 10) float32 class probabilities
+    files.txt           input file of each row, for image directories
+    checkpoint.json     rows before next_index are final
+    report.json         throughput report of the last run
+
+The checkpoint only advances after the rows it covers are flushed to disk,
+so an interrupted run picks up where it stopped.
+"""
+import os
+import json
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+from numpy.lib.format import open_memmap
+from .dataset import read_idx
+from .imaging import decode_image_file, normalize_digit
+from .lifecycle import artifact_version, model_version
+from .model import prepare_batch
+
+LABELS_FILE = 'labels.npy'
+PROBABILITIES_FILE = 'probabilities.npy'
+FILES_FILE = 'files.txt'
+CHECKPOINT_FILE = 'checkpoint.json'
+REPORT_FILE = 'report.json'
+
+NUM_CLASSES = 10
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg')
+
+class ArraySource:
+    """Images in a memory-mapped array of shape (N, 784), (N, 28, 28) or (N, 28, 28, 1).
+
+    Args:
+        path (str or Path): File the array was mapped from
+        images (numpy.array): The memory-mapped array
+    """
+
+    def __init__(self, path, images):
+        if images.ndim < 2 or len(images) == 0 or images[0].size != 784:
+            raise ValueError(f"{path} holds an array of shape {images.shape}, not 28x28 images")
+        self.path = Path(path)
+        self.images = images.reshape(len(images), 784)
+
+    def __len__(self):
+        return len(self.images)
+
+    def read(self, start, stop):
+        """Rows [start, stop) as a view; only these pages are read from disk"""
+        return self.images[start:stop]
+
+    def fingerprint(self):
+        """Identifies the input, so a checkpoint is only resumed on the same data"""
+        stat = self.path.stat()
+        return {'path': str(self.path.resolve()), 'images': len(self), 'bytes': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns}
+
+    def close(self):
+        pass
+
+class ImageDirectorySource:
+    """PNG/JPEG files of a directory in name order, decoded and normalized on a thread pool.
+
+    Args:
+        path (str or Path): The directory
+        threads (int, optional): Decoding threads. Defaults to the CPU count.
+    """
+
+    def __init__(self, path, threads=None):
+        self.path = Path(path)
+        self.files = sorted(entry for entry in self.path.iterdir() if entry.suffix.lower() in IMAGE_SUFFIXES)
+        if not self.files:
+            raise ValueError(f"No {', '.join(IMAGE_SUFFIXES)} files in {path}")
+        self._executor = ThreadPoolExecutor(threads or os.cpu_count(), thread_name_prefix='image-decode')
+
+    def __len__(self):
+        return len(self.files)
+
+    @staticmethod
+    def _load(path):
+        pixels = decode_image_file(path.read_bytes())
+        if pixels.shape == (28, 28):
+            # Already in the MNIST layout
+            return pixels.reshape(784).astype(np.float32) / 255.0
+        return normalize_digit(pixels).reshape(784)
+
+    def read(self, start, stop):
+        """Images [start, stop) as a float32 (N, 784) array"""
+        return np.stack(list(self._executor.map(self._load, self.files[start:stop])))
+
+    def fingerprint(self):
+        stat = self.path.stat()
+        return {'path': str(self.path.resolve()), 'images': len(self), 'mtime_ns': stat.st_mtime_ns}
+
+    def close(self):
+        self._executor.shutdown()
+
+def open_idx(path):
+    """Memory-maps an uncompressed IDX image file such as MNIST's t10k-images-idx3-ubyte"""
+    return ArraySource(path, read_idx(path))
+
+def open_images(path, threads=None):
+    """Opens images to score from a .npy file, an IDX file or a directory of PNG/JPEG files.
+
+    Args:
+        path (str or Path): The input
+        threads (int, optional): Decoding threads for image directories. Defaults to the CPU count.
+
+    Returns:
+        ArraySource or ImageDirectorySource: The streaming source
+
+    Raises:
+        ValueError: If the input is not in a supported format
+    """
+    path = Path(path)
+    if path.is_dir():
+        return ImageDirectorySource(path, threads)
+    if path.suffix == '.gz':
+        raise ValueError(f"{path} is compressed and cannot be memory-mapped; decompress it first")
+    if path.suffix == '.npy':
+        return ArraySource(path, np.load(path, mmap_mode='r'))
+    return open_idx(path)
+
+def _load_checkpoint(output_dir, state):
+    """The checkpoint in output_dir if it was written for the same input and model, else None"""
+    path = output_dir / CHECKPOINT_FILE
+    if not path.exists():
+        return None
+    checkpoint = json.loads(path.read_text())
+    for key, value in state.items():
+        if checkpoint.get(key) != value:
+            raise ValueError(
+                f"Checkpoint in {output_dir} was written for a different {key} "
+                f"({checkpoint.get(key)!r}, now {value!r}); pass restart=True to start over"
+            )
+    return checkpoint
+
+def _save_checkpoint(output_dir, state, next_index, outputs):
+    """Flushes the outputs, then records that rows before next_index are final"""
+    for output in outputs:
+        output.flush()
+    record = dict(state, next_index=next_index, updated_at=datetime.now(timezone.utc).isoformat())
+    scratch = output_dir / f'.{CHECKPOINT_FILE}.tmp'
+    scratch.write_text(json.dumps(record, indent=2))
+    os.replace(scratch, output_dir / CHECKPOINT_FILE)
+
+def checkpoint_version(engine):
+    """Version a checkpoint is tied to: the registry version, else the exported artifact's.
+
+    Unlike model_version this does not depend on ``PYTHON_ENV``, so a rerun in
+    development resumes too. An engine with neither gets a version of its own,
+    and its checkpoints are never resumed.
+    """
+    version = getattr(engine, 'version', None)
+    if version is None:
+        version = artifact_version(getattr(engine, 'backend', 'keras'))
+    if version is None:
+        logging.warning("Model has no registry version or exported artifact; this run cannot be resumed")
+        return model_version(engine)
+    return str(version)
+
+def score_images(source, engine, output_dir, batch_size=1024, checkpoint_every=100000, restart=False, log_every=10.0):
+    """Scores every image of a source and writes labels and probabilities to output_dir.
+
+    Args:
+        source (ArraySource or ImageDirectorySource): Images to score, see open_images
+        engine (object): Inference engine; engines with ``submit`` (the worker
+            pool) get several chunks in flight at once
+        output_dir (str or Path): Directory for the outputs and the checkpoint
+        batch_size (int, optional): Images per chunk and forward pass. Defaults to 1024.
+        checkpoint_every (int, optional): Images between checkpoints. Defaults to 100000.
+        restart (bool, optional): Ignore an existing checkpoint. Defaults to False.
+        log_every (float, optional): Seconds between progress log lines. Defaults to 10.
+
+    Returns:
+        dict: The throughput report, also written to report.json
+
+    Raises:
+        ValueError: If output_dir has a checkpoint for other data or another model
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    total = len(source)
+    state = {'input': source.fingerprint(), 'model_version': checkpoint_version(engine), 'images': total}
+
+    checkpoint = None if restart else _load_checkpoint(output_dir, state)
+    first = checkpoint['next_index'] if checkpoint else 0
+    mode = 'r+' if checkpoint else 'w+'
+    labels = open_memmap(output_dir / LABELS_FILE, mode=mode, dtype=np.uint8, shape=(total,))
+    probabilities = open_memmap(output_dir / PROBABILITIES_FILE, mode=mode, dtype=np.float32,
+                                shape=(total, NUM_CLASSES))
+    if checkpoint is None:
+        if hasattr(source, 'files'):
+            (output_dir / FILES_FILE).write_text(''.join(f"{path.name}\n" for path in source.files))
+        _save_checkpoint(output_dir, state, 0, (labels, probabilities))
+    else:
+        logging.info(f"Resuming from image {first} of {total}")
+
+    submit = getattr(engine, 'submit', None)
+    # Keep every worker slot busy without blocking in submit
+    max_in_flight = max(1, getattr(engine, 'workers', 1) * getattr(engine, 'slots', 1))
+    stage_seconds = {'read': 0.0, 'preprocess': 0.0, 'inference': 0.0, 'write': 0.0}
+    pending = deque()
+    progress = {'written': first, 'checkpointed': first}
+    started = last_log = time.perf_counter()
+
+    def collect():
+        """Waits for the oldest chunk in flight and writes its results"""
+        begin, end, future = pending.popleft()
+        waited = time.perf_counter()
+        result = future.result()
+        written = time.perf_counter()
+        stage_seconds['inference'] += written - waited
+        probabilities[begin:end] = result
+        labels[begin:end] = result.argmax(axis=1)
+        stage_seconds['write'] += time.perf_counter() - written
+        progress['written'] = end
+        if end - progress['checkpointed'] >= checkpoint_every:
+            _save_checkpoint(output_dir, state, end, (labels, probabilities))
+            progress['checkpointed'] = end
+
+    for begin in range(first, total, batch_size):
+        end = min(begin + batch_size, total)
+        mark = time.perf_counter()
+        images = source.read(begin, end)
+        read = time.perf_counter()
+        batch = prepare_batch(images)
+        prepared = time.perf_counter()
+        stage_seconds['read'] += read - mark
+        stage_seconds['preprocess'] += prepared - read
+        if submit is not None:
+            future = submit(batch)
+        else:
+            future = Future()
+            future.set_result(np.asarray(engine.predict(batch, verbose=0)))
+        stage_seconds['inference'] += time.perf_counter() - prepared
+        pending.append((begin, end, future))
+        while pending and (len(pending) >= max_in_flight or pending[0][2].done()):
+            collect()
+
+        now = time.perf_counter()
+        if now - last_log >= log_every:
+            rate = (progress['written'] - first) / (now - started)
+            eta = (total - progress['written']) / rate if rate else float('inf')
+            logging.info(f"Scored {progress['written']}/{total} images ({rate:.0f} images/s, {eta:.0f}s left)")
+            last_log = now
+    while pending:
+        collect()
+    _save_checkpoint(output_dir, state, total, (labels, probabilities))
+
+    elapsed = time.perf_counter() - started
+    scored = total - first
+    report = {
+        'input': state['input'],
+        'model_version': state['model_version'],
+        'backend': getattr(engine, 'backend', 'keras'),
+        'workers': getattr(engine, 'workers', 0),
+        'batch_size': batch_size,
+        'images': total,
+        'resumed_from': first,
+        'scored': scored,
+        'seconds': round(elapsed, 3),
+        'images_per_second': round(scored / elapsed, 1) if elapsed > 0 else None,
+        # Time the scoring thread spent in each stage; inference is time spent waiting on the model
+        'stage_seconds': {stage: round(seconds, 3) for stage, seconds in stage_seconds.items()},
+        'finished_at': datetime.now(timezone.utc).isoformat(),
+    }
+    (output_dir / REPORT_FILE).write_text(json.dumps(report, indent=2))
+    logging.info(f"Scored {scored} images in {elapsed:.1f}s ({report['images_per_second']} images/s)")
+    return report
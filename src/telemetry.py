@@ -0,0 +1,304 @@
+"""
+Low-overhead training telemetry.
+
+Replaces the Keras TensorBoard callback, whose per-epoch weight histograms,
+graph and image dumps slowed every epoch and filled ``logs/fit``. Events are
+handed to AsyncEventWriter, whose background thread owns the TensorBoard file
+writer, so summary ops and file I/O stay off the training loop.
+
+Levels (``TRAIN_TELEMETRY_LEVEL``):
+
+- ``off``: no events.
+- ``basic`` (default): epoch metrics, plus step timing averaged over every
+  ``TRAIN_TELEMETRY_LOG_EVERY_STEPS`` steps.
+- ``detailed``: also histograms of a random sample of each weight tensor,
+  every ``TRAIN_TELEMETRY_HISTOGRAM_EVERY`` epochs.
+
+Each training step is split into:
+
+- data wait: from the start of the step until its batch left the input
+  pipeline, stamped by a map after the prefetch (see instrument)
+- compute: from then until the step returned
+- callbacks: from the end of one step to the start of the next, i.e. Keras
+  callbacks (progress bar, history) and the fit loop itself
+"""
+import os
+import queue
+import logging
+import threading
+import time
+from collections import deque
+import numpy as np
+
+TELEMETRY_LEVELS = ('off', 'basic', 'detailed')
+
+# Buckets of the sampled weight histograms
+HISTOGRAM_BUCKETS = 30
+
+class AsyncEventWriter:
+    """Writes TensorBoard events from a background thread.
+
+    Calls only enqueue; when the queue is full, events are dropped and counted
+    rather than blocking the caller.
+
+    Args:
+        log_dir (str or Path): TensorBoard log directory
+        max_queue (int, optional): Events buffered for the writer thread. Defaults to 1024.
+    """
+
+    def __init__(self, log_dir, max_queue=1024):
+        self.log_dir = str(log_dir)
+        self.dropped = 0
+        self._queue = queue.Queue(max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='telemetry-writer', daemon=True)
+        self._thread.start()
+
+    def scalar(self, name, value, step):
+        """Queues a scalar summary"""
+        self._put(('scalar', name, float(value), int(step)))
+
+    def histogram(self, name, values, step):
+        """Queues a histogram summary of a copy of values"""
+        self._put(('histogram', name, np.array(values, dtype='float32'), int(step)))
+
+    def _put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=10.0):
+        """Waits until every queued event is written to disk.
+
+        Returns:
+            bool: False if the writer did not catch up within timeout
+        """
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10.0):
+        """Writes the remaining events and stops the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self.dropped:
+            logging.warning(f"Telemetry dropped {self.dropped} events; the writer could not keep up")
+
+    def _run(self):
+        import tensorflow as tf
+
+        writer = tf.summary.create_file_writer(self.log_dir)
+        with writer.as_default():
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    break
+                if isinstance(event, threading.Event):
+                    writer.flush()
+                    event.set()
+                    continue
+                kind, name, value, step = event
+                try:
+                    if kind == 'scalar':
+                        tf.summary.scalar(name, value, step=step)
+                    else:
+                        tf.summary.histogram(name, value, step=step, buckets=HISTOGRAM_BUCKETS)
+                except Exception as e:
+                    logging.warning(f"Could not write telemetry event {name}: {e}")
+        writer.close()
+
+class TrainingTelemetry:
+    """Collects step timing and epoch metrics of one training run.
+
+    Args:
+        writer (AsyncEventWriter): Destination of the events
+        level (str, optional): 'basic' or 'detailed'. Defaults to 'basic'.
+        log_every_steps (int, optional): Steps averaged into one step-timing event. Defaults to 100.
+        histogram_every (int, optional): Epochs between weight histograms at the
+            'detailed' level. Defaults to 5.
+        histogram_samples (int, optional): Values sampled from each weight tensor
+            per histogram. Defaults to 4096.
+    """
+
+    def __init__(self, writer, level='basic', log_every_steps=100, histogram_every=5, histogram_samples=4096):
+        if level not in TELEMETRY_LEVELS[1:]:
+            raise ValueError(f"Unknown telemetry level {level!r}, expected one of {TELEMETRY_LEVELS}")
+        self.writer = writer
+        self.level = level
+        self.log_every_steps = max(1, log_every_steps)
+        self.histogram_every = max(1, histogram_every)
+        self.histogram_samples = histogram_samples
+        self.step = 0
+        self._ready = deque()
+        self._rng = np.random.default_rng(0)
+        self._step_started = None
+        self._last_step_end = None
+        self._pending_callbacks = 0.0
+        # Seconds per step of the current logging window and epoch
+        self._window = []
+        self._epoch = []
+
+    def instrument(self, dataset):
+        """Stamps the moment each batch of a tf.data dataset is handed to a training step.
+
+        The stamp is a sequential map after the prefetch, so it runs when the
+        step asks for its batch. Prefetch injection is turned off so the
+        stamp stays last.
+
+        Args:
+            dataset (tf.data.Dataset): Batches from make_dataset
+
+        Returns:
+            tf.data.Dataset: The same batches
+        """
+        import tensorflow as tf
+
+        def mark_ready():
+            self._ready.append(time.perf_counter())
+            return 0.0
+
+        def stamp(images, labels):
+            ready = tf.py_function(mark_ready, [], tf.float64)
+            with tf.control_dependencies([ready]):
+                return tf.identity(images), labels
+
+        options = tf.data.Options()
+        options.experimental_optimization.inject_prefetch = False
+        return dataset.map(stamp).with_options(options)
+
+    def step_begin(self):
+        """Marks the start of a training step"""
+        now = time.perf_counter()
+        self._step_started = now
+        self._pending_callbacks = now - self._last_step_end if self._last_step_end is not None else 0.0
+
+    def step_end(self):
+        """Marks the end of a training step and records its timing"""
+        now = time.perf_counter()
+        began = self._step_started
+        ready = None
+        while self._ready:
+            stamp = self._ready.popleft()
+            if began <= stamp <= now:
+                ready = stamp
+        # Without a stamp (uninstrumented or distributed input) waiting counts as compute
+        data_wait = ready - began if ready is not None else 0.0
+        timing = (data_wait, now - began - data_wait, self._pending_callbacks)
+        self._window.append(timing)
+        self._epoch.append(timing)
+        self._last_step_end = now
+        self.step += 1
+        if len(self._window) >= self.log_every_steps:
+            self._write_window()
+
+    def _write_window(self):
+        data_wait, compute, callbacks = np.mean(self._window, axis=0) * 1000
+        self.writer.scalar('step/data_wait_ms', data_wait, self.step)
+        self.writer.scalar('step/compute_ms', compute, self.step)
+        self.writer.scalar('step/callbacks_ms', callbacks, self.step)
+        self._window = []
+
+    def epoch_begin(self):
+        """Starts the timing of a new epoch"""
+        self._epoch = []
+        # The gap before an epoch's first step includes validation, not callbacks
+        self._last_step_end = None
+
+    def epoch_end(self, epoch, logs=None, model=None):
+        """Writes the epoch's metrics and adds its mean step timing to logs"""
+        logs = logs if logs is not None else {}
+        if self._epoch:
+            data_wait, compute, callbacks = np.mean(self._epoch, axis=0) * 1000
+            logs['data_wait_ms'] = float(data_wait)
+            logs['compute_ms'] = float(compute)
+            logs['callbacks_ms'] = float(callbacks)
+            busy = data_wait + compute + callbacks
+            logging.info(
+                f"Epoch {epoch + 1} steps: data wait {data_wait:.2f} ms, compute {compute:.2f} ms, "
+                f"callbacks {callbacks:.2f} ms ({100 * data_wait / busy if busy else 0:.0f}% waiting on input)"
+            )
+        for name, value in logs.items():
+            if np.isscalar(value) or getattr(value, 'shape', None) == ():
+                self.writer.scalar(f'epoch/{name}', value, epoch)
+
+        if self.level == 'detailed' and model is not None and (epoch + 1) % self.histogram_every == 0:
+            for weight in model.weights:
+                values = np.asarray(weight).ravel()
+                if values.size > self.histogram_samples:
+                    values = values[self._rng.integers(0, values.size, self.histogram_samples)]
+                self.writer.histogram(f"weights/{weight.name}", values, epoch)
+
+    def train_end(self):
+        """Writes the last partial window and closes the writer"""
+        if self._window:
+            self._write_window()
+        self.writer.close()
+
+    def close(self):
+        """Closes the writer; safe after train_end, and for a run that raised before it"""
+        self.writer.close()
+
+    def callback(self):
+        """The Keras callback feeding this telemetry.
+
+        Returns:
+            tf.keras.callbacks.Callback: The callback
+        """
+        import tensorflow as tf
+
+        telemetry = self
+
+        class TelemetryCallback(tf.keras.callbacks.Callback):
+            def on_epoch_begin(self, epoch, logs=None):
+                telemetry.epoch_begin()
+
+            def on_train_batch_begin(self, batch, logs=None):
+                telemetry.step_begin()
+
+            def on_train_batch_end(self, batch, logs=None):
+                telemetry.step_end()
+
+            def on_epoch_end(self, epoch, logs=None):
+                telemetry.epoch_end(epoch, logs, self.model)
+
+            def on_train_end(self, logs=None):
+                telemetry.train_end()
+
+        return TelemetryCallback()
+
+def create_telemetry(log_dir, level=None):
+    """Creates the telemetry of a training run from environment settings.
+
+    ``TRAIN_TELEMETRY_LEVEL`` (default basic) picks the level, and
+    ``TRAIN_TELEMETRY_LOG_EVERY_STEPS`` (default 100),
+    ``TRAIN_TELEMETRY_HISTOGRAM_EVERY`` (default 5) and
+    ``TRAIN_TELEMETRY_HISTOGRAM_SAMPLES`` (default 4096) tune it.
+
+    Args:
+        log_dir (str or Path): TensorBoard log directory of the run
+        level (str, optional): Overrides TRAIN_TELEMETRY_LEVEL
+
+    Returns:
+        TrainingTelemetry: The telemetry, or None if the level is 'off'
+
+    Raises:
+        ValueError: If the level is unknown
+    """
+    level = (level or os.getenv('TRAIN_TELEMETRY_LEVEL', 'basic')).lower()
+    if level not in TELEMETRY_LEVELS:
+        raise ValueError(f"Unknown telemetry level {level!r}, expected one of {TELEMETRY_LEVELS}")
+    if level == 'off':
+        return None
+    return TrainingTelemetry(
+        AsyncEventWriter(log_dir),
+        level,
+        log_every_steps=int(os.getenv('TRAIN_TELEMETRY_LOG_EVERY_STEPS', '100')),
+        histogram_every=int(os.getenv('TRAIN_TELEMETRY_HISTOGRAM_EVERY', '5')),
+        histogram_samples=int(os.getenv('TRAIN_TELEMETRY_HISTOGRAM_SAMPLES', '4096'))
+    )
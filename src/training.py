@@ -0,0 +1,133 @@
+"""
+Training runtime configuration for multi-core machines.
+
+TensorFlow fixes its thread pools and logical devices when the runtime
+starts, so ``configure_threads`` and ``create_strategy`` must run before
+the first TensorFlow op (including loading the dataset into tensors).
+
+Strategies:
+
+- ``default``: a single replica.
+- ``mirrored``: synchronous data parallelism across logical CPU devices
+  carved out of the host CPU in this process.
+- ``multi_worker``: synchronous data parallelism across worker processes
+  (on one or several hosts), each started with its own ``TF_CONFIG``.
+"""
+import os
+import json
+import math
+import logging
+
+STRATEGIES = ('default', 'mirrored', 'multi_worker')
+LR_SCALING_RULES = ('linear', 'sqrt', 'none')
+
+# Hyperparameters the model was tuned with: Adam's default rate at batch size 128
+BASE_LEARNING_RATE = 0.001
+BASE_BATCH_SIZE = 128
+
+def threads_from_env():
+    """Intra- and inter-op thread counts from ``TRAIN_INTRA_OP_THREADS`` / ``TRAIN_INTER_OP_THREADS``"""
+    intra = os.getenv('TRAIN_INTRA_OP_THREADS')
+    inter = os.getenv('TRAIN_INTER_OP_THREADS')
+    return (int(intra) if intra else None), (int(inter) if inter else None)
+
+def configure_threads(intra_op=None, inter_op=None):
+    """Sets TensorFlow's thread pool sizes; None keeps TensorFlow's default.
+
+    Args:
+        intra_op (int, optional): Threads used inside a single op (e.g. one matmul)
+        inter_op (int, optional): Independent ops run concurrently
+    """
+    import tensorflow as tf
+
+    if intra_op:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    if inter_op:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    logging.info(
+        f"TensorFlow threads: intra-op {tf.config.threading.get_intra_op_parallelism_threads() or 'default'}, "
+        f"inter-op {tf.config.threading.get_inter_op_parallelism_threads() or 'default'}"
+    )
+
+def create_strategy(name='default', num_replicas=None):
+    """Creates the tf.distribute strategy to train under.
+
+    Args:
+        name (str, optional): One of STRATEGIES. Defaults to 'default'.
+        num_replicas (int, optional): Logical CPU devices for ``mirrored``. Defaults to 2.
+
+    Returns:
+        tf.distribute.Strategy: The strategy
+    """
+    import tensorflow as tf
+
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {name!r}, expected one of {STRATEGIES}")
+    if name == 'mirrored':
+        num_replicas = num_replicas or 2
+        cpu = tf.config.list_physical_devices('CPU')[0]
+        tf.config.set_logical_device_configuration(cpu, [tf.config.LogicalDeviceConfiguration()] * num_replicas)
+        devices = [device.name for device in tf.config.list_logical_devices('CPU')]
+        strategy = tf.distribute.MirroredStrategy(
+            devices=devices,
+            # NCCL all-reduce is GPU-only
+            cross_device_ops=tf.distribute.ReductionToOneDevice()
+        )
+    elif name == 'multi_worker':
+        strategy = tf.distribute.MultiWorkerMirroredStrategy()
+    else:
+        strategy = tf.distribute.get_strategy()
+    logging.info(f"Training with {name} strategy, {strategy.num_replicas_in_sync} replica(s)")
+    return strategy
+
+def set_mixed_precision(enabled):
+    """Computes in bfloat16 with float32 variables when enabled.
+
+    bfloat16 keeps float32's exponent range, so unlike float16 it needs no
+    loss scaling; CPUs with AVX512-BF16 or AMX run it natively.
+
+    Args:
+        enabled (bool): Use the mixed_bfloat16 policy, otherwise float32
+    """
+    import tensorflow as tf
+
+    tf.keras.mixed_precision.set_global_policy('mixed_bfloat16' if enabled else 'float32')
+
+def scale_hyperparameters(per_replica_batch_size, num_replicas, base_learning_rate=BASE_LEARNING_RATE,
+                          base_batch_size=BASE_BATCH_SIZE, rule='linear'):
+    """Scales batch size and learning rate with the number of replicas.
+
+    Each replica processes per_replica_batch_size examples per step, so the
+    global batch grows with the replica count; the learning rate follows it
+    linearly, by its square root, or not at all.
+
+    Args:
+        per_replica_batch_size (int): Examples per replica per step
+        num_replicas (int): Replicas in sync
+        base_learning_rate (float, optional): Rate tuned for base_batch_size. Defaults to BASE_LEARNING_RATE.
+        base_batch_size (int, optional): Batch size the base rate was tuned for. Defaults to BASE_BATCH_SIZE.
+        rule (str, optional): One of LR_SCALING_RULES. Defaults to 'linear'.
+
+    Returns:
+        tuple: (global batch size, learning rate)
+    """
+    if rule not in LR_SCALING_RULES:
+        raise ValueError(f"Unknown learning rate scaling {rule!r}, expected one of {LR_SCALING_RULES}")
+    global_batch_size = per_replica_batch_size * num_replicas
+    ratio = global_batch_size / base_batch_size
+    if rule == 'linear':
+        learning_rate = base_learning_rate * ratio
+    elif rule == 'sqrt':
+        learning_rate = base_learning_rate * math.sqrt(ratio)
+    else:
+        learning_rate = base_learning_rate
+    return global_batch_size, learning_rate
+
+def is_chief():
+    """Whether this process should write the model (always true outside multi-worker training)"""
+    config = json.loads(os.getenv('TF_CONFIG', '{}'))
+    task = config.get('task', {})
+    if not task or task.get('type') == 'chief':
+        return True
+    # Without a dedicated chief, worker 0 takes its role
+    return 'chief' not in config.get('cluster', {}) and task.get('type') == 'worker' and task.get('index', 0) == 0
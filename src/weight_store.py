@@ -0,0 +1,176 @@
+"""
+Memory-mapped weight store.
+
+A single binary file holding named arrays, laid out so it can be opened with
+``np.memmap`` and used in place::
+
+    header   32 bytes   magic b'DGTWGHT\\0', version, alignment,
+                        index offset, index length (little-endian)
+    arrays   each starting on an ALIGNMENT-byte boundary
+    index    UTF-8 JSON: {"arrays": {name: {dtype, shape, offset}}, "metadata": {...}}
+
+Opening a store only parses the small index; array data stays in the page
+cache, shared by every process that maps the same file, and is read on
+first touch. Stores are written to a temporary file and renamed into place,
+so processes still mapping the previous version keep a consistent view.
+
+The model store written by ``save_model_weights`` has two sections: the raw
+Keras weights with the model architecture, and the BatchNorm-folded ops of
+the NumPy engine, which serves straight from the mapped pages.
+"""
+import os
+import json
+import struct
+import tempfile
+from pathlib import Path
+import numpy as np
+from .numpy_engine import NumpyModel, fold_model
+
+MAGIC = b'DGTWGHT\0'
+VERSION = 1
+ALIGNMENT = 64
+HEADER = struct.Struct('<8sIIQQ')
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def write_weight_store(path, arrays, metadata=None):
+    """Writes named arrays to a weight store file.
+
+    Args:
+        path (Path): Destination file
+        arrays (dict): Mapping of name to numpy.array
+        metadata (dict, optional): JSON-serializable metadata stored in the index
+
+    Returns:
+        Path: The path written
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    index = {'arrays': {}, 'metadata': metadata or {}}
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            offset = _align(HEADER.size)
+            f.write(b'\0' * offset)
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                if array.dtype.byteorder == '>':
+                    array = array.astype(array.dtype.newbyteorder('<'))
+                f.write(b'\0' * (_align(offset) - offset))
+                offset = _align(offset)
+                index['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+                f.write(array.tobytes())
+                offset += array.nbytes
+
+            index_bytes = json.dumps(index).encode('utf-8')
+            f.write(index_bytes)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, ALIGNMENT, offset, len(index_bytes)))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+class WeightStore:
+    """Read-only, memory-mapped view of a weight store file.
+
+    Arrays returned by ``store[name]`` are views into the mapping; nothing is
+    copied until the data is modified, which the read-only mapping forbids.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (Path): Weight store file
+
+        Raises:
+            ValueError: If the file is not a weight store of a supported version
+        """
+        self.path = Path(path)
+        self._map = np.memmap(self.path, dtype='uint8', mode='r')
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{self.path} is too small to be a weight store")
+        magic, version, alignment, index_offset, index_length = HEADER.unpack(self._map[:HEADER.size].tobytes())
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a weight store")
+        if version != VERSION:
+            raise ValueError(f"Unsupported weight store version {version} in {self.path}")
+        index = json.loads(self._map[index_offset:index_offset + index_length].tobytes().decode('utf-8'))
+        self.metadata = index['metadata']
+        self._entries = index['arrays']
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __getitem__(self, name):
+        entry = self._entries[name]
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        start = entry['offset']
+        return self._map[start:start + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+
+    def names(self):
+        return list(self._entries)
+
+def save_model_weights(model, path):
+    """Writes a model's weights to a weight store.
+
+    The Keras section holds every weight of the model, in ``get_weights()``
+    order, and its architecture. The NumPy section holds the folded ops
+    of the NumPy engine; it is omitted for architectures the engine does
+    not support.
+
+    Args:
+        model (tf.keras.Model): Trained neural network model
+        path (Path): Destination file
+
+    Returns:
+        Path: The path written
+    """
+    weights = model.get_weights()
+    arrays = {f"keras/{i}": weight for i, weight in enumerate(weights)}
+    metadata = {'keras': {'architecture': model.to_json(), 'count': len(weights)}}
+    try:
+        spec, numpy_arrays = fold_model(model)
+    except ValueError:
+        spec = None
+    if spec is not None:
+        arrays.update({f"numpy/{name}": array for name, array in numpy_arrays.items()})
+        metadata['numpy'] = spec
+    return write_weight_store(path, arrays, metadata)
+
+def load_keras_model(path):
+    """Rebuilds a Keras model from a weight store without the SavedModel graph.
+
+    Args:
+        path (Path): Weight store written by save_model_weights
+
+    Returns:
+        tf.keras.Model: The model (uncompiled)
+    """
+    import tensorflow as tf
+
+    store = WeightStore(path)
+    section = store.metadata['keras']
+    model = tf.keras.models.model_from_json(section['architecture'])
+    model.set_weights([store[f"keras/{i}"] for i in range(section['count'])])
+    return model
+
+def load_numpy_model(path):
+    """Opens the NumPy engine section of a weight store, serving from the mapping.
+
+    Args:
+        path (Path): Weight store written by save_model_weights
+
+    Returns:
+        NumpyModel: The engine, or None if the store has no NumPy section
+    """
+    store = WeightStore(path)
+    if 'numpy' not in store.metadata:
+        return None
+    arrays = {name[len('numpy/'):]: store[name] for name in store.names() if name.startswith('numpy/')}
+    return NumpyModel(store.metadata['numpy'], arrays)
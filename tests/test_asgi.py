@@ -0,0 +1,92 @@
+import json
+import asyncio
+import threading
+import unittest
+from src.asgi import BoundedExecutorApp
+
+def echo_app(environ, start_response):
+    body = environ['wsgi.input'].read()
+    start_response('200 OK', [('Content-Type', 'text/plain'), ('X-Path', environ['PATH_INFO'])])
+    return [environ['CONTENT_TYPE'].encode(), b' ', body]
+
+def make_blocking_app(release):
+    def blocking_app(environ, start_response):
+        release.wait(5)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [b'done']
+    return blocking_app
+
+async def call(app, path, body=b'', chunk_size=None):
+    """Sends one request through an ASGI app, returning (status, headers, body)"""
+    chunk_size = chunk_size or max(len(body), 1)
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b'']
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1} for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http', 'method': 'POST', 'path': path, 'query_string': b'',
+        'headers': [(b'content-type', b'application/octet-stream')],
+    }
+    await app(scope, receive, send)
+    return sent[0]['status'], dict(sent[0]['headers']), sent[1]['body']
+
+def make_app(wsgi_app, **options):
+    settings = dict(threads=2, max_pending=8, queue_timeout=5.0, max_body_bytes=1024)
+    settings.update(options)
+    return BoundedExecutorApp(wsgi_app, **settings)
+
+class TestBoundedExecutorApp(unittest.TestCase):
+    def test_runs_wsgi_app(self):
+        status, headers, body = asyncio.run(call(make_app(echo_app), '/predict', b'x' * 100, chunk_size=7))
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'x-path'], b'/predict')
+        self.assertEqual(body, b'application/octet-stream ' + b'x' * 100)
+
+    def test_rejects_large_body(self):
+        status, _, body = asyncio.run(call(make_app(echo_app, max_body_bytes=10), '/predict', b'x' * 11))
+        self.assertEqual(status, 413)
+        self.assertIn('error', json.loads(body))
+
+    def test_rejects_when_queue_full(self):
+        release = threading.Event()
+        app = make_app(make_blocking_app(release), threads=1, max_pending=2)
+
+        async def scenario():
+            admitted = [asyncio.create_task(call(app, '/predict')) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            rejected = await call(app, '/predict')
+            health = asyncio.create_task(call(app, '/health'))
+            await asyncio.sleep(0.05)
+            release.set()
+            return rejected, await asyncio.gather(*admitted), await health
+
+        rejected, admitted, health = asyncio.run(scenario())
+        self.assertEqual(rejected[0], 429)
+        self.assertEqual(rejected[1][b'retry-after'], b'1')
+        self.assertEqual([response[0] for response in admitted], [200, 200])
+        self.assertEqual(health[0], 200)
+        self.assertEqual(app.pending, 0)
+
+    def test_sheds_requests_that_waited_too_long(self):
+        release = threading.Event()
+        app = make_app(make_blocking_app(release), threads=1, queue_timeout=0.05)
+
+        async def scenario():
+            first = asyncio.create_task(call(app, '/predict'))
+            second = asyncio.create_task(call(app, '/predict'))
+            await asyncio.sleep(0.1)
+            release.set()
+            return await first, await second
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual(first[0], 200)
+        self.assertEqual(second[0], 503)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import threading
+import numpy as np
+from src.model import MicroBatcher, input_buffer, predict, predict_batch, prepare_image
+
+class FakeModel:
+    """Stand-in for a Keras model that records the batch sizes it sees"""
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, images, verbose=0):
+        self.batch_sizes.append(len(images))
+        # One-hot on the mean pixel value so each caller's row is distinguishable
+        labels = np.rint(images.reshape(len(images), -1).mean(axis=1) * 9).astype(int)
+        return np.eye(10, dtype='float32')[labels]
+
+class TestMicroBatcher(unittest.TestCase):
+    def setUp(self):
+        self.model = FakeModel()
+        self.batcher = MicroBatcher(self.model, max_batch_size=8, max_wait_ms=50)
+
+    def tearDown(self):
+        self.batcher.close()
+
+    def test_single_request(self):
+        label, probabilities = self.batcher.predict(np.full(784, 9 / 9.0))
+        self.assertEqual(label, 9)
+        self.assertEqual(len(probabilities), 10)
+        self.assertEqual(self.model.batch_sizes, [1])
+
+    def test_concurrent_requests_are_batched(self):
+        results = {}
+
+        def worker(digit):
+            results[digit] = self.batcher.predict(np.full((28, 28), digit * 255 / 9.0))
+
+        threads = [threading.Thread(target=worker, args=(d,)) for d in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual({d: results[d][0] for d in range(8)}, {d: d for d in range(8)})
+        self.assertLess(len(self.model.batch_sizes), 8)
+        self.assertTrue(all(size <= 8 for size in self.model.batch_sizes))
+
+    def test_model_error_propagates(self):
+        self.model.predict = lambda images, verbose=0: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            self.batcher.predict(np.zeros(784))
+
+    def test_invalid_image_does_not_fail_batch(self):
+        with self.assertRaises(ValueError):
+            self.batcher.submit(np.zeros(783))
+        self.assertEqual(self.batcher.predict(np.zeros(784))[0], 0)
+
+class TestPrepareImage(unittest.TestCase):
+    def test_matches_float_conversion(self):
+        pixels = np.random.default_rng(0).integers(0, 256, 784).astype(np.uint8)
+        expected = pixels.astype('float32').reshape(28, 28, 1) / 255.0
+        for image in (pixels, pixels.astype('float64'), pixels.reshape(28, 28).astype('float32'), expected):
+            np.testing.assert_array_equal(prepare_image(image), expected)
+
+    def test_writes_into_buffer(self):
+        out = input_buffer(1)
+        image = prepare_image(np.full(784, 255, dtype=np.uint8), out=out[0])
+        self.assertTrue(np.shares_memory(image, out))
+        self.assertTrue(np.all(out == 1.0))
+
+    def test_predict_reuses_thread_buffer(self):
+        model = FakeModel()
+        buffer = input_buffer(1)
+        label, probabilities = predict(model, np.full(784, 3 / 9.0))
+        self.assertEqual(label, 3)
+        self.assertEqual(probabilities, np.eye(10)[3].tolist())
+        self.assertTrue(np.shares_memory(input_buffer(1), buffer))
+
+class TestPredictBatch(unittest.TestCase):
+    def setUp(self):
+        self.model = FakeModel()
+
+    def test_flat_and_square_batches(self):
+        images = np.stack([np.full(784, d / 9.0) for d in range(10)])
+        for batch in (images, images.reshape(10, 28, 28)):
+            labels, probabilities = predict_batch(self.model, batch)
+            self.assertEqual(labels.tolist(), list(range(10)))
+            self.assertEqual(probabilities.shape, (10, 10))
+        self.assertEqual(self.model.batch_sizes, [10, 10])
+
+    def test_rows_are_normalized_independently(self):
+        # One row in the 0-255 range and one already in [0, 1] describe the same image
+        images = np.stack([np.full(784, 255.0), np.full(784, 1.0)])
+        labels, _ = predict_batch(self.model, images)
+        self.assertEqual(labels.tolist(), [9, 9])
+
+    def test_invalid_shape(self):
+        for bad in (np.zeros(784), np.zeros((2, 783)), np.zeros((0, 784))):
+            with self.assertRaises(ValueError):
+                predict_batch(self.model, bad)
+
+if __name__ == '__main__':
+    unittest.main()
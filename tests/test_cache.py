@@ -0,0 +1,132 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from src.cache import PredictionCache, SharedPredictionCache, create_cache, image_key
+
+def compute(image):
+    probabilities = [0.0] * 10
+    probabilities[3] = 1.0
+    return 3, probabilities
+
+class TestImageKey(unittest.TestCase):
+    def test_scaled_and_raw_pixels_share_a_key(self):
+        pixels = np.random.default_rng(0).integers(0, 256, (28, 28)).astype('uint8')
+        self.assertEqual(image_key(pixels), image_key(pixels.astype('float64')))
+        self.assertEqual(image_key(pixels), image_key(pixels / 255.0))
+        self.assertEqual(image_key(pixels), image_key(pixels.reshape(784)))
+
+    def test_different_images_differ(self):
+        image = np.zeros((28, 28), dtype='uint8')
+        other = image.copy()
+        other[0, 0] = 1
+        self.assertNotEqual(image_key(image), image_key(other))
+
+class TestPredictionCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def counting_compute(self, image):
+        self.calls += 1
+        return compute(image)
+
+    def test_hit_skips_compute(self):
+        cache = PredictionCache()
+        image = np.zeros((28, 28))
+        self.assertEqual(cache.lookup(image, 'v1', self.counting_compute)[0], 3)
+        self.assertEqual(cache.lookup(image, 'v1', self.counting_compute)[0], 3)
+        self.assertEqual(self.calls, 1)
+
+    def test_version_change_invalidates(self):
+        cache = PredictionCache()
+        image = np.zeros((28, 28))
+        cache.lookup(image, 'v1', self.counting_compute)
+        cache.lookup(image, 'v2', self.counting_compute)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_overlapping_versions_keep_their_entries(self):
+        # During a hot swap, requests on the old and new version interleave
+        cache = PredictionCache()
+        images = [np.full((28, 28), value, dtype='uint8') for value in range(2)]
+        cache.lookup(images[0], 'v1', self.counting_compute)
+        cache.lookup(images[1], 'v1', self.counting_compute)
+        cache.lookup(images[0], 'v2', self.counting_compute)
+        cache.lookup(images[1], 'v1', self.counting_compute)
+        cache.lookup(images[0], 'v2', self.counting_compute)
+        self.assertEqual(self.calls, 3)
+        self.assertIsNone(cache.get(image_key(images[0]), 'v1'))
+
+    def test_lru_eviction(self):
+        cache = PredictionCache(max_entries=2)
+        images = [np.full((28, 28), value, dtype='uint8') for value in range(3)]
+        cache.lookup(images[0], 'v1', self.counting_compute)
+        cache.lookup(images[1], 'v1', self.counting_compute)
+        cache.lookup(images[0], 'v1', self.counting_compute)
+        cache.lookup(images[2], 'v1', self.counting_compute)
+        self.assertIsNotNone(cache.get(image_key(images[0]), 'v1'))
+        self.assertIsNone(cache.get(image_key(images[1]), 'v1'))
+
+    def test_ttl_expiry(self):
+        cache = PredictionCache(ttl=10)
+        image = np.zeros((28, 28))
+        with mock.patch('src.cache.time.monotonic', return_value=100.0):
+            cache.lookup(image, 'v1', self.counting_compute)
+        with mock.patch('src.cache.time.monotonic', return_value=111.0):
+            cache.lookup(image, 'v1', self.counting_compute)
+        self.assertEqual(self.calls, 2)
+
+    def test_failed_prediction_is_not_cached(self):
+        cache = PredictionCache()
+        image = np.zeros((28, 28))
+        cache.lookup(image, 'v1', lambda image: (0, [0.0] * 10))
+        self.assertEqual(len(cache), 0)
+
+class TestSharedPredictionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_entries_visible_to_other_instances(self):
+        writer = SharedPredictionCache(self.path, slots=64)
+        reader = SharedPredictionCache(self.path, slots=64)
+        image = np.zeros((28, 28), dtype='uint8')
+        writer.lookup(image, 'v1', compute)
+        label, probabilities = reader.get(image_key(image), 'v1')
+        self.assertEqual(label, 3)
+        self.assertAlmostEqual(probabilities[3], 1.0)
+        self.assertIsNone(reader.get(image_key(image), 'v2'))
+
+    def test_shared_entries_survive_fork(self):
+        cache = SharedPredictionCache(self.path, slots=64)
+        image = np.ones((28, 28), dtype='uint8')
+        pid = os.fork()
+        if pid == 0:
+            cache.lookup(image, 'v1', compute)
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(cache.get(image_key(image), 'v1')[0], 3)
+
+    def test_ttl_expiry(self):
+        cache = SharedPredictionCache(self.path, slots=64, ttl=10)
+        image = np.zeros((28, 28), dtype='uint8')
+        with mock.patch('src.cache.time.time', return_value=100.0):
+            cache.lookup(image, 'v1', compute)
+        with mock.patch('src.cache.time.time', return_value=111.0):
+            self.assertIsNone(cache.get(image_key(image), 'v1'))
+
+class TestCreateCache(unittest.TestCase):
+    def test_disabled_with_zero_size(self):
+        with mock.patch.dict(os.environ, {'PREDICTION_CACHE_SIZE': '0'}):
+            self.assertIsNone(create_cache())
+
+    def test_defaults_to_local(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsInstance(create_cache(), PredictionCache)
+
+if __name__ == '__main__':
+    unittest.main()
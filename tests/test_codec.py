@@ -0,0 +1,40 @@
+import unittest
+import numpy as np
+from src.codec import decode_images, encode_images, encode_predictions, decode_predictions, HEADER
+
+class TestCodec(unittest.TestCase):
+    def test_raw_uint8_image(self):
+        pixels = np.arange(784, dtype='uint8')
+        images = decode_images(pixels.tobytes())
+        self.assertEqual(images.shape, (1, 784))
+        self.assertEqual(images.dtype, np.uint8)
+        np.testing.assert_array_equal(images[0], pixels)
+
+    def test_raw_float32_image(self):
+        pixels = np.random.rand(784).astype('<f4')
+        images = decode_images(pixels.tobytes())
+        self.assertEqual(images.dtype, np.float32)
+        np.testing.assert_array_equal(images[0], pixels)
+
+    def test_framed_batch_is_not_copied(self):
+        batch = np.random.randint(0, 256, size=(5, 28, 28), dtype='uint8')
+        body = encode_images(batch)
+        self.assertEqual(len(body), HEADER.size + batch.size)
+        images = decode_images(body)
+        self.assertEqual(images.shape, (5, 784))
+        self.assertFalse(images.flags.owndata)
+        np.testing.assert_array_equal(images, batch.reshape(5, 784))
+
+    def test_invalid_bodies(self):
+        for body in (b'', b'\x00' * 100, encode_images(np.zeros((2, 784), 'uint8'))[:-1]):
+            with self.assertRaises(ValueError):
+                decode_images(body)
+
+    def test_predictions_round_trip(self):
+        probabilities = np.random.rand(3, 10).astype('float32')
+        labels, decoded = decode_predictions(encode_predictions(probabilities.argmax(axis=1), probabilities))
+        np.testing.assert_array_equal(labels, probabilities.argmax(axis=1))
+        np.testing.assert_array_equal(decoded, probabilities)
+
+if __name__ == '__main__':
+    unittest.main()
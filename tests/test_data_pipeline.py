@@ -0,0 +1,52 @@
+import tempfile
+import unittest
+import numpy as np
+import tensorflow as tf
+from src.model import _warp, as_uint8_images, augment_batch, make_dataset, measure_pipeline_throughput, write_tfrecord_shards
+
+class TestDataPipeline(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.images = rng.integers(0, 256, (300, 28, 28)).astype('uint8')
+        self.labels = rng.integers(0, 10, 300).astype('uint8')
+
+    def test_float_images_round_trip_to_uint8(self):
+        np.testing.assert_array_equal(as_uint8_images(self.images / 255.0), self.images)
+
+    def test_batches_are_normalized(self):
+        images, labels = next(iter(make_dataset(self.images, self.labels, batch_size=32, training=False)))
+        self.assertEqual(images.shape, (32, 28, 28, 1))
+        self.assertEqual(images.dtype, tf.float32)
+        np.testing.assert_allclose(images.numpy()[..., 0], self.images[:32] / 255.0, rtol=1e-6)
+        np.testing.assert_array_equal(labels.numpy(), self.labels[:32])
+
+    def test_streams_shards_with_in_memory_arrays(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_tfrecord_shards(self.images[:250], self.labels[:250], directory, shard_size=100)
+            self.assertEqual(len(paths), 3)
+            dataset = make_dataset(self.images[250:], self.labels[250:], shard_pattern=f"{directory}/*.tfrecord",
+                                   batch_size=64, seed=0)
+            labels = np.concatenate([labels.numpy() for _, labels in dataset])
+        self.assertEqual(len(labels), 300)
+        np.testing.assert_array_equal(np.bincount(labels, minlength=10), np.bincount(self.labels, minlength=10))
+
+    def test_zero_displacement_warp_is_identity(self):
+        images = tf.constant(self.images[:4, ..., np.newaxis] / 255.0, tf.float32)
+        zeros = tf.zeros((4, 28, 28))
+        np.testing.assert_allclose(_warp(images, zeros, zeros).numpy(), images.numpy())
+
+    def test_augmentation_keeps_shape_and_range(self):
+        images = tf.constant(self.images[:8, ..., np.newaxis] / 255.0, tf.float32)
+        augmented = augment_batch(images).numpy()
+        self.assertEqual(augmented.shape, (8, 28, 28, 1))
+        self.assertGreaterEqual(augmented.min(), 0.0)
+        self.assertLessEqual(augmented.max(), 1.0 + 1e-6)
+
+    def test_throughput_report(self):
+        report = measure_pipeline_throughput(make_dataset(self.images, self.labels, batch_size=32), num_batches=5)
+        self.assertEqual(report['batches'], 5)
+        self.assertEqual(report['images'], 160)
+        self.assertGreater(report['images_per_second'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
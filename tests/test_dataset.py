@@ -0,0 +1,104 @@
+import os
+import gzip
+import struct
+import unittest
+import tempfile
+from pathlib import Path
+import numpy as np
+from src.dataset import open_dataset, build_cache, find_source, read_idx, MANIFEST_FILE
+
+def fake_mnist(train=60, test=20):
+    rng = np.random.default_rng(0)
+    return {
+        'x_train': rng.integers(0, 256, (train, 28, 28), dtype=np.uint8),
+        'y_train': rng.integers(0, 10, train, dtype=np.uint8),
+        'x_test': rng.integers(0, 256, (test, 28, 28), dtype=np.uint8),
+        'y_test': rng.integers(0, 10, test, dtype=np.uint8),
+    }
+
+def idx_bytes(array):
+    return b'\x00\x00\x08' + bytes([array.ndim]) + struct.pack(f'>{array.ndim}I', *array.shape) + array.tobytes()
+
+class TestDatasetCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.arrays = fake_mnist()
+        self.npz = self.dir / 'mnist.npz'
+        np.savez(self.npz, **self.arrays)
+        self.cache = self.dir / 'cache'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def assert_matches(self, dataset):
+        for name, array in zip(('x_train', 'y_train', 'x_test', 'y_test'), dataset.arrays()):
+            self.assertIsInstance(array, np.memmap)
+            self.assertEqual(array.dtype, np.uint8)
+            np.testing.assert_array_equal(array, self.arrays[name])
+
+    def test_builds_once_from_npz(self):
+        dataset = open_dataset(self.cache, self.npz)
+        self.assert_matches(dataset)
+        self.assertEqual(dataset.manifest['arrays']['x_train']['shape'], [60, 28, 28])
+
+        # Opening again needs neither the source nor the network
+        self.npz.unlink()
+        self.assert_matches(open_dataset(self.cache, offline=True, verify=True))
+
+    def test_builds_from_idx_files(self):
+        idx_dir = self.dir / 'idx'
+        idx_dir.mkdir()
+        names = {'x_train': 'train-images-idx3-ubyte', 'y_train': 'train-labels-idx1-ubyte',
+                 'x_test': 't10k-images-idx3-ubyte', 'y_test': 't10k-labels-idx1-ubyte'}
+        for name, stem in names.items():
+            data = idx_bytes(self.arrays[name])
+            if name.startswith('x'):
+                (idx_dir / f'{stem}.gz').write_bytes(gzip.compress(data))
+            else:
+                (idx_dir / stem).write_bytes(data)
+        self.assertIsInstance(read_idx(idx_dir / 'train-labels-idx1-ubyte'), np.memmap)
+        self.assert_matches(open_dataset(self.cache, idx_dir))
+
+    def test_corrupted_cache_is_rebuilt(self):
+        build_cache(self.cache, self.npz)
+        path = self.cache / 'x_test.npy'
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xff
+        path.write_bytes(bytes(data))
+        # A same-size change is caught by the checksum since the modification time moved
+        os.utime(path, ns=(0, 0))
+        self.assert_matches(open_dataset(self.cache, self.npz))
+
+        (self.cache / 'y_train.npy').write_bytes(b'')
+        with self.assertRaises(FileNotFoundError):
+            open_dataset(self.cache, self.dir / 'missing.npz')
+
+    def test_offline_without_source(self):
+        os.environ['KERAS_HOME'] = str(self.dir / 'keras')
+        try:
+            with self.assertRaises(FileNotFoundError):
+                find_source(offline=True)
+            with self.assertRaises(FileNotFoundError):
+                open_dataset(self.cache, offline=True)
+        finally:
+            del os.environ['KERAS_HOME']
+        self.assertFalse((self.cache / MANIFEST_FILE).exists())
+
+    def test_lazy_normalized_batches(self):
+        split = open_dataset(self.cache, self.npz).train
+        subset = split[10:35]
+        self.assertEqual(len(subset), 25)
+        self.assertIsInstance(subset.images, np.memmap)
+
+        images, labels = subset.batch(5, 15)
+        self.assertEqual((images.shape, images.dtype), ((10, 28, 28, 1), np.float32))
+        np.testing.assert_allclose(images[..., 0], self.arrays['x_train'][15:25] / 255.0, rtol=1e-6)
+        np.testing.assert_array_equal(labels, self.arrays['y_train'][15:25])
+
+        out = np.empty((16, 28, 28, 1), dtype=np.float32)
+        self.assertIs(subset.batch(0, 4, out=out)[0].base, out)
+        self.assertEqual([len(labels) for _, labels in subset.batches(10)], [10, 10, 5])
+
+if __name__ == '__main__':
+    unittest.main()
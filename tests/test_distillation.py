@@ -0,0 +1,90 @@
+import unittest
+import numpy as np
+import tensorflow as tf
+from src.distillation import (
+    build_student, distill, distillation_loss, format_report, mark_pareto_front, parse_student,
+    select_student, soften, teacher_targets
+)
+from src.numpy_engine import NumpyModel, fold_model
+
+def candidate(name, accuracy, p95_ms, role='student'):
+    return {'name': name, 'role': role, 'accuracy': accuracy, 'latency': {1: {'p50_ms': p95_ms, 'p95_ms': p95_ms}}}
+
+class TestStudents(unittest.TestCase):
+    def test_parse_student(self):
+        self.assertEqual(parse_student('16-32/64'), ((16, 32), 64))
+        self.assertEqual(parse_student('8/0'), ((8,), 0))
+        for spec in ('16-32', '16-x/64', '0-8/16', '4-4-4-4/8'):
+            with self.assertRaises(ValueError):
+                parse_student(spec)
+
+    def test_students_are_smaller_and_run_on_the_numpy_engine(self):
+        for spec in ('8-16/32', '8-16-32/0'):
+            student = build_student(spec)
+            self.assertEqual(student.output_shape, (None, 10))
+            self.assertLess(student.count_params(), 50000)
+            images = np.random.rand(3, 28, 28, 1).astype('float32')
+            engine = NumpyModel(*fold_model(student))
+            np.testing.assert_allclose(engine.predict(images), student(images, training=False).numpy(), atol=1e-5)
+
+class TestDistillationLoss(unittest.TestCase):
+    def test_soften(self):
+        probabilities = np.array([[0.7, 0.2, 0.1]])
+        np.testing.assert_allclose(soften(probabilities, 1.0), probabilities, rtol=1e-5)
+        softened = soften(probabilities, 4.0)
+        self.assertAlmostEqual(float(softened.sum()), 1.0, places=5)
+        self.assertLess(softened.max(), 0.7)
+        np.testing.assert_array_equal(softened.argsort(), probabilities.argsort())
+
+    def test_loss_is_cross_entropy_of_packed_targets(self):
+        rng = np.random.default_rng(0)
+        predictions, teacher = rng.dirichlet(np.ones(10), 2).astype('float32')
+        targets = np.concatenate([[[1.0]], soften(teacher[np.newaxis], 2.0)], axis=1)
+        loss = distillation_loss(temperature=2.0, alpha=0.25)(tf.constant(targets), tf.constant(predictions[np.newaxis]))
+
+        soft = -(targets[0, 1:] * np.log(soften(predictions[np.newaxis], 2.0)[0])).sum() * 4
+        self.assertAlmostEqual(float(loss[0]), 0.25 * -np.log(predictions[1]) + 0.75 * soft, places=4)
+
+    def test_teacher_targets(self):
+        teacher = build_student('4/0')
+        images = np.random.default_rng(0).integers(0, 256, (20, 28, 28)).astype('uint8')
+        targets = teacher_targets(teacher, images, np.arange(20) % 10, 3.0, batch_size=8)
+        self.assertEqual(targets.shape, (20, 11))
+        np.testing.assert_array_equal(targets[:, 0], np.arange(20) % 10)
+        np.testing.assert_allclose(targets[:, 1:].sum(axis=1), 1.0, rtol=1e-5)
+
+class TestSelection(unittest.TestCase):
+    def test_pareto_front_and_latency_budget(self):
+        candidates = mark_pareto_front([
+            candidate('teacher', 0.99, 2.0, role='teacher'),
+            candidate('big', 0.98, 1.0),
+            candidate('slow', 0.97, 1.5),
+            candidate('small', 0.96, 0.4),
+        ])
+        self.assertEqual([c['name'] for c in candidates if c['pareto']], ['teacher', 'big', 'small'])
+        self.assertEqual(select_student(candidates)['name'], 'big')
+        self.assertEqual(select_student(candidates, latency_target_ms=0.5)['name'], 'small')
+        self.assertIsNone(select_student(candidates, latency_target_ms=0.1))
+
+    def test_distill_end_to_end(self):
+        rng = np.random.default_rng(0)
+        labels = rng.integers(0, 10, 200).astype('uint8')
+        # Learnable digits: a bright row per label
+        images = rng.integers(0, 40, (200, 28, 28)).astype('uint8')
+        images[np.arange(200), 2 + 2 * labels] = 255
+        teacher = build_student('8/16')
+        teacher.compile(optimizer='adam', loss='sparse_categorical_crossentropy')
+        teacher.fit(images[..., np.newaxis] / 255.0, labels, epochs=3, verbose=0)
+
+        report, student = distill(
+            teacher, images, labels, images[:50], labels[:50], students=('4/0', '4-4/8'),
+            backend='numpy', epochs=1, batch_size=32, iterations=5
+        )
+        self.assertEqual([c['name'] for c in report['candidates']], ['teacher', '4/0', '4-4/8'])
+        self.assertEqual(report['selected'], select_student(report['candidates'])['name'])
+        self.assertEqual(student.loss, 'sparse_categorical_crossentropy')
+        self.assertTrue(any(c['pareto'] for c in report['candidates']))
+        self.assertIn('Selected (no latency target, numpy backend)', format_report(report))
+
+if __name__ == '__main__':
+    unittest.main()
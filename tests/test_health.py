@@ -0,0 +1,85 @@
+import time
+import unittest
+from unittest import mock
+import numpy as np
+from src.health import HealthMonitor
+from src.lifecycle import ModelManager
+from src.monitor import RecentLatency
+
+class FakeModel:
+    backend = 'fake'
+    version = 'v1'
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    def predict(self, images, verbose=0):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError('broken')
+        return np.full((len(images), 10), 0.1, dtype='float32')
+
+class TestHealthMonitor(unittest.TestCase):
+    def setUp(self):
+        self.model = FakeModel()
+        self.manager = ModelManager(lambda: self.model)
+        self.latency = RecentLatency()
+        patcher = mock.patch('src.health.RECENT_INFERENCE_LATENCY', self.latency)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # A long interval keeps the background thread from checking during the test
+        self.health = HealthMonitor(self.manager, interval=3600, max_queue_depth=4, max_inference_ms=50)
+
+    def test_not_ready_until_model_loaded_and_checked(self):
+        ready, details = self.health.ready()
+        self.assertFalse(ready)
+        self.assertEqual(details['reasons'], ['model loading'])
+        self.assertEqual(self.health.live(), (True, None))
+
+        serving = self.manager.current()
+        self.assertFalse(self.health.ready()[0])
+        self.health.check(serving)
+        ready, details = self.health.ready()
+        self.assertTrue(ready, details)
+        self.assertEqual(details['model_version'], 'v1')
+
+    def test_probes_do_not_run_the_model(self):
+        self.manager.current()
+        self.health.start()
+        # The background thread checks the model once it is loaded
+        deadline = time.time() + 5
+        while self.health.result is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(self.health.ready()[0])
+        calls = self.model.calls
+        for _ in range(100):
+            self.health.ready()
+            self.health.live()
+        self.assertEqual(self.model.calls, calls)
+
+    def test_failed_check(self):
+        self.model.fail = True
+        self.health.check(self.manager.current())
+        ready, details = self.health.ready()
+        self.assertFalse(ready)
+        self.assertEqual(details['reasons'], ['inference check failed: broken'])
+
+    def test_overload(self):
+        serving = self.manager.current()
+        self.health.check(serving)
+        with mock.patch.object(serving.batcher, 'queue_depth', return_value=5):
+            self.assertIn('queue depth 5 above 4', self.health.ready()[1]['reasons'])
+        for _ in range(20):
+            self.latency.observe(0.2)
+        ready, details = self.health.ready()
+        self.assertFalse(ready)
+        self.assertEqual(details['inference_p95_ms'], 200.0)
+
+    def test_hung_check_fails_liveness(self):
+        self.health.start()
+        self.health._check_started = time.monotonic() - 5 * 3600 - 1
+        self.assertFalse(self.health.live()[0])
+
+if __name__ == '__main__':
+    unittest.main()
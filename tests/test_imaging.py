@@ -0,0 +1,72 @@
+import io
+import unittest
+import numpy as np
+from PIL import Image, ImageDraw
+from src.imaging import decode_image_file, normalize_digit
+
+def draw_seven(size=(280, 280), offset=(60, 60), scale=1.5, width=18):
+    """White 7 on black, like the drawing canvas"""
+    image = Image.new('L', size, 0)
+    points = [(offset[0] + x * scale, offset[1] + y * scale) for x, y in ((20, 20), (80, 20), (45, 110))]
+    ImageDraw.Draw(image).line(points, fill=255, width=width)
+    return image
+
+def encode(image, format):
+    buffer = io.BytesIO()
+    image.save(buffer, format)
+    return buffer.getvalue()
+
+class TestNormalizeDigit(unittest.TestCase):
+    def test_mnist_layout(self):
+        digit = normalize_digit(np.asarray(draw_seven()))
+        self.assertEqual(digit.shape, (28, 28))
+        self.assertEqual(digit.dtype, np.float32)
+        self.assertAlmostEqual(float(digit.max()), 1.0, places=5)
+
+        # The longer side of the bounding box is 20 pixels
+        rows = np.flatnonzero((digit > 0.1).any(axis=1))
+        cols = np.flatnonzero((digit > 0.1).any(axis=0))
+        self.assertEqual(max(rows[-1] - rows[0], cols[-1] - cols[0]) + 1, 20)
+
+        # The center of mass is in the middle of the field
+        ys, xs = np.indices(digit.shape)
+        self.assertLess(abs((digit * ys).sum() / digit.sum() - 13.5), 1.0)
+        self.assertLess(abs((digit * xs).sum() / digit.sum() - 13.5), 1.0)
+
+    def test_independent_of_position_size_and_polarity(self):
+        reference = normalize_digit(np.asarray(draw_seven()))
+        moved = normalize_digit(np.asarray(draw_seven((600, 400), (300, 30), 3, 36)))
+        inverted = normalize_digit(255 - np.asarray(draw_seven()))
+        self.assertLess(np.abs(moved - reference).mean(), 0.01)
+        np.testing.assert_allclose(inverted, reference, atol=1e-6)
+        np.testing.assert_allclose(normalize_digit(reference), reference, atol=1e-6)
+
+    def test_blank_and_invalid(self):
+        np.testing.assert_array_equal(normalize_digit(np.zeros((50, 40))), np.zeros((28, 28)))
+        for bad in (np.zeros(784), np.zeros((2, 28, 28)), np.zeros((0, 5))):
+            with self.assertRaises(ValueError):
+                normalize_digit(bad)
+
+class TestDecodeImageFile(unittest.TestCase):
+    def test_png_and_jpeg(self):
+        image = draw_seven()
+        np.testing.assert_array_equal(decode_image_file(encode(image, 'PNG')), np.asarray(image))
+        reference = normalize_digit(np.asarray(image))
+        for data in (encode(image.convert('RGB'), 'JPEG'), encode(image.resize((1200, 1200)), 'JPEG')):
+            self.assertLess(np.abs(normalize_digit(decode_image_file(data)) - reference).mean(), 0.03)
+
+    def test_transparent_background(self):
+        image = Image.new('RGBA', (280, 280), (0, 0, 0, 0))
+        image.putalpha(draw_seven())
+        np.testing.assert_allclose(
+            normalize_digit(decode_image_file(encode(image, 'PNG'))),
+            normalize_digit(np.asarray(draw_seven())), atol=0.01
+        )
+
+    def test_rejects_other_data(self):
+        for data in (b'not an image', encode(draw_seven(), 'GIF')):
+            with self.assertRaises(ValueError):
+                decode_image_file(data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+import tempfile
+from pathlib import Path
+import numpy as np
+from src.model import build_model, export_tflite_model
+from src.inference import CompiledModel, TFLiteModel
+
+class TestCompiledModel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.model = build_model()
+        cls.engine = CompiledModel(cls.model, buckets=(1, 4, 16))
+
+    def test_matches_keras_for_padded_and_split_batches(self):
+        for batch_size in (1, 3, 16, 37):
+            images = np.random.rand(batch_size, 28, 28, 1).astype('float32')
+            expected = self.model(images, training=False).numpy()
+            predictions = self.engine.predict(images, verbose=0)
+            self.assertEqual(predictions.shape, (batch_size, 10))
+            np.testing.assert_allclose(predictions, expected, rtol=1e-4, atol=1e-6)
+
+class TestTFLiteModel(unittest.TestCase):
+    def test_float16_export_matches_keras(self):
+        model = build_model()
+        images = np.random.rand(5, 28, 28, 1).astype('float32')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = export_tflite_model(model, 'float16', path=Path(tmp) / 'model.tflite')
+            engine = TFLiteModel(path)
+            for batch in (images[:1], images):
+                np.testing.assert_allclose(
+                    engine.predict(batch), model(batch, training=False).numpy(), atol=1e-2
+                )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import unittest
+from unittest import mock
+import numpy as np
+from src.lifecycle import ModelManager
+
+class FakeModel:
+    backend = 'fake'
+
+    def predict(self, images, verbose=0):
+        return np.full((len(images), 10), 0.1, dtype='float32')
+
+class TestModelManager(unittest.TestCase):
+    def setUp(self):
+        self.loads = 0
+
+        def loader():
+            self.loads += 1
+            return FakeModel()
+
+        self.manager = ModelManager(loader)
+
+    def test_loads_once_per_process(self):
+        self.assertIsNone(self.manager.model)
+        first = self.manager.get()
+        self.assertIs(self.manager.get(), first)
+        self.assertIs(self.manager.model, first)
+        self.assertEqual(self.loads, 1)
+
+    def test_reloads_after_fork_when_not_shared(self):
+        self.manager.get()
+        with mock.patch('src.lifecycle.os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNone(self.manager.model)
+            self.manager.get()
+        self.assertEqual(self.loads, 2)
+
+    def test_preload_skips_tensorflow_backends(self):
+        with mock.patch.dict(os.environ, {'INFERENCE_BACKEND': 'compiled'}):
+            self.assertFalse(self.manager.preload())
+        self.assertIsNone(self.manager.model)
+        self.assertEqual(self.loads, 0)
+
+    def test_preloaded_model_is_shared_with_children(self):
+        with mock.patch.dict(os.environ, {'INFERENCE_BACKEND': 'numpy'}), \
+                mock.patch('src.lifecycle.load_engine', return_value=FakeModel()):
+            self.assertTrue(self.manager.preload())
+        with mock.patch('src.lifecycle.os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNotNone(self.manager.model)
+        self.assertEqual(self.loads, 0)
+
+    def test_load_error_is_reported(self):
+        manager = ModelManager(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            manager.get()
+        self.assertIsNone(manager.model)
+        self.assertIn('division', manager.error)
+
+if __name__ == '__main__':
+    unittest.main()
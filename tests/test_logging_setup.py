@@ -0,0 +1,97 @@
+import io
+import json
+import logging
+import threading
+import unittest
+from unittest import mock
+from flask import Flask
+from src import logging_setup
+from src.logging_setup import (
+    NonBlockingQueueHandler, RequestContextFilter, add_request_id_header,
+    assign_request_id, log_request, make_formatter
+)
+from src.monitor import LOG_RECORDS_DROPPED
+
+class BlockingHandler(logging.Handler):
+    """Target handler that stalls until released, like a full stdout pipe"""
+
+    def __init__(self):
+        super().__init__()
+        self.unblock = threading.Event()
+        self.records = []
+
+    def emit(self, record):
+        self.unblock.wait()
+        self.records.append(self.format(record))
+
+def make_logger(handler):
+    logger = logging.getLogger(f'test-{id(handler)}')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return logger
+
+class TestNonBlockingQueueHandler(unittest.TestCase):
+    def test_formats_on_listener_as_json(self):
+        stream = io.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setFormatter(make_formatter('json'))
+        handler = NonBlockingQueueHandler(target)
+        handler.addFilter(RequestContextFilter())
+        logger = make_logger(handler)
+
+        logger.info("Predicted digit %d", 7, extra={'predicted_label': 7})
+        handler.stop()
+
+        line = json.loads(stream.getvalue())
+        self.assertEqual(line['message'], 'Predicted digit 7')
+        self.assertEqual(line['level'], 'INFO')
+        self.assertEqual(line['predicted_label'], 7)
+        self.assertIsNone(line['request_id'])
+
+    def test_drops_instead_of_blocking_when_full(self):
+        target = BlockingHandler()
+        handler = NonBlockingQueueHandler(target, max_queue_size=2)
+        logger = make_logger(handler)
+        dropped = LOG_RECORDS_DROPPED._value.get()
+
+        for i in range(10):
+            logger.info("record %d", i)
+
+        # The listener holds one record and the queue two; the rest are dropped
+        self.assertGreaterEqual(LOG_RECORDS_DROPPED._value.get() - dropped, 7)
+        target.unblock.set()
+        handler.stop()
+        self.assertLessEqual(len(target.records), 3)
+        self.assertEqual(target.records[0], 'record 0')
+
+class TestRequestLogging(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.before_request(assign_request_id)
+        self.app.after_request(add_request_id_header)
+
+        @self.app.route('/')
+        def index():
+            log_request("handled %s", 'index', path='/')
+            return 'ok'
+
+    def test_echoes_or_generates_request_id(self):
+        client = self.app.test_client()
+        self.assertEqual(client.get('/', headers={'X-Request-ID': 'abc'}).headers['X-Request-ID'], 'abc')
+        generated = client.get('/').headers['X-Request-ID']
+        self.assertEqual(len(generated), 32)
+
+    def test_logs_only_sampled_requests(self):
+        client = self.app.test_client()
+        with mock.patch.object(logging_setup, 'LOG_SAMPLE_RATE', 0.0):
+            with self.assertNoLogs(level='INFO'):
+                client.get('/')
+        with mock.patch.object(logging_setup, 'LOG_SAMPLE_RATE', 1.0):
+            with self.assertLogs(level='INFO') as logs:
+                client.get('/', headers={'X-Request-ID': 'abc'})
+        self.assertEqual(logs.records[0].getMessage(), 'handled index')
+        self.assertEqual(logs.records[0].path, '/')
+
+if __name__ == '__main__':
+    unittest.main()
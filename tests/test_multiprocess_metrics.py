@@ -0,0 +1,91 @@
+import os
+import sys
+import glob
+import unittest
+import tempfile
+import subprocess
+from pathlib import Path
+from unittest import mock
+from prometheus_client import CollectorRegistry
+from prometheus_client.mmap_dict import MmapedDict
+from src.multiprocess_metrics import SharedMetricsCollector, merge_dead_processes, metrics_registry, reset_directory
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# One worker's traffic: two /predict requests, a failed health check
+WORKER = """
+from src.monitor import HEALTH_CHECK_OK, REQUEST_COUNT, REQUEST_LATENCY, labelled
+for latency in (0.004, 0.2):
+    labelled(REQUEST_COUNT, 'POST', 'predict', 200).inc()
+    labelled(REQUEST_LATENCY, 'POST', 'predict').observe(latency)
+HEALTH_CHECK_OK.set({health})
+"""
+
+def run_worker(path, health=1):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(path))
+    subprocess.run([sys.executable, '-c', WORKER.format(health=health)], cwd=ROOT, env=env, check=True)
+
+def scrape(path):
+    registry = CollectorRegistry()
+    SharedMetricsCollector(registry, str(path))
+    return registry
+
+class TestMultiprocessMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_aggregates_workers(self):
+        run_worker(self.path, health=1)
+        run_worker(self.path, health=0)
+        registry = scrape(self.path)
+        labels = {'method': 'POST', 'endpoint': 'predict'}
+        self.assertEqual(registry.get_sample_value('flask_request_count_total', dict(labels, http_status='200')), 4)
+        self.assertEqual(registry.get_sample_value('flask_http_request_duration_seconds_count', labels), 4)
+        self.assertEqual(registry.get_sample_value('flask_http_request_duration_seconds_bucket', dict(labels, le='0.005')), 2)
+        self.assertEqual(registry.get_sample_value('digit_classifier_health_check_ok'), 0)
+
+    def test_merges_exited_workers(self):
+        run_worker(self.path, health=0)
+        run_worker(self.path, health=1)
+        # A process that is still running keeps its files
+        live = MmapedDict(str(self.path / f'counter_{os.getpid()}.db'))
+        live.close()
+
+        self.assertEqual(merge_dead_processes(path=str(self.path)), 2)
+        files = sorted(os.path.basename(f) for f in glob.glob(str(self.path / '*.db')))
+        self.assertEqual(files, sorted(['counter_archive.db', f'counter_{os.getpid()}.db', 'histogram_archive.db']))
+
+        registry = scrape(self.path)
+        labels = {'method': 'POST', 'endpoint': 'predict'}
+        self.assertEqual(registry.get_sample_value('flask_request_count_total', dict(labels, http_status='200')), 4)
+        self.assertAlmostEqual(registry.get_sample_value('flask_http_request_duration_seconds_sum', labels), 0.408)
+        # Gauges of exited workers are dropped
+        self.assertIsNone(registry.get_sample_value('digit_classifier_health_check_ok'))
+
+        # Later workers add to the archived totals
+        run_worker(self.path)
+        merge_dead_processes(path=str(self.path))
+        self.assertEqual(
+            scrape(self.path).get_sample_value('flask_request_count_total', dict(labels, http_status='200')), 6
+        )
+
+    def test_registry_selection(self):
+        with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': ''}):
+            self.assertEqual(merge_dead_processes(), 0)
+            self.assertIsNot(metrics_registry().get_sample_value('process_resident_memory_bytes'), None)
+
+        run_worker(self.path)
+        reset_directory(self.path)
+        self.assertEqual(glob.glob(str(self.path / '*.db')), [])
+        live = MmapedDict(str(self.path / f'counter_{os.getpid()}.db'))
+        live.close()
+        with mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': str(self.path)}):
+            registry = metrics_registry()
+        self.assertGreater(registry.get_sample_value('process_resident_memory_bytes', {'pid': str(os.getpid())}), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import tempfile
+from pathlib import Path
+import numpy as np
+import tensorflow as tf
+from src.model import build_model
+from src.numpy_engine import export_numpy_model, NumpyModel, conv2d
+
+class TestNumpyEngine(unittest.TestCase):
+    def export_and_load(self, model):
+        with tempfile.TemporaryDirectory() as tmp:
+            return NumpyModel.load(export_numpy_model(model, Path(tmp) / 'model.npz'))
+
+    def randomize_batchnorm(self, model, negative_scales=False):
+        """Give BatchNormalization layers non-trivial statistics so folding matters"""
+        rng = np.random.default_rng(0)
+        for layer in model.layers:
+            if isinstance(layer, tf.keras.layers.BatchNormalization):
+                gamma, beta, mean, variance = layer.get_weights()
+                gamma = rng.uniform(0.5, 1.5, gamma.shape) * (rng.choice([-1, 1], gamma.shape) if negative_scales else 1)
+                layer.set_weights([
+                    gamma.astype('float32'),
+                    rng.normal(size=beta.shape).astype('float32'),
+                    rng.normal(scale=0.1, size=mean.shape).astype('float32'),
+                    rng.uniform(0.5, 1.5, variance.shape).astype('float32'),
+                ])
+
+    def test_matches_keras_with_batchnorm_folded(self):
+        model = build_model()
+        self.randomize_batchnorm(model)
+        engine = self.export_and_load(model)
+        self.assertNotIn('affine', [op['op'] for op in engine.ops])
+
+        images = np.random.rand(6, 28, 28, 1).astype('float32')
+        np.testing.assert_allclose(engine.predict(images), model(images, training=False).numpy(), atol=1e-5)
+
+    def test_negative_scales_are_not_folded_through_pooling(self):
+        model = build_model()
+        self.randomize_batchnorm(model, negative_scales=True)
+        engine = self.export_and_load(model)
+        self.assertIn('affine', [op['op'] for op in engine.ops])
+
+        images = np.random.rand(3, 28, 28, 1).astype('float32')
+        np.testing.assert_allclose(engine.predict(images), model(images, training=False).numpy(), atol=1e-5)
+
+    def test_same_padding_conv(self):
+        x = np.random.rand(2, 7, 7, 3).astype('float32')
+        kernel = np.random.rand(3, 3, 3, 4).astype('float32')
+        bias = np.random.rand(4).astype('float32')
+        for strides in ((1, 1), (2, 2)):
+            expected = tf.nn.conv2d(x, kernel, strides=strides, padding='SAME').numpy() + bias
+            np.testing.assert_allclose(conv2d(x, kernel, bias, strides, 'same'), expected, rtol=1e-5)
+
+if __name__ == '__main__':
+    unittest.main()
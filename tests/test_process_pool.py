@@ -0,0 +1,120 @@
+import os
+import signal
+import time
+import unittest
+import tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from src.model import MicroBatcher, build_model
+from src.monitor import INFERENCE_WORKER_RESTARTS
+from src.numpy_engine import NumpyModel, export_numpy_model
+from src.process_pool import InferenceTimeout, ProcessPoolEngine, assign_cpus, parse_cpu_list
+
+class TestCpuAssignment(unittest.TestCase):
+    def test_parse_cpu_list(self):
+        self.assertEqual(parse_cpu_list('0-3, 6'), [0, 1, 2, 3, 6])
+
+    def test_splits_cpus_between_workers(self):
+        self.assertEqual(assign_cpus(2, '0-4'), [[0, 1, 2], [3, 4]])
+        self.assertEqual(assign_cpus(3, '0'), [[0], [0], [0]])
+        self.assertEqual(assign_cpus(2, None), [None, None])
+
+    def test_web_workers_get_disjoint_shares(self):
+        self.assertEqual(assign_cpus(2, '0-7', (0, 2)), [[0, 1], [2, 3]])
+        self.assertEqual(assign_cpus(2, '0-7', (1, 2)), [[4, 5], [6, 7]])
+        self.assertEqual(assign_cpus(1, '0-2', (1, 2)), [[2]])
+        self.assertEqual(assign_cpus(2, '0-7', (None, 2)), [None, None])
+        self.assertEqual(assign_cpus(2, '0-3', (None, 1)), [[0, 1], [2, 3]])
+
+class TestProcessPoolEngine(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Workers load the model from models/ under their working directory
+        cls.previous_cwd = os.getcwd()
+        cls.tmp = tempfile.TemporaryDirectory()
+        os.chdir(cls.tmp.name)
+        Path('models').mkdir()
+        path = export_numpy_model(build_model(), Path('models') / 'digit_classifier.npz')
+        cls.reference = NumpyModel.load(path)
+        cls.pool = ProcessPoolEngine('numpy', workers=2, slots=2, slot_images=16)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        os.chdir(cls.previous_cwd)
+        cls.tmp.cleanup()
+
+    def test_matches_in_process_engine(self):
+        images = np.random.rand(70, 28, 28, 1).astype('float32')
+        np.testing.assert_allclose(self.pool.predict(images), self.reference.predict(images), atol=1e-6)
+
+    def test_micro_batcher_keeps_workers_busy(self):
+        batcher = MicroBatcher(self.pool, max_batch_size=8, max_wait_ms=1)
+        images = np.random.rand(64, 784).astype('float32')
+        try:
+            with ThreadPoolExecutor(16) as executor:
+                results = list(executor.map(batcher.predict, images))
+        finally:
+            batcher.close()
+        expected = self.reference.predict(images.reshape(-1, 28, 28, 1))
+        np.testing.assert_allclose([probabilities for _, probabilities in results], expected, atol=1e-6)
+
+    def test_restarts_dead_worker(self):
+        restarts = INFERENCE_WORKER_RESTARTS.labels(worker='0')
+        before = restarts._value.get()
+        os.kill(self.pool._workers[0].process.pid, signal.SIGKILL)
+
+        deadline = time.time() + 60
+        while restarts._value.get() == before and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(restarts._value.get(), before + 1)
+
+        images = np.random.rand(64, 28, 28, 1).astype('float32')
+        np.testing.assert_allclose(self.pool.predict(images), self.reference.predict(images), atol=1e-6)
+        self.assertTrue(self.pool._workers[0].process.is_alive())
+
+class TestPoolDown(unittest.TestCase):
+    def test_times_out_while_worker_cannot_restart(self):
+        previous_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            pool = None
+            try:
+                Path('models').mkdir()
+                path = export_numpy_model(build_model(), Path('models') / 'digit_classifier.npz')
+                pool = ProcessPoolEngine('numpy', workers=1, slots=1, slot_images=4, timeout=0.5)
+                # The replacement worker has no model to load and keeps failing
+                path.unlink()
+                os.kill(pool._workers[0].process.pid, signal.SIGKILL)
+                deadline = time.time() + 30
+                while not pool.workers_down() and time.time() < deadline:
+                    time.sleep(0.05)
+                self.assertEqual(pool.workers_down(), 1)
+
+                started = time.monotonic()
+                with self.assertRaises(InferenceTimeout):
+                    pool.predict(np.zeros((2, 28, 28, 1), dtype='float32'))
+                batcher = MicroBatcher(pool, max_batch_size=4, max_wait_ms=1)
+                with self.assertRaises(InferenceTimeout):
+                    batcher.predict(np.zeros(784, dtype='float32'))
+                batcher.close()
+                self.assertLess(time.monotonic() - started, 10)
+            finally:
+                if pool is not None:
+                    pool.close()
+                os.chdir(previous_cwd)
+
+class TestPoolStartup(unittest.TestCase):
+    def test_fails_without_model(self):
+        previous_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                with self.assertRaises(RuntimeError):
+                    ProcessPoolEngine('numpy', workers=1)
+            finally:
+                os.chdir(previous_cwd)
+
+if __name__ == '__main__':
+    unittest.main()
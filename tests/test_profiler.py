@@ -0,0 +1,48 @@
+import time
+import threading
+import unittest
+from src.profiler import StackSampler, request_finished, request_started
+from src.monitor import STAGE_LATENCY, time_stage
+
+def busy_request(stop):
+    request_started()
+    try:
+        while not stop.is_set():
+            time.sleep(0.001)
+    finally:
+        request_finished()
+
+class TestStackSampler(unittest.TestCase):
+    def test_samples_only_request_threads(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_request, args=(stop,))
+        idle = threading.Thread(target=stop.wait)
+        thread.start()
+        idle.start()
+        sampler = StackSampler(interval=0.002).start()
+        time.sleep(0.1)
+        sampler.stop()
+        stop.set()
+        thread.join()
+        idle.join()
+
+        folded = sampler.drain()
+        self.assertGreater(sampler.samples, 0)
+        lines = folded.splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+            self.assertIn('busy_request', stack)
+        self.assertEqual(sampler.drain(), '')
+
+class TestTimeStage(unittest.TestCase):
+    def test_records_outside_request_context(self):
+        histogram = STAGE_LATENCY.labels(endpoint='none', stage='test')
+        before = histogram._sum.get()
+        with time_stage('test'):
+            time.sleep(0.01)
+        self.assertGreaterEqual(histogram._sum.get() - before, 0.01)
+
+if __name__ == '__main__':
+    unittest.main()
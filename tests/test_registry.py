@@ -0,0 +1,131 @@
+import os
+import time
+import unittest
+import tempfile
+from pathlib import Path
+from unittest import mock
+import numpy as np
+from src.lifecycle import ModelManager
+from src.model import build_model
+from src.registry import ModelRegistry
+from src.weight_store import save_model_weights
+
+class FakeModel:
+    backend = 'fake'
+
+    def __init__(self, version):
+        self.version = version
+        self.closed = False
+
+    def predict(self, images, verbose=0):
+        return np.full((len(images), 10), 0.1, dtype='float32')
+
+    def close(self):
+        self.closed = True
+
+class RegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.registry = ModelRegistry(Path(self.tmp.name) / 'registry')
+        self.artifact = Path(self.tmp.name) / 'digit_classifier.weights'
+        self.artifact.write_bytes(b'weights')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+class TestModelRegistry(RegistryTestCase):
+    def test_publish_and_activate(self):
+        self.assertIsNone(self.registry.current_version())
+        self.assertEqual(self.registry.publish([self.artifact], metadata={'test_accuracy': 0.99}), 'v1')
+        self.assertEqual(self.registry.publish([self.artifact], activate=False), 'v2')
+
+        self.assertEqual(self.registry.current_version(), 'v1')
+        self.assertEqual([metadata['version'] for metadata in self.registry.versions()], ['v1', 'v2'])
+        self.assertEqual(self.registry.metadata('v1')['test_accuracy'], 0.99)
+        self.assertEqual(self.registry.metadata('v1')['artifacts'], ['digit_classifier.weights'])
+
+        self.registry.activate('v2')
+        self.assertEqual(self.registry.current_version(), 'v2')
+        self.assertEqual(list(Path(self.registry.root).glob('.*')), [])
+
+    def test_rejects_duplicate_and_unknown_versions(self):
+        self.registry.publish([self.artifact], version='v1')
+        with self.assertRaises(ValueError):
+            self.registry.publish([self.artifact], version='v1')
+        with self.assertRaises(ValueError):
+            self.registry.activate('v9')
+        with self.assertRaises(ValueError):
+            self.registry.path('../v1')
+
+    def test_loads_numpy_engine(self):
+        save_model_weights(build_model(), self.artifact)
+        self.registry.publish([self.artifact])
+        engine = self.registry.load_engine('v1', 'numpy')
+        self.assertEqual(engine.version, 'v1')
+        self.assertEqual(engine.predict(np.zeros((2, 28, 28, 1), dtype='float32')).shape, (2, 10))
+
+class TestHotSwap(RegistryTestCase):
+    def make_manager(self, registry=None):
+        return ModelManager(lambda version=None: FakeModel(version or 'initial'), registry)
+
+    def test_swap_waits_for_in_flight_requests(self):
+        manager = self.make_manager()
+        old = manager.current()
+        with old:
+            manager.swap('v2')
+            self.assertEqual(manager.version, 'v2')
+            self.assertEqual(manager.get().version, 'v2')
+            # The request that started on the old version can still use it
+            time.sleep(0.05)
+            self.assertFalse(old.model.closed)
+            old.model.predict(np.zeros((1, 28, 28, 1)))
+
+        deadline = time.time() + 5
+        while not old.model.closed and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(old.model.closed)
+
+    def test_watcher_swaps_in_activated_version(self):
+        self.registry.publish([self.artifact])
+        manager = self.make_manager(self.registry)
+        with mock.patch.dict(os.environ, {'MODEL_REGISTRY_POLL_SECONDS': '0.02'}):
+            self.assertEqual(manager.current().version, 'initial')
+
+        self.registry.publish([self.artifact])
+        deadline = time.time() + 5
+        while manager.version != 'v2' and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(manager.version, 'v2')
+
+    def test_watcher_retries_failed_version_after_rollback(self):
+        self.registry.publish([self.artifact])
+        calls = []
+
+        def loader(version=None):
+            calls.append(version)
+            if version == 'v2' and calls.count('v2') == 1:
+                raise OSError("transient read error")
+            return FakeModel(version or 'initial')
+
+        manager = ModelManager(loader, self.registry)
+        with mock.patch.dict(os.environ, {'MODEL_REGISTRY_POLL_SECONDS': '0.02'}):
+            manager.current()
+
+        def wait_for(condition):
+            deadline = time.time() + 5
+            while not condition() and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(condition())
+
+        wait_for(lambda: manager.version == 'v1')
+        self.registry.publish([self.artifact])
+        wait_for(lambda: 'v2' in calls)
+        self.assertEqual(manager.version, 'v1')
+        self.registry.activate('v1')
+        time.sleep(0.1)
+        self.registry.activate('v2')
+        wait_for(lambda: manager.version == 'v2')
+        self.assertEqual(calls.count('v2'), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import io
+import os
+import json
+import struct
+import unittest
+import tempfile
+from unittest import mock
+from pathlib import Path
+import numpy as np
+from PIL import Image
+from src.scoring import open_images, score_images
+
+class FakeModel:
+    """One-hot on the mean pixel value, so every row's label is known"""
+    backend = 'fake'
+    version = 'v1'
+
+    def __init__(self, fail_after=None):
+        self.calls = 0
+        self.fail_after = fail_after
+
+    def predict(self, images, verbose=0):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError('interrupted')
+        labels = np.rint(images.reshape(len(images), -1).mean(axis=1) * 9).astype(int)
+        return np.eye(10, dtype='float32')[labels]
+
+def digit_images(count):
+    """uint8 28x28 images whose mean pixel encodes the label i % 10"""
+    return np.stack([np.full((28, 28), round(255 * (i % 10) / 9), dtype=np.uint8) for i in range(count)])
+
+class TestScoring(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.images = digit_images(50)
+        self.expected = np.arange(50) % 10
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def score(self, source, model=None, **kwargs):
+        return score_images(source, model or FakeModel(), self.dir / 'out', batch_size=8, checkpoint_every=8, **kwargs)
+
+    def test_npy_and_idx_inputs(self):
+        np.save(self.dir / 'images.npy', self.images.reshape(50, 784))
+        idx = self.dir / 'images-idx3-ubyte'
+        idx.write_bytes(b'\x00\x00\x08\x03' + struct.pack('>3I', 50, 28, 28) + self.images.tobytes())
+
+        for path in (self.dir / 'images.npy', idx):
+            report = self.score(open_images(path), restart=True)
+            self.assertEqual(report['scored'], 50)
+            self.assertEqual(np.load(self.dir / 'out' / 'labels.npy').tolist(), self.expected.tolist())
+            self.assertEqual(np.load(self.dir / 'out' / 'probabilities.npy').shape, (50, 10))
+
+    def test_image_directory(self):
+        pictures = self.dir / 'pictures'
+        pictures.mkdir()
+        for i, image in enumerate(self.images[:12]):
+            buffer = io.BytesIO()
+            Image.fromarray(image).save(buffer, 'PNG')
+            (pictures / f'{i:03d}.png').write_bytes(buffer.getvalue())
+
+        source = open_images(pictures)
+        try:
+            self.score(source)
+        finally:
+            source.close()
+        self.assertEqual(np.load(self.dir / 'out' / 'labels.npy').tolist(), self.expected[:12].tolist())
+        self.assertEqual((self.dir / 'out' / 'files.txt').read_text().split(), [f'{i:03d}.png' for i in range(12)])
+
+    def test_resumes_from_checkpoint(self):
+        np.save(self.dir / 'images.npy', self.images)
+        source = open_images(self.dir / 'images.npy')
+        with self.assertRaises(RuntimeError):
+            self.score(source, FakeModel(fail_after=3))
+        checkpoint = json.loads((self.dir / 'out' / 'checkpoint.json').read_text())
+        self.assertEqual(checkpoint['next_index'], 24)
+
+        model = FakeModel()
+        report = self.score(source, model)
+        self.assertEqual((report['resumed_from'], report['scored']), (24, 26))
+        self.assertEqual(model.calls, 4)
+        self.assertEqual(np.load(self.dir / 'out' / 'labels.npy').tolist(), self.expected.tolist())
+
+    def test_refuses_checkpoint_of_other_model(self):
+        np.save(self.dir / 'images.npy', self.images)
+        source = open_images(self.dir / 'images.npy')
+        self.score(source)
+        other = FakeModel()
+        other.version = 'v2'
+        with self.assertRaises(ValueError):
+            self.score(source, other)
+        self.assertEqual(self.score(source, other, restart=True)['resumed_from'], 0)
+
+    def test_resumes_without_registry_version_in_development(self):
+        # Without a registry version the checkpoint is tied to the exported artifact
+        np.save(self.dir / 'images.npy', self.images)
+        source = open_images(self.dir / 'images.npy')
+        previous_cwd = os.getcwd()
+        os.chdir(self.dir)
+        try:
+            Path('models').mkdir()
+            Path('models/digit_classifier.npz').write_bytes(b'weights')
+            with mock.patch.dict(os.environ, {'PYTHON_ENV': 'development'}):
+                model = FakeModel(fail_after=3)
+                model.backend, model.version = 'numpy', None
+                with self.assertRaises(RuntimeError):
+                    self.score(source, model)
+                model = FakeModel()
+                model.backend, model.version = 'numpy', None
+                self.assertEqual(self.score(source, model)['resumed_from'], 24)
+        finally:
+            os.chdir(previous_cwd)
+
+    def test_rejects_unsupported_input(self):
+        np.save(self.dir / 'wrong.npy', np.zeros((4, 10)))
+        (self.dir / 'images.gz').write_bytes(b'')
+        for path in ('wrong.npy', 'images.gz'):
+            with self.assertRaises(ValueError):
+                open_images(self.dir / path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import time
+import unittest
+import importlib.util
+from unittest import mock
+import tempfile
+from pathlib import Path
+import numpy as np
+import tensorflow as tf
+from src.model import create_and_train_model
+from src.telemetry import AsyncEventWriter, TrainingTelemetry, create_telemetry
+
+class FakeWriter:
+    def __init__(self):
+        self.scalars = {}
+        self.histograms = {}
+        self.closed = False
+
+    def scalar(self, name, value, step):
+        self.scalars.setdefault(name, []).append((step, value))
+
+    def histogram(self, name, values, step):
+        self.histograms[name] = np.array(values)
+
+    def close(self):
+        self.closed = True
+
+class Weight:
+    def __init__(self, name, values):
+        self.name = name
+        self.values = values
+
+    def __array__(self, dtype=None, copy=None):
+        return self.values
+
+class FakeModel:
+    weights = [Weight('dense/kernel', np.ones((100, 100), dtype='float32')), Weight('dense/bias', np.zeros(10))]
+
+def slow_dataset(batches, delay):
+    def load(index):
+        time.sleep(delay)
+        return np.zeros((4, 28, 28, 1), dtype='float32'), np.zeros(4, dtype='int32')
+
+    def fetch(index):
+        images, labels = tf.numpy_function(load, [index], (tf.float32, tf.int32))
+        return tf.reshape(images, (4, 28, 28, 1)), tf.reshape(labels, (4,))
+
+    return tf.data.Dataset.range(batches).map(fetch)
+
+# tf.summary ops are implemented by the tensorboard package (requirements.txt)
+@unittest.skipUnless(importlib.util.find_spec('tensorboard.summary'), "tensorboard is not installed")
+class TestAsyncEventWriter(unittest.TestCase):
+    def test_writes_scalars_and_histograms(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            writer = AsyncEventWriter(log_dir)
+            writer.scalar('epoch/loss', 0.5, 0)
+            writer.histogram('weights/kernel', np.arange(100), 0)
+            self.assertTrue(writer.flush())
+            writer.close()
+            writer.close()
+
+            tags = set()
+            for path in Path(log_dir).iterdir():
+                for event in tf.compat.v1.train.summary_iterator(str(path)):
+                    tags.update(value.tag for value in event.summary.value)
+            self.assertEqual(tags, {'epoch/loss', 'weights/kernel'})
+            self.assertEqual(writer.dropped, 0)
+
+class TestTrainingTelemetry(unittest.TestCase):
+    def test_splits_steps_into_data_wait_compute_and_callbacks(self):
+        writer = FakeWriter()
+        telemetry = TrainingTelemetry(writer, log_every_steps=2)
+        iterator = iter(telemetry.instrument(slow_dataset(4, 0.03)))
+
+        telemetry.epoch_begin()
+        for _ in range(4):
+            telemetry.step_begin()
+            next(iterator)
+            time.sleep(0.02)
+            telemetry.step_end()
+            time.sleep(0.01)
+        logs = {'loss': 0.25, 'samples_per_second': 100.0}
+        telemetry.epoch_end(0, logs)
+        telemetry.train_end()
+
+        self.assertGreater(logs['data_wait_ms'], 25)
+        self.assertGreater(logs['compute_ms'], 15)
+        self.assertLess(logs['compute_ms'], logs['data_wait_ms'])
+        self.assertGreater(logs['callbacks_ms'], 5)
+        self.assertEqual([step for step, _ in writer.scalars['step/data_wait_ms']], [2, 4])
+        self.assertEqual(writer.scalars['epoch/loss'], [(0, 0.25)])
+        self.assertIn('epoch/data_wait_ms', writer.scalars)
+        self.assertTrue(writer.closed)
+
+    def test_sampled_histograms_only_when_detailed(self):
+        for level, expected in (('basic', {}), ('detailed', {'weights/dense/kernel': 64, 'weights/dense/bias': 10})):
+            writer = FakeWriter()
+            telemetry = TrainingTelemetry(writer, level, histogram_every=2, histogram_samples=64)
+            telemetry.epoch_end(0, {}, FakeModel())
+            self.assertEqual(writer.histograms, {})
+            telemetry.epoch_end(1, {}, FakeModel())
+            self.assertEqual({name: len(values) for name, values in writer.histograms.items()}, expected)
+
+    def test_levels(self):
+        self.assertIsNone(create_telemetry('unused', 'off'))
+        with self.assertRaises(ValueError):
+            create_telemetry('unused', 'verbose')
+
+    def test_writer_closed_when_training_fails(self):
+        writer = FakeWriter()
+
+        def interrupted(logs=None):
+            raise RuntimeError('interrupted')
+
+        with mock.patch('src.telemetry.create_telemetry', return_value=TrainingTelemetry(writer)), \
+                mock.patch('src.model.epoch_throughput_callback',
+                           return_value=tf.keras.callbacks.LambdaCallback(on_train_begin=interrupted)):
+            with self.assertRaises(RuntimeError):
+                create_and_train_model(
+                    np.zeros((40, 28, 28), dtype='uint8'), np.zeros(40, dtype='uint8'), epochs=1, save_model=False
+                )
+        self.assertTrue(writer.closed)
+
+if __name__ == '__main__':
+    unittest.main()
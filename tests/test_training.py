@@ -0,0 +1,46 @@
+import os
+import json
+import unittest
+from unittest import mock
+from src.training import is_chief, scale_hyperparameters, threads_from_env
+
+class TestScaleHyperparameters(unittest.TestCase):
+    def test_linear_scaling(self):
+        self.assertEqual(scale_hyperparameters(128, 4, 0.001), (512, 0.004))
+
+    def test_sqrt_scaling(self):
+        batch_size, learning_rate = scale_hyperparameters(128, 4, 0.001, rule='sqrt')
+        self.assertEqual(batch_size, 512)
+        self.assertAlmostEqual(learning_rate, 0.002)
+
+    def test_no_scaling(self):
+        self.assertEqual(scale_hyperparameters(64, 2, 0.001, rule='none'), (128, 0.001))
+
+    def test_unknown_rule(self):
+        with self.assertRaises(ValueError):
+            scale_hyperparameters(128, 2, rule='cubic')
+
+class TestEnvironment(unittest.TestCase):
+    def test_threads_from_env(self):
+        with mock.patch.dict(os.environ, {'TRAIN_INTRA_OP_THREADS': '8'}, clear=True):
+            self.assertEqual(threads_from_env(), (8, None))
+
+    def test_chief_without_tf_config(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertTrue(is_chief())
+
+    def test_worker_zero_is_chief_without_chief_task(self):
+        cluster = {'worker': ['localhost:12345', 'localhost:12346']}
+        for index, expected in ((0, True), (1, False)):
+            config = json.dumps({'cluster': cluster, 'task': {'type': 'worker', 'index': index}})
+            with mock.patch.dict(os.environ, {'TF_CONFIG': config}):
+                self.assertEqual(is_chief(), expected)
+
+    def test_worker_is_not_chief_with_chief_task(self):
+        cluster = {'chief': ['localhost:12340'], 'worker': ['localhost:12345']}
+        config = json.dumps({'cluster': cluster, 'task': {'type': 'worker', 'index': 0}})
+        with mock.patch.dict(os.environ, {'TF_CONFIG': config}):
+            self.assertFalse(is_chief())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import tempfile
+from unittest import mock
+from pathlib import Path
+import numpy as np
+from src.model import build_model, load_trained_model
+from src.weight_store import (
+    write_weight_store, WeightStore, save_model_weights, load_keras_model, load_numpy_model, ALIGNMENT
+)
+
+class TestWeightStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / 'model.weights'
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_is_aligned_and_memory_mapped(self):
+        arrays = {
+            'a': np.arange(7, dtype='float32'),
+            'b': np.random.rand(3, 5).astype('float64'),
+            'c': np.arange(4, dtype='uint8').reshape(2, 2),
+        }
+        write_weight_store(self.path, arrays, {'version': 'test'})
+        store = WeightStore(self.path)
+        self.assertEqual(store.metadata, {'version': 'test'})
+        for name, array in arrays.items():
+            view = store[name]
+            np.testing.assert_array_equal(view, array)
+            self.assertEqual(view.dtype, array.dtype)
+            self.assertIsInstance(view, np.memmap)
+            self.assertEqual(view.ctypes.data % ALIGNMENT, 0)
+            self.assertFalse(view.flags.writeable)
+
+    def test_rejects_other_files(self):
+        self.path.write_bytes(b'not a weight store' * 4)
+        with self.assertRaises(ValueError):
+            WeightStore(self.path)
+
+    def test_model_sections(self):
+        model = build_model()
+        save_model_weights(model, self.path)
+        images = np.random.rand(4, 28, 28, 1).astype('float32')
+        expected = model(images, training=False).numpy()
+
+        keras_model = load_keras_model(self.path)
+        np.testing.assert_allclose(keras_model(images, training=False).numpy(), expected, atol=1e-6)
+
+        engine = load_numpy_model(self.path)
+        np.testing.assert_allclose(engine.predict(images), expected, atol=1e-5)
+        # The engine serves directly from the mapped pages
+        kernel = engine.ops[0]['kernel']
+        self.assertFalse(kernel.flags.owndata)
+        self.assertFalse(kernel.flags.writeable)
+
+    def test_load_trained_model_is_compiled(self):
+        save_model_weights(build_model(), self.path)
+        with mock.patch('src.model.weight_store_path', return_value=self.path):
+            model = load_trained_model()
+        images = np.random.rand(4, 28, 28, 1).astype('float32')
+        loss, accuracy = model.evaluate(images, np.arange(4), verbose=0)
+        self.assertGreaterEqual(accuracy, 0.0)
+
+if __name__ == '__main__':
+    unittest.main()